@@ -1,6 +1,12 @@
-from flask import Flask, request, render_template_string, send_file, Blueprint, jsonify,json
-import os, sqlite3, csv, io
+from flask import Flask, request, render_template, url_for, Blueprint, jsonify, json, g, Response
+import os, sqlite3, csv, io, time, threading, collections, hashlib, secrets, base64, gzip
+from contextlib import contextmanager
+from urllib.request import pathname2url
 from flask_cors import CORS
+import click
+
+from db import migrate as db_migrate
+from db import publicar as db_publicar
 
 APP_TITLE = "SIBUAC Tarifas"
 
@@ -33,9 +39,35 @@ try:
 except ImportError:
     DefaultJSONProvider = None
 
+# --- Codificador JSON: orjson si está instalado (JSON_ENCODER=orjson|std) ---
+try:
+    import orjson
+except ImportError:
+    orjson = None
+JSON_ENCODER = os.environ.get("JSON_ENCODER", "orjson" if orjson else "std")
+if JSON_ENCODER == "orjson" and orjson is None:
+    raise RuntimeError("JSON_ENCODER=orjson pero orjson no está instalado (pip install orjson)")
+
+def _json_default(o):
+    if DefaultJSONProvider is not None:
+        return DefaultJSONProvider.default(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+def json_bytes(obj, indent=False):
+    """JSON compacto en UTF-8 (sin \\u00xx), claves ordenadas como el provider por defecto de Flask."""
+    if JSON_ENCODER == "orjson":
+        opciones = orjson.OPT_SORT_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, default=_json_default, option=opciones)
+    return app.json.dumps(obj, indent=2 if indent else None,
+                          separators=None if indent else (",", ":")).encode("utf-8")
+
 if DefaultJSONProvider is not None:
     class NoAsciiJSONProvider(DefaultJSONProvider):   
         def dumps(self, obj, **kwargs):
+            # jsonify() sólo pasa separators compactos o indent=2 (debug): ambos van por orjson
+            if JSON_ENCODER == "orjson" and set(kwargs) <= {"separators", "indent"} \
+                    and kwargs.get("separators", (",", ":")) == (",", ":"):
+                return json_bytes(obj, indent=bool(kwargs.get("indent"))).decode("utf-8")
             # fuerza UTF-8 real en vez de \u00xx
             kwargs.setdefault("ensure_ascii", False)
             return super().dumps(obj, **kwargs)
@@ -44,104 +76,276 @@ else:
     # Fallback para Flask antiguo
     app.config["JSON_AS_ASCII"] = False
 
-BASE_TMPL = """
-<!doctype html>
-<html lang="es">
-    <head>
-        <meta charset="utf-8"><meta name="viewport" content="width=device-width, initial-scale=1">
-        <title>{{title}}</title>
-        <style>
-            body{font-family:system-ui,-apple-system,Segoe UI,Roboto,Ubuntu,Calibri,Arial,sans-serif;margin:24px}
-            header{display:flex;gap:12px;align-items:center;flex-wrap:wrap}
-            form input, form select{padding:8px;border:1px solid #ddd;border-radius:8px}
-            form button, a.btn{padding:8px 12px;border:1px solid #ccc;border-radius:8px;background:#f6f6f6;cursor:pointer;text-decoration:none;color:#111}
-            table{border-collapse:collapse;width:100%;margin-top:16px}
-            th,td{border:1px solid #eee;padding:8px;text-align:left}
-            th{background:#fafafa}
-            .muted{color:#666}
-            code{background:#f6f6f6;padding:2px 6px;border-radius:6px}
-        </style>
-    </head>
-    <body>
-        <header>
-            <h1 style="margin:0">{{title}}</h1>
-            <!-- <a class="btn" href="/">Inicio</a>
-            <a class="btn" href="/introspect">Introspect</a> -->
-        </header>
-
-        <form method="get" action="/">
-            <!-- <input type="text" name="q" placeholder="Buscar Caseta (LIKE)" value="{{q or ''}}">
-            <input type="text" name="fecha" placeholder="Fecha exacta (YYYY-MM-DD)" value="{{fecha or ''}}">-->
-            <select name="table">
-                {% for t in allowed %}
-                <option value="{{t}}" {% if t==table %}selected{% endif %}>{{t}}</option>
-                {% endfor %}
-            </select>
-            <select name="limit">
-                {% for n in ["50","100","200","500","Todos"] %}
-                <option value="{{n}}" {% if limit_arg==n %}selected{% endif %}>{{n}}</option>
-                {% endfor %}
-            </select>
-            <button type="submit">Buscar</button>
-            <a class="btn" href="/export{{'?' + request.query_string.decode() if request.query_string else ''}}">Exportar CSV</a>
-        </form>
-
-        <!-- <p class="muted">
-            Base: <code>{{db_path}}</code> |
-            Vista/tabla: <code>{{table}}</code> |
-            Total registros: {{total}} |
-            Última fecha: {{ultima or "—"}}
-        </p> -->
-
-        {% if error %}<p style="color:#b00"><strong>{{error}}</strong></p>{% endif %}
-
-        <table>
-            <thead>
-                <tr>
-                    {% for h in headers %}
-                    <th>
-                        {{h}}
-                    </th>
-                    {% endfor %}
-                </tr>
-            </thead>
-            <tbody>
-                {% for r in rows %}
-                <tr>
-                    {% for k in headers %}
-                    <td>
-                        {{r[k]}}
-                    </td>
-                    {% endfor %}</tr>
-                {% endfor %}
-            </tbody>
-        </table>
-    </body>
-</html>
-"""
-
 # --- Utilidades SQLite ---
-def connect():
+# Con DB_PUBLISH_DIR la API lee el último snapshot publicado por el scraper (inmutable, mmap)
+# y nunca compite con la ingesta; DB_PATH queda como BD maestra (escrituras y api_key).
+DB_PUBLISH_DIR = os.environ.get("DB_PUBLISH_DIR")
+SQLITE_MMAP_MB = int(os.environ.get("SQLITE_MMAP_MB", "256"))
+_publicada = (None, None)   # (stat del puntero, ruta del snapshot)
+
+def ruta_lectura():
+    """BD que sirve la API: el snapshot vigente según el puntero, o DB_PATH si no hay."""
+    global _publicada
+    if not DB_PUBLISH_DIR:
+        return DB_PATH
+    try:
+        st = os.stat(os.path.join(DB_PUBLISH_DIR, db_publicar.PUNTERO))
+    except FileNotFoundError:
+        return DB_PATH
+    clave = (st.st_ino, st.st_mtime_ns, st.st_size)
+    if clave != _publicada[0]:   # el puntero sólo se relee cuando el scraper publica
+        _publicada = (clave, db_publicar.leer_puntero(DB_PUBLISH_DIR) or DB_PATH)
+    return _publicada[1]
+
+def connect(ruta=None):
+    ruta = ruta or ruta_lectura()
+    if ruta == DB_PATH:
+        con = sqlite3.connect(DB_PATH)
+    else:
+        con = db_publicar.abrir_lectura(ruta, SQLITE_MMAP_MB * 1024 * 1024)
+    con.row_factory = sqlite3.Row
+    return con
+
+def connect_maestra():
     con = sqlite3.connect(DB_PATH)
     con.row_factory = sqlite3.Row
     return con
 
+# --- Chequeo de esquema al arrancar: una lectura de PRAGMA user_version (sin DDL) ---
+SCHEMA_CHECK = os.environ.get("SCHEMA_CHECK", "1") == "1"
+
+def verificar_esquema():
+    ruta = ruta_lectura()
+    if ruta != DB_PATH:
+        con = connect(ruta)
+    else:
+        # mode=rw: si DB_PATH no existe, sqlite3.connect crearía un archivo vacío antes de fallar
+        try:
+            con = sqlite3.connect(f"file:{pathname2url(os.path.abspath(ruta))}?mode=rw", uri=True)
+        except sqlite3.OperationalError as ex:
+            raise RuntimeError(f"No se pudo abrir la BD {ruta} ({ex}). "
+                               f"Crea o migra la BD con: python db/migrate.py --db <ruta BD>") from ex
+    try:
+        return db_migrate.verificar(con)
+    finally:
+        con.close()
+
+if SCHEMA_CHECK:
+    verificar_esquema()
+
 def list_all(cur):
-    cur.execute("SELECT name, type FROM sqlite_master WHERE type IN ('table','view') ORDER BY type, name")
-    return [(r["name"], r["type"]) for r in cur.fetchall()]
+    rows = ejecutar(cur, "SELECT name, type FROM sqlite_master WHERE type IN ('table','view') ORDER BY type, name",
+                    vista="sqlite_master")
+    return [(r["name"], r["type"]) for r in rows]
 
 def cols_for(cur, table):
     cur.execute(f"PRAGMA table_info({table})")
     return [r["name"] for r in cur.fetchall()]
 
 def choose_headers(cur, table):
-    cols = cols_for(cur, table)
+    # `id` sólo sirve de cursor (paginación keyset); no se muestra ni se exporta
+    cols = [c for c in cols_for(cur, table) if c != "id"]
     # mantén el orden preferido, pero sólo las que existan
     headers = [c for c in PREFERRED_ORDER if c in cols]
     # si la vista tiene otras columnas, añádelas al final
     extras = [c for c in cols if c not in headers]
     return headers + extras
 
+# --- Métricas (formato Prometheus) + slow-query log + profiler opcional ---
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "250"))
+SQL_PROFILE = os.environ.get("SQL_PROFILE", "0") == "1"   # trace + progress handler de sqlite3
+SQL_PROFILE_STEP = 1000                                     # instrucciones VM por llamada al progress handler
+BUCKETS_SEG = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_FILAS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+BUCKETS_BYTES = (1024, 10240, 102400, 1048576, 10485760, 104857600)
+
+
+class Metricas:
+    """Histogramas y contadores en memoria (por proceso), expuestos en /metrics."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histogramas = {}   # (nombre, labels) -> [cuentas_por_bucket, suma, total]
+        self.buckets = {}       # nombre -> buckets
+        self.contadores = {}    # (nombre, labels) -> valor
+
+    def observar(self, nombre, labels, valor, buckets=BUCKETS_SEG):
+        clave = (nombre, tuple(sorted(labels.items())))
+        with self.lock:
+            self.buckets.setdefault(nombre, buckets)
+            h = self.histogramas.get(clave)
+            if h is None:
+                h = self.histogramas[clave] = [[0] * len(buckets), 0.0, 0]
+            for i, b in enumerate(buckets):
+                if valor <= b:
+                    h[0][i] += 1
+            h[1] += valor
+            h[2] += 1
+
+    def sumar(self, nombre, labels, n=1):
+        clave = (nombre, tuple(sorted(labels.items())))
+        with self.lock:
+            self.contadores[clave] = self.contadores.get(clave, 0) + n
+
+    def exposicion(self):
+        def fmt(labels, extra=()):
+            pares = list(labels) + list(extra)
+            if not pares:
+                return ""
+            return "{" + ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in pares) + "}"
+        out = []
+        with self.lock:
+            for nombre in sorted({n for n, _ in self.histogramas}):
+                out.append(f"# TYPE {nombre} histogram")
+                for (n, labels), (cuentas, suma, total) in sorted(self.histogramas.items()):
+                    if n != nombre:
+                        continue
+                    for b, c in zip(self.buckets[nombre], cuentas):
+                        out.append(f"{nombre}_bucket{fmt(labels, [('le', b)])} {c}")
+                    out.append(f"{nombre}_bucket{fmt(labels, [('le', '+Inf')])} {total}")
+                    out.append(f"{nombre}_sum{fmt(labels)} {suma}")
+                    out.append(f"{nombre}_count{fmt(labels)} {total}")
+            for nombre in sorted({n for n, _ in self.contadores}):
+                out.append(f"# TYPE {nombre} counter")
+                for (n, labels), valor in sorted(self.contadores.items()):
+                    if n == nombre:
+                        out.append(f"{nombre}{fmt(labels)} {valor}")
+        return "\n".join(out) + "\n"
+
+
+METRICAS = Metricas()
+SLOW_QUERIES = collections.deque(maxlen=200)
+
+
+def _registrar_slow_query(cur, sql, params, vista, seg):
+    try:
+        plan = [r[-1] for r in cur.connection.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()]
+    except sqlite3.Error as ex:
+        plan = [f"(sin plan: {ex})"]
+    entrada = {
+        "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "view": vista,
+        "ms": round(seg * 1000, 1),
+        "sql": " ".join(sql.split()),
+        "params": list(params),
+        "plan": plan,
+    }
+    SLOW_QUERIES.append(entrada)
+    METRICAS.sumar("sibuac_sql_slow_queries_total", {"view": vista})
+    app.logger.warning("slow query %.1f ms [%s]: %s | plan: %s", entrada["ms"], vista, entrada["sql"], plan)
+
+
+def ejecutar(cur, sql, params=(), vista=""):
+    """cur.execute + fetchall con métricas por vista, slow-query log y profiler opcional."""
+    con = cur.connection
+    pasos = [0]
+    sentencias = [0]
+    if SQL_PROFILE:
+        def _progreso():
+            pasos[0] += SQL_PROFILE_STEP
+            return 0
+        def _traza(_sql):
+            sentencias[0] += 1
+        con.set_progress_handler(_progreso, SQL_PROFILE_STEP)
+        con.set_trace_callback(_traza)
+    t0 = time.perf_counter()
+    try:
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+    finally:
+        if SQL_PROFILE:
+            con.set_progress_handler(None, SQL_PROFILE_STEP)
+            con.set_trace_callback(None)
+    seg = time.perf_counter() - t0
+    METRICAS.observar("sibuac_sql_query_duration_seconds", {"view": vista}, seg)
+    METRICAS.observar("sibuac_sql_rows_returned", {"view": vista}, len(rows), BUCKETS_FILAS)
+    if SQL_PROFILE:
+        METRICAS.sumar("sibuac_sqlite_vm_steps_total", {"view": vista}, pasos[0])
+        METRICAS.sumar("sibuac_sqlite_statements_total", {"view": vista}, sentencias[0])
+    if seg * 1000 >= SLOW_QUERY_MS:
+        _registrar_slow_query(cur, sql, params, vista, seg)
+    return rows
+
+
+@app.before_request
+def _metricas_inicio():
+    g.t0_metricas = time.perf_counter()
+
+
+@app.after_request
+def _metricas_fin(response):
+    t0 = g.pop("t0_metricas", None)
+    if t0 is not None:
+        endpoint = request.endpoint or "404"
+        METRICAS.observar("sibuac_http_request_duration_seconds", {"endpoint": endpoint},
+                          time.perf_counter() - t0)
+        METRICAS.sumar("sibuac_http_requests_total", {"endpoint": endpoint, "status": response.status_code})
+        if response.content_length is not None:
+            METRICAS.observar("sibuac_http_response_bytes", {"endpoint": endpoint},
+                              response.content_length, BUCKETS_BYTES)
+    return response
+
+
+# --- Compresión de respuestas (Accept-Encoding: br si hay módulo brotli, si no gzip) ---
+try:
+    import brotli
+except ImportError:
+    brotli = None
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_TIPOS = ("application/json", "text/html", "text/csv")
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", "5"))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", "4"))
+
+def elegir_encoding(accept_encoding):
+    """'br', 'gzip' o None según Accept-Encoding (respeta q=0) y los módulos disponibles."""
+    calidades = {}
+    for parte in (accept_encoding or "").lower().split(","):
+        nombre, _, params = parte.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        calidades[nombre.strip()] = q
+    comodin = calidades.get("*", 0.0)
+    candidatos = (["br"] if brotli is not None else []) + ["gzip"]
+    mejor = max(candidatos, key=lambda e: calidades.get(e, comodin))   # empate: br primero
+    return mejor if calidades.get(mejor, comodin) > 0 else None
+
+def comprimir(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+@app.after_request
+def _comprimir_respuesta(response):
+    # registrado después de _metricas_fin → corre antes (Flask invierte el orden): /metrics ve bytes en el cable
+    if (response.direct_passthrough or response.is_streamed or response.status_code < 200
+            or "Content-Encoding" in response.headers or response.mimetype not in COMPRESS_TIPOS):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = elegir_encoding(request.headers.get("Accept-Encoding"))
+    body = response.get_data()
+    if encoding is None or len(body) < COMPRESS_MIN_BYTES:
+        return response
+    response.set_data(comprimir(body, encoding))
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+@app.route("/metrics")
+def metrics():
+    return Response(METRICAS.exposicion(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/metrics/slow")
+def metrics_slow():
+    if not require_api_key():
+        return jsonify({"error":"unauthorized"}), 401
+    return jsonify({"threshold_ms": SLOW_QUERY_MS, "items": list(SLOW_QUERIES)})
+
+
 # --- Rutas ---
 @app.route("/introspect")
 def introspect():
@@ -150,8 +354,7 @@ def introspect():
     out = ["<h1>Introspect</h1>", f"<p>DB: <code>{DB_PATH}</code></p>", "<ul>"]
     for name, typ in all_objs:
         out.append(f"<li><strong>{name}</strong> <em>({typ})</em><br>")
-        cur.execute(f"PRAGMA table_info({name})")
-        rows = cur.fetchall()
+        rows = ejecutar(cur, f"PRAGMA table_info({name})", vista="introspect")
         out.append("<table border=1 cellpadding=4><tr><th>#</th><th>columna</th><th>tipo</th></tr>")
         for r in rows:
             out.append(f"<tr><td>{r['cid']}</td><td>{r['name']}</td><td>{r['type']}</td></tr>")
@@ -159,6 +362,81 @@ def introspect():
     out.append("</ul>")
     return "\n".join(out)
 
+# --- Paginación por cursor (keyset) sobre (fecha DESC, id DESC); ver migración 006 ---
+PAGE_SIZES = (50, 100, 200, 500)
+
+def codificar_cursor(fila):
+    crudo = json.dumps([fila["fecha"], fila["id"]], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(crudo).decode("ascii").rstrip("=")
+
+def leer_cursor(txt):
+    """(fecha, id) o None si el cursor no es válido."""
+    if not txt:
+        return None
+    try:
+        fecha, id_ = json.loads(base64.urlsafe_b64decode(txt + "=" * (-len(txt) % 4)))
+        return fecha, int(id_)
+    except (ValueError, TypeError):
+        return None
+
+# ORDER BY fecha DESC deja al final las filas con fecha NULL (vigente_desde de históricos
+# heredados) y (fecha, id) < (?, ?) nunca las incluye: se recorren en un tramo aparte,
+# `fecha IS NULL` por id. Cada tramo usa el índice (fecha, id) de la vista.
+# En las vistas de FECHA_NO_NULA el tramo se omite (SQLite lo resolvería recorriendo la tabla).
+FECHA_NO_NULA = {"vw_tarifa_snapshot"}   # fecha = tarifa_snapshot.fecha_corte (NOT NULL)
+
+def tramos_keyset(after=None, before=None, nulos=True):
+    """[(condición, params, orden)] que recorre una página keyset, en orden."""
+    cursor = before or after
+    if cursor and cursor[0] is None and not nulos:
+        return []
+    if before:
+        fecha, id_ = before
+        if fecha is None:
+            return [("fecha IS NULL AND id > ?", [id_], "ORDER BY id ASC"),
+                    ("fecha IS NOT NULL", [], "ORDER BY fecha ASC, id ASC")]
+        return [("(fecha, id) > (?, ?)", [fecha, id_], "ORDER BY fecha ASC, id ASC")]
+    if after and after[0] is None:
+        return [("fecha IS NULL AND id < ?", [after[1]], "ORDER BY id DESC")]
+    desc = "ORDER BY fecha DESC, id DESC"
+    if not nulos:
+        return [("(fecha, id) < (?, ?)", list(after), desc)] if after else [(None, [], desc)]
+    primero = ("(fecha, id) < (?, ?)", list(after), desc) if after else ("fecha IS NOT NULL", [], desc)
+    return [primero, ("fecha IS NULL", [], "ORDER BY id DESC")]
+
+def condicion_after(after, nulos=True):
+    """Filas posteriores al cursor en ORDER BY fecha DESC, id DESC (NULL al final), en una condición."""
+    if after[0] is None:
+        return ("fecha IS NULL AND id < ?", [after[1]]) if nulos else ("0", [])
+    if not nulos:
+        return "(fecha, id) < (?, ?)", list(after)
+    return "((fecha, id) < (?, ?) OR fecha IS NULL)", list(after)
+
+def pagina_keyset(cur, table, headers, filters, params, n, after=None, before=None):
+    """
+    Una página de n filas a partir de un cursor. `after` = páginas más antiguas,
+    `before` = más recientes. Devuelve (filas, cursor_prev, cursor_next).
+    """
+    rows = []
+    for cond, extra, order_sql in tramos_keyset(after, before, nulos=table not in FECHA_NO_NULA):
+        falta = n + 1 - len(rows)
+        if falta <= 0:
+            break
+        conds = list(filters) + ([cond] if cond else [])
+        where_sql = ("WHERE " + " AND ".join(conds)) if conds else ""
+        sql = f"SELECT {', '.join(headers + ['id'])} FROM {table} {where_sql} {order_sql} LIMIT {falta}"
+        rows += [dict(r) for r in ejecutar(cur, sql, list(params) + extra, vista=table)]
+
+    hay_mas = len(rows) > n
+    rows = rows[:n]
+    if before:
+        rows.reverse()
+    hay_prev = hay_mas if before else bool(after)
+    hay_next = bool(before) or hay_mas
+    prev_c = codificar_cursor(rows[0]) if rows and hay_prev else None
+    next_c = codificar_cursor(rows[-1]) if rows and hay_next else None
+    return rows, prev_c, next_c
+
 @app.route("/")
 def index():
     c = request.args.get("c")
@@ -168,15 +446,14 @@ def index():
     if table not in ALLOWED_TABLES:
         table = DEFAULT_TABLE
 
+    # tamaño de página fijo (PAGE_SIZES); "Todos", 0 o valores mayores se acotan al máximo.
+    # Negativos → 1: pagina_keyset emite LIMIT n+1 y SQLite toma un LIMIT negativo como "sin límite"
     limit_arg = (request.args.get("limit") or "100").strip().lower()
-    unlimited = limit_arg in ("all","todo","todos","infinity","inf","0","Todos")
-    if unlimited:
-        limit_clause = ""
-    else:
-        try:
-            limit_clause = f"LIMIT {int(limit_arg)}"
-        except ValueError:
-            limit_clause = "LIMIT 100"; limit_arg = "100"
+    try:
+        limit = min(int(limit_arg), PAGE_SIZES[-1]) or PAGE_SIZES[-1]
+        limit = max(limit, 1)
+    except ValueError:
+        limit = PAGE_SIZES[-1] if limit_arg in ("all","todo","todos","infinity","inf") else 100
 
     con = connect(); cur = con.cursor()
 
@@ -192,27 +469,26 @@ def index():
     if fecha and "fecha" in cols_for(cur, table):
         filters.append("fecha = ?"); params.append(fecha)
 
-    where_sql = ("WHERE " + " AND ".join(filters)) if filters else ""
-    order_sql = "ORDER BY fecha DESC" if "fecha" in headers else ""
-
-    sel = ", ".join(headers)
-    sql = f"SELECT {sel} FROM {table} {where_sql} {order_sql} {limit_clause}"
-    cur.execute(sql, params); rows = [dict(r) for r in cur.fetchall()]
+    after = leer_cursor(request.args.get("after"))
+    before = None if after else leer_cursor(request.args.get("before"))
+    rows, prev_c, next_c = pagina_keyset(cur, table, headers, filters, params, limit, after, before)
 
-    # total y última fecha
-    cur.execute(f"SELECT COUNT(*) AS c FROM {table}")
-    total = cur.fetchone()["c"]
     ultima = None
     if "fecha" in headers:
-        cur.execute(f"SELECT MAX(fecha) AS f FROM {table}")
-        ultima = cur.fetchone()["f"]
+        ultima = ejecutar(cur, f"SELECT MAX(fecha) AS f FROM {table}", vista=table)[0]["f"]
+    con.close()
 
-    return render_template_string(
-        BASE_TMPL,
+    base_args = {k: v for k, v in request.args.items() if k not in ("after", "before")}
+    base_args.update(table=table, limit=limit)
+    return render_template(
+        "explorador.html",
         title=APP_TITLE, db_path=DB_PATH,
-        table=table, allowed=sorted(ALLOWED_TABLES),
-        headers=headers, rows=rows, total=total, ultima=ultima,
-        q=q, fecha=fecha, limit_arg=limit_arg, error=None
+        table=table, allowed=sorted(ALLOWED_TABLES), page_sizes=PAGE_SIZES,
+        headers=headers, rows=rows, ultima=ultima,
+        q=q, fecha=fecha, limit=limit, error=None,
+        first_url=url_for("index", **base_args) if (after or before) else None,
+        prev_url=url_for("index", **base_args, before=prev_c) if prev_c else None,
+        next_url=url_for("index", **base_args, after=next_c) if next_c else None,
     )
 
 @app.route("/export")
@@ -239,73 +515,401 @@ def export_csv():
     order_sql = "ORDER BY fecha DESC" if "fecha" in headers else ""
     sel = ", ".join(headers)
     sql = f"SELECT {sel} FROM {table} {where_sql} {order_sql} LIMIT 100000"
-    cur.execute(sql, params); rows = [dict(r) for r in cur.fetchall()]
+    rows = [dict(r) for r in ejecutar(cur, sql, params, vista=table)]
 
     output = io.StringIO()
     writer = csv.DictWriter(output, fieldnames=headers)
     writer.writeheader()
     for r in rows: writer.writerow(r)
 
-    mem = io.BytesIO(output.getvalue().encode("utf-8"))
-    mem.seek(0)
-    return send_file(mem, mimetype="text/csv", as_attachment=True, download_name=f"{table}.csv")
+    # Response en memoria (no send_file): send_file marca direct_passthrough y _comprimir_respuesta lo saltaría
+    return Response(output.getvalue().encode("utf-8"), mimetype="text/csv",
+                    headers={"Content-Disposition": f'attachment; filename="{table}.csv"'})
 
 # --- API ---
 API_KEY = os.environ.get("API_KEY", "admin")
 CORS(app, resources={r"/api/*":{"origins": "*"}})
 api = Blueprint("api", __name__, url_prefix="/api/v1")
 
+# /api/v1/<ruta> -> vista (compartido con asgi.py)
+API_VIEWS = {
+    "vigente": "vw_tarifa_vigente",
+    "hist": "vw_tarifa_hist",
+    "snapshot": "vw_tarifa_snapshot",
+    # vista compara vigente vs anterior y muestra delta (ya definida en tu schema)
+    "cambios": "vw_cambios_recientes",
+}
+
 @api.route("/vigente")   
 def api_vigente():
-    return query_view("vw_tarifa_vigente")
+    return query_view(API_VIEWS["vigente"])
 
 @api.route("/hist")
 def api_hist():
-    return query_view("vw_tarifa_hist")
+    return query_view(API_VIEWS["hist"])
 
 @api.route("/snapshot")
 def api_snapshot():
-    return query_view("vw_tarifa_snapshot")
+    return query_view(API_VIEWS["snapshot"])
 
 @api.route("/cambios")
 def api_cambios():
-    # vista compara vigente vs anterior y muestra delta (ya definida en tu schema)
-    return query_view("vw_cambios_recientes")
+    return query_view(API_VIEWS["cambios"])
+
+# --- Feed de cambios (outbox consulta_evento, escrita por el scraper en _end_consulta) ---
+EVENTOS_POLL_S = float(os.environ.get("EVENTOS_POLL_S", "2"))
+EVENTOS_MAX_WAIT_S = float(os.environ.get("EVENTOS_MAX_WAIT_S", "60"))
+EVENTOS_STREAM_S = float(os.environ.get("EVENTOS_STREAM_S", "300"))   # el navegador reconecta solo (SSE)
+EVENTOS_HEARTBEAT_S = 15.0
+# Flask/WSGI atiende cada espera con un hilo (time.sleep): se acota cuántas hay a la vez para que
+# los suscriptores no acaparen los hilos de "/", /export y /metrics. asgi.py los sirve con asyncio.
+EVENTOS_MAX_STREAMS = int(os.environ.get("EVENTOS_MAX_STREAMS", "4"))
+_cupo_eventos = threading.BoundedSemaphore(EVENTOS_MAX_STREAMS)
+
+def leer_eventos(since, limite=100, con=None):
+    # sin `con`, conexión nueva por sondeo: con DB_PUBLISH_DIR así se ve el último snapshot publicado
+    propia = con is None
+    if propia:
+        con = connect()
+    try:
+        rows = ejecutar(con.cursor(), """SELECT consulta_id, fuente, fecha_corte, nuevos_hist, snapshots,
+                                                definiciones_json, creado_at
+                                         FROM consulta_evento WHERE consulta_id > ?
+                                         ORDER BY consulta_id LIMIT ?""", (since, limite), vista="consulta_evento")
+    finally:
+        if propia:
+            con.close()
+    eventos = []
+    for r in rows:
+        ev = dict(r)
+        ev["definiciones"] = json.loads(ev.pop("definiciones_json") or "[]")
+        eventos.append(ev)
+    return eventos
+
+def since_arg(valor):
+    try:
+        return int(valor or 0)
+    except ValueError:
+        raise ParametroInvalido("since must be a consulta id")
+
+def wait_arg(valor):
+    try:
+        return max(min(float(valor or 0), EVENTOS_MAX_WAIT_S), 0.0)
+    except ValueError:
+        raise ParametroInvalido("wait must be a number of seconds")
+
+def autorizar_evento(key):
+    """Auth + rate limit al abrir el feed; el cupo concurrente no se retiene mientras se espera."""
+    with permiso_api(key):
+        pass
+
+def respuesta_eventos(since, eventos):
+    ultima = eventos[-1]["consulta_id"] if eventos else since
+    return {"since": since, "ultima_consulta": ultima, "count": len(eventos), "eventos": eventos}
+
+def sse_evento(ev):
+    return f"id: {ev['consulta_id']}\nevent: consulta\ndata: {json_bytes(ev).decode('utf-8')}\n\n"
+
+SSE_RETRY = f"retry: {int(EVENTOS_POLL_S * 1000)}\n\n"
+SSE_PING = ": ping\n\n"
+
+def _error_evento(ex):
+    if isinstance(ex, NoAutorizado):
+        return jsonify({"error":"unauthorized"}), 401
+    if isinstance(ex, LimiteExcedido):
+        return jsonify({"error": str(ex)}), 429, {"Retry-After": str(ex.retry_after)}
+    return jsonify({"error": str(ex)}), 400
+
+def _sin_cupo_eventos():
+    return jsonify({"error": "too many event streams"}), 503, {"Retry-After": str(int(EVENTOS_POLL_S) + 1)}
+
+@api.route("/eventos")
+def api_eventos():
+    """Long-poll: devuelve eventos con consulta_id > since; si no hay, espera hasta wait s (máx. EVENTOS_MAX_WAIT_S)."""
+    key = request.headers.get("X-API-Key") or request.args.get("api_key")
+    try:
+        autorizar_evento(key)
+        since = since_arg(request.args.get("since"))
+        wait = wait_arg(request.args.get("wait"))
+    except (NoAutorizado, LimiteExcedido, ParametroInvalido) as ex:
+        return _error_evento(ex)
+
+    eventos = leer_eventos(since)
+    if eventos or not wait:
+        return jsonify(respuesta_eventos(since, eventos))
+    if not _cupo_eventos.acquire(blocking=False):
+        return _sin_cupo_eventos()
+    try:
+        fin = time.monotonic() + wait
+        while not eventos and time.monotonic() < fin:
+            time.sleep(min(EVENTOS_POLL_S, max(fin - time.monotonic(), 0)))
+            eventos = leer_eventos(since)
+    finally:
+        _cupo_eventos.release()
+    return jsonify(respuesta_eventos(since, eventos))
+
+@api.route("/eventos/stream")
+def api_eventos_stream():
+    """Server-Sent Events: un `event: consulta` por evento; reanuda desde Last-Event-ID o since."""
+    key = request.headers.get("X-API-Key") or request.args.get("api_key")
+    try:
+        autorizar_evento(key)
+        since = since_arg(request.headers.get("Last-Event-ID") or request.args.get("since"))
+    except (NoAutorizado, LimiteExcedido, ParametroInvalido) as ex:
+        return _error_evento(ex)
+    if not _cupo_eventos.acquire(blocking=False):
+        return _sin_cupo_eventos()
+
+    def generar(ultimo):
+        fin = time.monotonic() + EVENTOS_STREAM_S
+        latido = time.monotonic()
+        yield SSE_RETRY
+        while time.monotonic() < fin:
+            for ev in leer_eventos(ultimo):
+                ultimo = ev["consulta_id"]
+                yield sse_evento(ev)
+                latido = time.monotonic()
+            if time.monotonic() - latido >= EVENTOS_HEARTBEAT_S:
+                yield SSE_PING
+                latido = time.monotonic()
+            time.sleep(EVENTOS_POLL_S)
+
+    resp = Response(generar(since), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    # el cupo se devuelve al cerrar la respuesta (fin del stream o desconexión del cliente)
+    resp.call_on_close(_cupo_eventos.release)
+    return resp
 
 # Registra el blueprint
 app.register_blueprint(api)
 
 
+# --- Auth: llaves hasheadas en SQLite (tabla api_key), caché en memoria y límites por llave ---
+AUTH_CACHE_TTL = float(os.environ.get("AUTH_CACHE_TTL", "60"))
+HEAVY_LIMIT = int(os.environ.get("HEAVY_LIMIT", "5000"))   # limit > HEAVY_LIMIT (o all) = consulta costosa
+# límites de la llave de entorno API_KEY (compatibilidad con el despliegue anterior)
+LIMITES_DEFAULT = {
+    "rate_per_min": float(os.environ.get("API_RATE_PER_MIN", "120")),
+    "burst": int(os.environ.get("API_BURST", "30")),
+    "heavy_per_min": float(os.environ.get("API_HEAVY_PER_MIN", "4")),
+    "heavy_burst": int(os.environ.get("API_HEAVY_BURST", "2")),
+    "max_concurrent": int(os.environ.get("API_MAX_CONCURRENT", "4")),
+}
+
+
+class NoAutorizado(Exception):
+    pass
+
+
+class ParametroInvalido(Exception):
+    pass
+
+
+class LimiteExcedido(Exception):
+    def __init__(self, mensaje, retry_after):
+        super().__init__(mensaje)
+        self.retry_after = retry_after
+
+
+def hash_key(key):
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class _TokenBucket:
+    def __init__(self, por_min, capacidad):
+        self.config = (por_min, capacidad)   # para reconstruirlo si cambian los límites en la BD
+        self.tasa = por_min / 60.0
+        self.capacidad = max(float(capacidad), 1.0)
+        self.tokens = self.capacidad
+        self.t = time.monotonic()
+
+    def espera(self):
+        """Recarga y devuelve 0 si hay un token disponible, o los segundos a esperar si no (no consume)."""
+        ahora = time.monotonic()
+        self.tokens = min(self.capacidad, self.tokens + (ahora - self.t) * self.tasa)
+        self.t = ahora
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.tasa if self.tasa > 0 else 60
+
+    def tomar(self):
+        """Consume un token; devuelve 0 si hubo, o los segundos a esperar si no."""
+        espera = self.espera()
+        if not espera:
+            self.tokens -= 1
+        return espera
+
+
+class AuthCache:
+    """
+    Llaves válidas (sha256) cargadas de la tabla api_key + la de entorno API_KEY.
+    Se recargan cada AUTH_CACHE_TTL s (o ante una llave desconocida, como mucho cada 5 s).
+    La consulta a la BD corre fuera de self.lock (un solo hilo a la vez, con self.recarga); las
+    demás peticiones siguen autenticando con el dict anterior hasta que se reemplaza.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.recarga = threading.Lock()
+        self.llaves = {}          # key_hash -> cliente (dict con límites); se reemplaza entero
+        self.cargado = 0.0
+        self.buckets = {}         # (key_hash, "rate"|"heavy") -> _TokenBucket
+        self.activos = {}         # key_hash -> peticiones en curso
+
+    def _leer_llaves(self):
+        llaves = {}
+        if API_KEY:
+            h = hash_key(API_KEY)
+            llaves[h] = dict(LIMITES_DEFAULT, nombre="env", key_hash=h)
+        try:
+            con = connect_maestra()   # llaves nuevas visibles sin esperar a la próxima publicación
+            try:
+                for r in con.execute("""SELECT nombre, key_hash, rate_per_min, burst, heavy_per_min,
+                                               heavy_burst, max_concurrent
+                                        FROM api_key WHERE activo=1"""):
+                    llaves[r["key_hash"]] = dict(r)
+            finally:
+                con.close()
+        except sqlite3.OperationalError:
+            pass  # BD sin migración 004: sólo la llave de entorno
+        return llaves
+
+    def _cargar(self):
+        # la primera carga espera a la que esté en curso; después, si otro hilo ya recarga, se sigue
+        # con las llaves actuales
+        if not self.recarga.acquire(blocking=not self.cargado):
+            return
+        try:
+            if self.cargado and time.monotonic() - self.cargado <= 5:
+                return   # otro hilo acaba de recargar
+            llaves = self._leer_llaves()
+            with self.lock:
+                self.llaves = llaves
+                self.cargado = time.monotonic()
+                # buckets de llaves revocadas o con límites distintos en la BD: se reconstruyen al próximo uso
+                for (h, tipo), b in list(self.buckets.items()):
+                    cliente = llaves.get(h)
+                    if cliente is None or b.config != self._limites(cliente, tipo):
+                        del self.buckets[(h, tipo)]
+        finally:
+            self.recarga.release()
+
+    @staticmethod
+    def _limites(cliente, tipo):
+        if tipo == "heavy":
+            return cliente["heavy_per_min"], cliente["heavy_burst"]
+        return cliente["rate_per_min"], cliente["burst"]
+
+    def autenticar(self, key):
+        if not key:
+            return None
+        h = hash_key(key)
+        edad = time.monotonic() - self.cargado
+        if edad > AUTH_CACHE_TTL or (h not in self.llaves and edad > 5):
+            self._cargar()
+        return self.llaves.get(h)
+
+    def admitir(self, cliente, costoso=False):
+        h = cliente["key_hash"]
+        with self.lock:
+            if self.activos.get(h, 0) >= cliente["max_concurrent"]:
+                raise LimiteExcedido("too many concurrent requests", 1)
+            buckets = []
+            for tipo in (("rate", "heavy") if costoso else ("rate",)):
+                b = self.buckets.get((h, tipo))
+                if b is None:
+                    b = self.buckets[(h, tipo)] = _TokenBucket(*self._limites(cliente, tipo))
+                buckets.append((tipo, b))
+            # primero se revisan todos; los tokens sólo se consumen si la petición pasa
+            for tipo, b in buckets:
+                espera = b.espera()
+                if espera:
+                    raise LimiteExcedido(f"rate limit ({tipo})", int(espera) + 1)
+            for _, b in buckets:
+                b.tomar()
+            self.activos[h] = self.activos.get(h, 0) + 1
+
+    def liberar(self, cliente):
+        with self.lock:
+            self.activos[cliente["key_hash"]] -= 1
+
+
+AUTH = AuthCache()
+
+
+@contextmanager
+def permiso_api(key, costoso=False):
+    """Autentica + aplica límites; el cupo concurrente se libera al salir."""
+    with permiso_cliente(AUTH.autenticar(key), costoso) as cliente:
+        yield cliente
+
+
+@contextmanager
+def permiso_cliente(cliente, costoso=False):
+    """Límites para un cliente ya autenticado (asgi.py autentica en el pool: puede recargar la BD)."""
+    if cliente is None:
+        raise NoAutorizado()
+    AUTH.admitir(cliente, costoso)
+    try:
+        yield cliente
+    finally:
+        AUTH.liberar(cliente)
+
+
+def es_costosa(args):
+    lim, _ = parse_pagination(args)
+    return lim is None or lim > HEAVY_LIMIT
+
+
+def api_key_valida(key):
+    return AUTH.autenticar(key) is not None
+
 def require_api_key():
     key = request.headers.get("X-API-Key") or request.args.get("api_key")
-    if not key or key != API_KEY:
-        return False
-    return True
+    return api_key_valida(key)
 
-def parse_pagination():
-    limit = (request.args.get("limit") or "100").strip().lower()
-    offset = int(request.args.get("offset", 0))
+def parse_pagination(args=None):
+    args = request.args if args is None else args
+    limit = (args.get("limit") or "100").strip().lower()
+    try:
+        offset = int(args.get("offset") or 0)
+    except ValueError:
+        raise ParametroInvalido("offset must be an integer")
     if limit in ("all","todo","0","inf","infinity"):
         return None, offset
     try:
         return max(int(limit), 1), max(offset, 0)
     except:
         return 100, max(offset, 0)
-    
-def query_view(table, allowed_filters=("c","q","fecha","from","to")):
-    if not require_api_key():
-        return jsonify({"error":"unauthorized"}), 401
 
-    con = connect(); cur = con.cursor()
-    cols = cols_for(cur, table:=table) if 'cols_for' in globals() else [c for c in choose_headers(cur, table)]
+# since=<consulta_id>: filas cuyo id (migraciones 006/007) fue escrito por una consulta posterior
+_SINCE_HIST = "id IN (SELECT historial_id FROM consulta_item WHERE consulta_id > ?)"
+SINCE_SQL = {
+    "vw_tarifa_vigente": _SINCE_HIST,
+    "vw_tarifa_hist": _SINCE_HIST,
+    "vw_cambios_recientes": _SINCE_HIST,
+    "vw_tarifa_snapshot": "id IN (SELECT id FROM tarifa_snapshot WHERE consulta_id > ?)",
+}
+
+def ultima_consulta(cur):
+    """consulta_id del último evento publicado (valor para el próximo since=)."""
+    return ejecutar(cur, "SELECT MAX(consulta_id) AS c FROM consulta_evento", vista="consulta_evento")[0]["c"] or 0
+
+def consultar_vista(cur, table, args):
+    """Filtros + paginación sobre una vista; devuelve el dict de respuesta de /api/v1/*."""
+    cols = cols_for(cur, table)
     headers = choose_headers(cur, table)
 
-    c = request.args.get("c")           # LIKE sobre categoria
-    q = request.args.get("q")           # LIKE sobre caseta
-    fecha = request.args.get("fecha")   # igualdad
-    ffrom = request.args.get("from")    # rango desde (YYYY-MM-DD)
-    tto = request.args.get("to")        # rango hasta (YYYY-MM-DD)
-    lim, off = parse_pagination()
+    c = args.get("c")           # LIKE sobre categoria
+    q = args.get("q")           # LIKE sobre caseta
+    fecha = args.get("fecha")   # igualdad
+    ffrom = args.get("from")    # rango desde (YYYY-MM-DD)
+    tto = args.get("to")        # rango hasta (YYYY-MM-DD)
+    lim, off = parse_pagination(args)
+    # format=columns → {"columns": [...], "rows": [[...], ...]}: sin repetir nombres de clave por fila
+    fmt = (args.get("format") or "items").lower()
+    if fmt not in ("items", "columns"):
+        raise ParametroInvalido("format must be 'items' or 'columns'")
 
     filters, params = [], []
     if c and "categoria" in cols:
@@ -318,27 +922,102 @@ def query_view(table, allowed_filters=("c","q","fecha","from","to")):
         filters.append("fecha >= ?"); params.append(ffrom)
     if tto and "fecha" in cols:
         filters.append("fecha <= ?"); params.append(tto)
+    extra = {}
+    if args.get("since"):       # deltas: sólo filas escritas por consultas con id > since
+        try:
+            since = int(args.get("since"))
+        except ValueError:
+            raise ParametroInvalido("since must be a consulta id")
+        if table not in SINCE_SQL or "id" not in cols:
+            raise ParametroInvalido("since is not supported for this view")
+        filters.append(SINCE_SQL[table]); params.append(since)
+        extra["ultima_consulta"] = ultima_consulta(cur)
     where_sql = ("WHERE " + " AND ".join(filters)) if filters else ""
 
     # total
-    cur.execute(f"SELECT COUNT(*) AS c FROM {table} {where_sql}", params)
-    total = cur.fetchone()["c"]
+    total = ejecutar(cur, f"SELECT COUNT(*) AS c FROM {table} {where_sql}", params, vista=table)[0]["c"]
 
-    order_sql = "ORDER BY fecha DESC" if "fecha" in cols else ""
+    # cursor=<next_cursor> → keyset (fecha, id) en lugar de OFFSET (vistas con id, migración 006)
+    keyset = "fecha" in cols and "id" in cols
+    # (cursor vacío = primera página en modo keyset)
+    if keyset and "cursor" in args:
+        after = leer_cursor(args.get("cursor"))
+        if args.get("cursor") and after is None:
+            raise ParametroInvalido("invalid cursor")
+        if lim is not None:
+            rows, _, next_c = pagina_keyset(cur, table, headers, filters, params, lim, after=after)
+            if fmt == "columns":
+                cuerpo = {"columns": headers, "rows": [[r[k] for k in headers] for r in rows]}
+            else:
+                cuerpo = {"items": [{k: r[k] for k in headers} for r in rows]}
+            return {"table": table, "total": total, "count": len(rows), "limit": lim,
+                    "offset": None, "next_cursor": next_c, **extra, **cuerpo}
+        if after:
+            cond, extra = condicion_after(after, nulos=table not in FECHA_NO_NULA)
+            where_sql = "WHERE " + " AND ".join(filters + [cond])
+            params = params + extra
+
+    if keyset:
+        order_sql = "ORDER BY fecha DESC, id DESC"
+    else:
+        order_sql = "ORDER BY fecha DESC" if "fecha" in cols else ""
     sel = ", ".join(headers)
     limit_sql = "" if lim is None else f"LIMIT {lim} OFFSET {off}"
     sql = f"SELECT {sel} FROM {table} {where_sql} {order_sql} {limit_sql}"
-    cur.execute(sql, params)
-    items = [dict(r) for r in cur.fetchall()]
+    rows = ejecutar(cur, sql, params, vista=table)
+    if fmt == "columns":
+        cuerpo = {"columns": headers, "rows": [list(r) for r in rows]}
+    else:
+        cuerpo = {"items": [dict(r) for r in rows]}
 
-    return jsonify({
+    return {
         "table": table,
         "total": total,
-        "count": len(items),
+        "count": len(rows),
         "limit": lim,
         "offset": off,
-        "items": items
-    })
+        **extra,
+        **cuerpo
+    }
+
+def query_view(table, allowed_filters=("c","q","fecha","from","to")):
+    key = request.headers.get("X-API-Key") or request.args.get("api_key")
+    try:
+        with permiso_api(key, costoso=es_costosa(request.args)):
+            con = connect()
+            try:
+                return jsonify(consultar_vista(con.cursor(), table, request.args))
+            finally:
+                con.close()
+    except NoAutorizado:
+        return jsonify({"error":"unauthorized"}), 401
+    except ParametroInvalido as ex:
+        return jsonify({"error": str(ex)}), 400
+    except LimiteExcedido as ex:
+        return jsonify({"error": str(ex)}), 429, {"Retry-After": str(ex.retry_after)}
+
+
+@app.cli.command("crear-api-key")
+@click.argument("nombre")
+@click.option("--rate", default=120.0, help="Peticiones por minuto")
+@click.option("--burst", default=30)
+@click.option("--heavy-rate", default=4.0, help="Consultas costosas (limit=all) por minuto")
+@click.option("--heavy-burst", default=2)
+@click.option("--max-concurrent", default=4)
+def crear_api_key(nombre, rate, burst, heavy_rate, heavy_burst, max_concurrent):
+    """Genera una API key (se muestra una sola vez) y guarda sólo su hash."""
+    key = secrets.token_urlsafe(32)
+    con = connect_maestra()
+    try:
+        con.execute("""INSERT INTO api_key(nombre, key_hash, rate_per_min, burst, heavy_per_min, heavy_burst, max_concurrent)
+                       VALUES(?,?,?,?,?,?,?)""",
+                    (nombre, hash_key(key), rate, burst, heavy_rate, heavy_burst, max_concurrent))
+        con.commit()
+    except sqlite3.OperationalError as ex:
+        raise click.ClickException(f"{ex} (¿falta aplicar db/migrations/004_api_keys.sql?)")
+    finally:
+        con.close()
+    click.echo(f"{nombre}: {key}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,281 @@
+"""
+Servidor ASGI para la API de lectura (/api/v1/*)
+------------------------------------------------
+- Mismas URLs, auth (X-API-Key / ?api_key=), límites por llave y JSON que el blueprint
+  `api` de app.py (reutiliza consultar_vista, AUTH/permiso_cliente, json_bytes y la negociación
+  gzip/brotli de app.py; la serialización y la compresión corren en el pool, no en el loop).
+- Las lecturas SQLite corren en un pool de hilos acotado (API_THREADS) con una
+  conexión por hilo; el event loop nunca se bloquea en SQLite ni en la serialización.
+- Si hay más de API_MAX_PENDING peticiones en cola se responde 503 (backpressure).
+- Con DB_PUBLISH_DIR se lee el snapshot inmutable publicado por el scraper; cada hilo
+  reabre su conexión cuando cambia el puntero CURRENT.
+- /api/v1/eventos (long-poll) y /api/v1/eventos/stream (SSE) son nativos: la espera es asyncio.sleep
+  y cada sondeo de consulta_evento es una lectura corta en el pool, así que los suscriptores no
+  ocupan hilos (por WSGIMiddleware cada uno retendría uno de sus 10 hilos hasta 300 s).
+- Cualquier otra ruta ("/", "/export", "/metrics", ...) se delega a la app Flask (WSGI).
+
+Producción:
+    python asgi.py                                   # uvicorn, API_WORKERS procesos
+    gunicorn -c gunicorn.conf.py asgi:application    # Linux
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import app as flask_app
+
+API_THREADS = int(os.environ.get("API_THREADS", "8"))
+API_MAX_PENDING = int(os.environ.get("API_MAX_PENDING", "256"))
+API_PREFIX = "/api/v1/"
+EVENTOS_MAX_STREAMS = int(os.environ.get("EVENTOS_MAX_STREAMS_ASGI", "1000"))   # esperas abiertas a la vez
+
+_pool = ThreadPoolExecutor(max_workers=API_THREADS, thread_name_prefix="sqlite-ro")
+_local = threading.local()
+_pendientes = 0
+_esperas = 0
+
+try:
+    from uvicorn.middleware.wsgi import WSGIMiddleware
+    _wsgi = WSGIMiddleware(flask_app.app)
+except ImportError:
+    _wsgi = None
+
+
+def _conexion():
+    """
+    Conexión SQLite propia de cada hilo del pool (se reutiliza entre peticiones).
+    Si el scraper publicó un snapshot nuevo (DB_PUBLISH_DIR) se cierra y se abre el nuevo.
+    """
+    ruta = flask_app.ruta_lectura()
+    con = getattr(_local, "con", None)
+    if con is None or _local.ruta != ruta:
+        if con is not None:
+            con.close()
+        con = _local.con = flask_app.connect(ruta)
+        _local.ruta = ruta
+    return con
+
+
+def _consultar(table, args, encoding=None):
+    """Consulta + JSON + compresión, todo en el hilo del pool (el event loop sólo envía bytes)."""
+    data = flask_app.consultar_vista(_conexion().cursor(), table, args)
+    body = flask_app.json_bytes(data)
+    if encoding and len(body) >= flask_app.COMPRESS_MIN_BYTES:
+        return flask_app.comprimir(body, encoding), encoding
+    return body, None
+
+
+async def _responder(send, status, body: bytes, content_type="application/json", extra=()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", content_type.encode()),
+            (b"content-length", str(len(body)).encode()),
+            (b"access-control-allow-origin", b"*"),
+        ] + list(extra),
+    })
+    await send({"type": "http.response.body", "body": body})
+    return status
+
+
+def _sin_cuerpo(send):
+    """send para HEAD: mismas cabeceras (Content-Length del GET incluido) y cuerpo vacío, como Flask."""
+    async def enviar(msg):
+        if msg["type"] == "http.response.body":
+            msg = dict(msg, body=b"")
+        await send(msg)
+    return enviar
+
+
+def _leer_eventos(since):
+    return flask_app.leer_eventos(since, con=_conexion())
+
+
+async def _en_pool(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_pool, fn, *args)
+
+
+async def _desconexion(receive, evento):
+    """Marca `evento` cuando el cliente cierra la conexión (http.disconnect)."""
+    while True:
+        msg = await receive()
+        if msg["type"] == "http.disconnect":
+            evento.set()
+            return
+
+
+async def _dormir(segundos, desconectado):
+    """asyncio.sleep que termina antes si el cliente se desconecta. True si sigue conectado."""
+    try:
+        await asyncio.wait_for(desconectado.wait(), max(segundos, 0))
+        return False
+    except asyncio.TimeoutError:
+        return True
+
+
+async def _eventos(args, headers, key, receive, send, stream, head=False):
+    """
+    Long-poll (stream=False) o SSE (stream=True) sobre consulta_evento, sin retener hilos. Devuelve el status.
+    Con head=True el SSE responde sólo las cabeceras, sin abrir el stream.
+    """
+    global _esperas
+    try:
+        await _en_pool(flask_app.autorizar_evento, key)
+        since = flask_app.since_arg((stream and headers.get("last-event-id")) or args.get("since"))
+        wait = 0.0 if stream else flask_app.wait_arg(args.get("wait"))
+    except flask_app.NoAutorizado:
+        return await _responder(send, 401, b'{"error":"unauthorized"}')
+    except flask_app.ParametroInvalido as ex:
+        return await _responder(send, 400, flask_app.json_bytes({"error": str(ex)}))
+    except flask_app.LimiteExcedido as ex:
+        return await _responder(send, 429, flask_app.json_bytes({"error": str(ex)}),
+                                extra=[(b"retry-after", str(ex.retry_after).encode())])
+
+    eventos = [] if stream else await _en_pool(_leer_eventos, since)
+    if not stream and (eventos or not wait):
+        return await _responder(send, 200, flask_app.json_bytes(flask_app.respuesta_eventos(since, eventos)))
+    if _esperas >= EVENTOS_MAX_STREAMS:
+        return await _responder(send, 503, b'{"error":"too many event streams"}',
+                                extra=[(b"retry-after", str(int(flask_app.EVENTOS_POLL_S) + 1).encode())])
+    _esperas += 1
+    desconectado = asyncio.Event()
+    escucha = asyncio.ensure_future(_desconexion(receive, desconectado))
+    try:
+        if not stream:
+            fin = time.monotonic() + wait
+            while not eventos and time.monotonic() < fin:
+                if not await _dormir(min(flask_app.EVENTOS_POLL_S, fin - time.monotonic()), desconectado):
+                    return 200
+                eventos = await _en_pool(_leer_eventos, since)
+            return await _responder(send, 200, flask_app.json_bytes(flask_app.respuesta_eventos(since, eventos)))
+
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"text/event-stream; charset=utf-8"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+            (b"access-control-allow-origin", b"*"),
+        ]})
+        if head:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return 200
+
+        async def enviar(texto):
+            await send({"type": "http.response.body", "body": texto.encode("utf-8"), "more_body": True})
+
+        await enviar(flask_app.SSE_RETRY)
+        fin = time.monotonic() + flask_app.EVENTOS_STREAM_S
+        latido = time.monotonic()
+        while time.monotonic() < fin and not desconectado.is_set():
+            for ev in await _en_pool(_leer_eventos, since):
+                since = ev["consulta_id"]
+                await enviar(flask_app.sse_evento(ev))
+                latido = time.monotonic()
+            if time.monotonic() - latido >= flask_app.EVENTOS_HEARTBEAT_S:
+                await enviar(flask_app.SSE_PING)
+                latido = time.monotonic()
+            if not await _dormir(flask_app.EVENTOS_POLL_S, desconectado):
+                return 200
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+        return 200
+    finally:
+        _esperas -= 1
+        escucha.cancel()
+
+
+async def _lifespan(receive, send):
+    while True:
+        msg = await receive()
+        if msg["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif msg["type"] == "lifespan.shutdown":
+            _pool.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    global _pendientes
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+
+    path = scope["path"]
+    if not path.startswith(API_PREFIX):
+        if _wsgi is not None:
+            return await _wsgi(scope, receive, send)
+        return await _responder(send, 404, b'{"error":"not found"}')
+
+    ruta = path[len(API_PREFIX):].strip("/")
+    table = flask_app.API_VIEWS.get(ruta)
+    nativa = table is not None or ruta in ("eventos", "eventos/stream")
+    if not nativa and _wsgi is not None:
+        return await _wsgi(scope, receive, send)   # demás rutas Flask del blueprint
+    if not nativa or scope["method"] not in ("GET", "HEAD"):
+        return await _responder(send, 404, b'{"error":"not found"}')
+    head = scope["method"] == "HEAD"
+    if head:
+        send = _sin_cuerpo(send)
+
+    args = {k: v[0] for k, v in parse_qs(scope.get("query_string", b"").decode("latin-1"),
+                                         keep_blank_values=True).items()}
+    headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+    key = headers.get("x-api-key") or args.get("api_key")
+    if table is None:
+        endpoint = "asgi.eventos_stream" if ruta == "eventos/stream" else "asgi.eventos"
+        status = await _eventos(args, headers, key, receive, send, stream=(ruta == "eventos/stream"), head=head)
+        flask_app.METRICAS.sumar("sibuac_http_requests_total", {"endpoint": endpoint, "status": status})
+        return
+    encoding = flask_app.elegir_encoding(headers.get("accept-encoding"))
+
+    if _pendientes >= API_MAX_PENDING:
+        return await _responder(send, 503, b'{"error":"busy"}')
+    _pendientes += 1
+    t0 = time.perf_counter()
+    status = 200
+    extra = [(b"vary", b"Accept-Encoding")]
+    try:
+        costoso = flask_app.es_costosa(args)
+        # autenticar puede recargar las llaves de la BD (SQLite): va al pool, no al event loop
+        cliente = await _en_pool(flask_app.AUTH.autenticar, key)
+        with flask_app.permiso_cliente(cliente, costoso):
+            body, usado = await _en_pool(_consultar, table, args, encoding)
+        if usado:
+            extra.append((b"content-encoding", usado.encode()))
+    except flask_app.NoAutorizado:
+        status, body = 401, b'{"error":"unauthorized"}'
+    except flask_app.ParametroInvalido as ex:
+        status, body = 400, flask_app.json_bytes({"error": str(ex)})
+    except flask_app.LimiteExcedido as ex:
+        status, body = 429, flask_app.json_bytes({"error": str(ex)})
+        extra.append((b"retry-after", str(ex.retry_after).encode()))
+    except Exception:
+        # el detalle va al log; al cliente, un cuerpo genérico (sin rutas, SQL ni mensajes internos)
+        flask_app.app.logger.exception("error en %s", path)
+        status, body = 500, b'{"error":"internal error"}'
+    finally:
+        _pendientes -= 1
+    endpoint = f"asgi.{table}"
+    flask_app.METRICAS.observar("sibuac_http_request_duration_seconds", {"endpoint": endpoint},
+                                time.perf_counter() - t0)
+    flask_app.METRICAS.sumar("sibuac_http_requests_total", {"endpoint": endpoint, "status": status})
+    flask_app.METRICAS.observar("sibuac_http_response_bytes", {"endpoint": endpoint}, len(body),
+                                flask_app.BUCKETS_BYTES)
+    await _responder(send, status, body, extra=extra)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(
+        "asgi:application",
+        host=os.environ.get("HOST", "127.0.0.1"),
+        port=int(os.environ.get("PORT", "5001")),
+        workers=int(os.environ.get("API_WORKERS", str(os.cpu_count() or 1))),
+        lifespan="on",
+        access_log=False,
+    )
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark de carga/latencia de la API Flask (app.py)
+----------------------------------------------------
+1) Construye una BD sintética (synth_db.py) a la escala pedida.
+2) Levanta app.py en un servidor WSGI local multihilo (o usa --target).
+3) Lanza N clientes concurrentes contra "/", "/export" y cada /api/v1/* con una
+   mezcla de filtros/paginación realista (offsets profundos, limit=all, LIKE, rangos).
+4) Reporta por endpoint: peticiones, errores, req/s y latencia p50/p95/p99 (ms).
+
+Uso:
+    python bench/bench_api.py --vias 150 --dias 90 --clients 8 --duration 20
+    python bench/bench_api.py --target http://127.0.0.1:5001 --db scrapers/sibuac_tarifas.sqlite
+"""
+
+import argparse
+import logging
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+import synth_db  # noqa: E402
+
+API_KEY = os.environ.get("API_KEY", "admin")
+
+
+def mezcla(total_snap, total_hist, total_vig):
+    """(endpoint, path, peso). Los totales permiten generar offsets profundos."""
+    k = f"api_key={quote(API_KEY)}"
+    m = []
+    for nombre, vista, total in (("vigente", "vigente", total_vig),
+                                 ("hist", "hist", total_hist),
+                                 ("snapshot", "snapshot", total_snap)):
+        base = f"/api/v1/{vista}?{k}"
+        m += [
+            (f"api/{nombre}", base, 6),
+            (f"api/{nombre}", f"{base}&limit=500&offset={max(total - 600, 0)}", 3),   # offset profundo
+            (f"api/{nombre}", f"{base}&q=Quer", 3),                                   # LIKE caseta
+            (f"api/{nombre}", f"{base}&c=Camiones&limit=200", 2),                     # LIKE categoría
+            (f"api/{nombre}", f"{base}&from=2000-01-01&to=2999-12-31&limit=1000", 2), # rango
+        ]
+    m += [
+        ("api/vigente", f"/api/v1/vigente?{k}&limit=all", 1),
+        ("api/hist", f"/api/v1/hist?{k}&limit=all", 1),
+        ("api/cambios", f"/api/v1/cambios?{k}&limit=200", 2),
+        ("api/cambios", f"/api/v1/cambios?{k}&limit=all", 1),
+        ("index", "/?table=vw_tarifa_vigente&limit=100", 3),
+        ("index", "/?table=vw_tarifa_snapshot&limit=500", 1),
+        ("index", "/?table=vw_tarifa_vigente&limit=Todos", 1),
+        ("export", "/export?table=vw_tarifa_vigente", 1),
+    ]
+    return m
+
+
+def percentil(valores, p):
+    if not valores:
+        return float("nan")
+    orden = sorted(valores)
+    return orden[min(len(orden) - 1, int(round(p / 100 * (len(orden) - 1))))]
+
+
+def servir_app_local(db_path):
+    """Importa app.py apuntando a db_path y lo sirve en un hilo (werkzeug multihilo)."""
+    os.environ["DB_PATH"] = db_path
+    # la llave de entorno no debe limitar el benchmark (429); se mide la API, no el rate limit
+    for var in ("API_RATE_PER_MIN", "API_BURST", "API_HEAVY_PER_MIN", "API_HEAVY_BURST", "API_MAX_CONCURRENT"):
+        os.environ.setdefault(var, "1000000")
+    sys.path.insert(0, REPO_DIR)
+    from werkzeug.serving import make_server
+    import app as app_mod
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    srv = make_server("127.0.0.1", 0, app_mod.app, threaded=True)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv, f"http://127.0.0.1:{srv.server_port}"
+
+
+def cargar(base_url, plan, clientes, duracion, seed=7):
+    rutas = [(e, p) for e, p, w in plan for _ in range(w)]
+    fin = time.perf_counter() + duracion
+    registros = []
+    lock = threading.Lock()
+
+    def cliente(idx):
+        rnd = random.Random(seed + idx)
+        s = requests.Session()
+        locales = []
+        while time.perf_counter() < fin:
+            endpoint, path = rnd.choice(rutas)
+            t0 = time.perf_counter()
+            try:
+                r = s.get(base_url + path, timeout=120)
+                ok = r.status_code == 200
+                nbytes = len(r.content)
+            except requests.RequestException:
+                ok, nbytes = False, 0
+            locales.append((endpoint, time.perf_counter() - t0, ok, nbytes))
+        with lock:
+            registros.extend(locales)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clientes) as ex:
+        list(ex.map(cliente, range(clientes)))
+    return registros, time.perf_counter() - t0
+
+
+def reporte(registros, segundos):
+    por_endpoint = {}
+    for endpoint, lat, ok, nbytes in registros:
+        por_endpoint.setdefault(endpoint, []).append((lat, ok, nbytes))
+    print(f"{'endpoint':<14}{'req':>7}{'err':>6}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'KB/resp':>10}")
+    for endpoint in sorted(por_endpoint):
+        filas = por_endpoint[endpoint]
+        lats = [l * 1000 for l, ok, _ in filas if ok]
+        errores = sum(1 for _, ok, _ in filas if not ok)
+        kb = sum(b for _, _, b in filas) / len(filas) / 1024
+        print(f"{endpoint:<14}{len(filas):>7}{errores:>6}{len(filas) / segundos:>9.1f}"
+              f"{percentil(lats, 50):>10.1f}{percentil(lats, 95):>10.1f}{percentil(lats, 99):>10.1f}{kb:>10.1f}")
+    print(f"TOTAL: {len(registros)} peticiones en {segundos:.1f}s → {len(registros) / segundos:.1f} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de carga de la API SIBUAC")
+    parser.add_argument("--db", help="BD a usar; si no se indica se genera una sintética temporal")
+    parser.add_argument("--vias", type=int, default=150)
+    parser.add_argument("--clases", type=int, default=5)
+    parser.add_argument("--ejes", type=int, default=4)
+    parser.add_argument("--dias", type=int, default=90)
+    parser.add_argument("--clients", type=int, default=8, help="Clientes concurrentes")
+    parser.add_argument("--duration", type=float, default=20, help="Segundos de carga")
+    parser.add_argument("--target", help="URL base de un servidor ya levantado (no levanta app.py)")
+    args = parser.parse_args()
+
+    tmp = None
+    db_path = args.db
+    if not db_path:
+        tmp = tempfile.TemporaryDirectory(prefix="bench_api_")
+        db_path = os.path.join(tmp.name, "synth.sqlite")
+        t0 = time.perf_counter()
+        conteos = synth_db.construir(db_path, args.vias, args.clases, args.ejes, args.dias)
+        print(f"[BD] sintética {conteos} en {time.perf_counter() - t0:.1f}s")
+
+    con = sqlite3.connect(db_path)
+    totales = [con.execute(f"SELECT COUNT(*) FROM {v}").fetchone()[0]
+               for v in ("vw_tarifa_snapshot", "vw_tarifa_hist", "vw_tarifa_vigente")]
+    con.close()
+
+    srv = None
+    base_url = args.target
+    if not base_url:
+        srv, base_url = servir_app_local(db_path)
+    try:
+        registros, segundos = cargar(base_url, mezcla(*totales), args.clients, args.duration)
+        reporte(registros, segundos)
+    finally:
+        if srv is not None:
+            srv.shutdown()
+        if tmp is not None:
+            tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
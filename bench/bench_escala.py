@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas de escala del esquema normalizado
+-----------------------------------------
+Hace crecer una misma BD sintética (synth_db.GeneradorSintetico) por puntos de control hasta
+la historia pedida (p. ej. 500 vías × 8 clases × 9 ejes × 5 años de cortes diarios) y en cada
+punto mide:
+    ingesta → ms por consulta de persist_items_normalizados (el escritor real, synchronous=FULL)
+              sobre los cortes siguientes; el relleno entre puntos va en modo bulk.
+    tamaño  → MB de la BD (+ WAL) y filas de tarifa_snapshot / tarifa_historial.
+    API     → mediana y p95 (ms) de app.consultar_vista por vista de API_VIEWS y forma de consulta
+              (primera página con COUNT, keyset, fecha=, since=, q=).
+Al final marca la primera consulta que supera --umbral-ms y el factor de crecimiento de cada
+medida entre el primer y el último punto (≈1 → no crece con la historia).
+
+Uso:
+    python bench/bench_escala.py                                      # 150×5×4, 1 año, 4 puntos
+    python bench/bench_escala.py --vias 500 --clases 8 --ejes 9 --anios 5 --puntos 5 --db /tmp/escala.sqlite
+    python bench/bench_escala.py --json /tmp/escala.json
+"""
+
+import argparse
+import datetime as dt
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+import synth_db  # noqa: E402
+from synth_db import sib  # noqa: E402
+
+
+def percentil(valores, p):
+    orden = sorted(valores)
+    return orden[min(len(orden) - 1, int(round(p / 100 * (len(orden) - 1))))]
+
+
+def tamano_mb(db_path):
+    return sum(os.path.getsize(db_path + s) for s in ("", "-wal") if os.path.exists(db_path + s)) / 2**20
+
+
+def formas_consulta(ultima_fecha, ultima_consulta):
+    return {
+        "pagina": {},                                           # limit por defecto + COUNT(*)
+        "keyset": {"limit": "100", "cursor": ""},
+        "fecha": {"fecha": ultima_fecha, "limit": "100"},
+        "since": {"since": str(ultima_consulta - 1), "limit": "100"},
+        "q": {"q": "Quer", "limit": "100"},
+    }
+
+
+def medir_api(app_mod, ultima_fecha, ultima_consulta, repeticiones):
+    """{(ruta, forma): (mediana_ms, p95_ms)}; since= sólo en las vistas que lo admiten."""
+    con = app_mod.connect()
+    resultados = {}
+    try:
+        for ruta, vista in app_mod.API_VIEWS.items():
+            for forma, args in formas_consulta(ultima_fecha, ultima_consulta).items():
+                tiempos = []
+                try:
+                    for _ in range(repeticiones):
+                        t0 = time.perf_counter()
+                        app_mod.consultar_vista(con.cursor(), vista, args)
+                        tiempos.append((time.perf_counter() - t0) * 1000)
+                except app_mod.ParametroInvalido:
+                    continue
+                resultados[(ruta, forma)] = (statistics.median(tiempos), percentil(tiempos, 95))
+    finally:
+        con.close()
+    return resultados
+
+
+def medir_ingesta(gen, con, n):
+    """n cortes por persist_items_normalizados con la durabilidad de producción; ms por consulta."""
+    con.execute("PRAGMA synchronous=FULL")
+    try:
+        tiempos = gen.agregar_dias(n, modo="persist")
+    finally:
+        con.execute("PRAGMA synchronous=OFF")
+    return [t * 1000 for t in tiempos]
+
+
+def correr(db_path, args):
+    dias_total = int(round(args.anios * 365))
+    puntos = sorted({max(1, round(dias_total * (k + 1) / args.puntos)) for k in range(args.puntos)})
+    # los cortes de ingesta medidos también quedan en la historia: el último cae en hoy
+    dias_finales = dias_total + len(puntos) * args.ingestas
+    con = synth_db.abrir_nueva(db_path)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA foreign_keys=ON")
+    inicio = dt.date.today() - dt.timedelta(days=dias_finales - 1)
+    gen = synth_db.GeneradorSintetico(con, args.vias, args.clases, args.ejes, args.cada_cambio,
+                                      inicio=inicio, seed=args.seed)
+    print(f"[ESCALA] {len(gen.defs)} definiciones; puntos de control en {puntos} días "
+          f"(+{args.ingestas} cortes de ingesta medidos por punto)")
+
+    os.environ["DB_PATH"] = db_path
+    os.environ["SLOW_QUERY_MS"] = "1e9"     # el slow-query log escribiría en la BD medida
+    os.environ.pop("DB_PUBLISH_DIR", None)
+    sys.path.insert(0, REPO_DIR)
+    import app as app_mod
+
+    filas = []
+    for objetivo in puntos:
+        t0 = time.perf_counter()
+        gen.agregar_dias(objetivo + len(filas) * args.ingestas - gen.dias, modo="bulk")
+        relleno_s = time.perf_counter() - t0
+        sib.optimizar_estadisticas(con)
+        ingesta = medir_ingesta(gen, con, args.ingestas)
+        con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conteos = synth_db.contar(con)
+        ultima_fecha = (gen.inicio + dt.timedelta(days=gen.dias - 1)).isoformat()
+        api = medir_api(app_mod, ultima_fecha, gen.cid, args.repeat)
+        fila = {
+            "dias": gen.dias,
+            "snapshots": conteos["tarifa_snapshot"],
+            "historial": conteos["tarifa_historial"],
+            "mb": round(tamano_mb(db_path), 1),
+            "relleno_s": round(relleno_s, 1),
+            "ingesta_ms": round(statistics.median(ingesta), 1),
+            "api": {f"{r}/{f}": [round(m, 2), round(p, 2)] for (r, f), (m, p) in api.items()},
+        }
+        filas.append(fila)
+        print(f"[ESCALA] {fila['dias']} días: {fila['snapshots']} snapshots, {fila['mb']} MB, "
+              f"ingesta {fila['ingesta_ms']} ms/consulta (relleno {fila['relleno_s']}s)")
+    con.close()
+    return filas
+
+
+def reportar(filas, umbral_ms):
+    print()
+    print(f"{'días':>6}{'snapshots':>12}{'historial':>11}{'MB':>9}{'ingesta ms':>12}")
+    for f in filas:
+        print(f"{f['dias']:>6}{f['snapshots']:>12}{f['historial']:>11}{f['mb']:>9}{f['ingesta_ms']:>12}")
+
+    claves = list(filas[-1]["api"])
+    print()
+    print(f"{'consulta (mediana/p95 ms)':<26}" + "".join(f"{str(f['dias']) + ' d':>16}" for f in filas) + f"{'×':>7}")
+    excedida = None
+    for k in claves:
+        celdas = []
+        for f in filas:
+            m, p = f["api"].get(k, (float("nan"), float("nan")))
+            celdas.append(f"{m:>7.1f}/{p:<7.1f} ")
+            if excedida is None and p > umbral_ms:
+                excedida = (k, f["dias"], p)
+        primero = filas[0]["api"].get(k, [0])[0]
+        factor = filas[-1]["api"][k][0] / primero if primero else float("nan")
+        print(f"{k:<26}" + "".join(f"{c:>16}" for c in celdas) + f"{factor:>7.1f}")
+
+    print()
+    f0, f1 = filas[0], filas[-1]
+    if f0["ingesta_ms"]:
+        print(f"[ESCALA] ingesta ×{f1['ingesta_ms'] / f0['ingesta_ms']:.2f} con ×{f1['snapshots'] / f0['snapshots']:.1f} filas")
+    if excedida:
+        print(f"[ESCALA] primera consulta sobre {umbral_ms} ms (p95): {excedida[0]} a {excedida[1]} días "
+              f"({excedida[2]:.1f} ms)")
+    else:
+        print(f"[ESCALA] ninguna consulta supera {umbral_ms} ms (p95)")
+    return excedida
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pruebas de escala: ingesta, tamaño y latencia de la API")
+    parser.add_argument("--db", help="Ruta de la BD a crecer (se reemplaza); por defecto una temporal")
+    parser.add_argument("--vias", type=int, default=150)
+    parser.add_argument("--clases", type=int, default=5)
+    parser.add_argument("--ejes", type=int, default=4)
+    parser.add_argument("--anios", type=float, default=1.0, help="Años de historia al último punto")
+    parser.add_argument("--puntos", type=int, default=4, help="Puntos de control (mediciones)")
+    parser.add_argument("--cada-cambio", type=int, default=60, help="Días entre cambios de tarifa")
+    parser.add_argument("--ingestas", type=int, default=3, help="Cortes medidos con persist_items_normalizados por punto")
+    parser.add_argument("--repeat", type=int, default=7, help="Repeticiones por consulta de la API")
+    parser.add_argument("--umbral-ms", type=float, default=float(os.environ.get("SLOW_QUERY_MS", "250")),
+                        help="Latencia p95 (ms) a partir de la cual se marca una consulta")
+    parser.add_argument("--seed", type=int, default=2025)
+    parser.add_argument("--json", help="Guarda los resultados por punto en este archivo")
+    args = parser.parse_args()
+
+    tmp = None
+    db_path = args.db
+    if not db_path:
+        tmp = tempfile.TemporaryDirectory(prefix="bench_escala_")
+        db_path = os.path.join(tmp.name, "escala.sqlite")
+    try:
+        filas = correr(db_path, args)
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+    excedida = reportar(filas, args.umbral_ms)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"params": vars(args), "puntos": filas,
+                       "excedida": list(excedida) if excedida else None}, f, ensure_ascii=False, indent=2)
+        print(f"[ESCALA] resultados en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark de la capa HTTP del scraper con fallas inyectadas
+-----------------------------------------------------------
+Repite la descarga completa (GET form + POST variantes, descargar_tabla_html) contra el
+servidor SIBUAC falso con una proporción de fallas al azar (500, "Disculpe usted", respuestas
+lentas, cortes de conexión) y compara configuraciones del ClienteHTTP:
+    sin_reintentos → reintentos=0 (equivale al cliente anterior: un intento por petición)
+    reintentos     → reintentos con backoff + jitter, plazo total por corrida
+Reporta % de corridas con tabla, mediana, p95 y máximo del tiempo por corrida, y bytes en red.
+
+Uso:
+    python bench/bench_http.py --corridas 40 --prob-fallo 0.15
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "scrapers"))
+
+import sibuac_tarifas_full as sib  # noqa: E402
+from cliente_http import ClienteHTTP  # noqa: E402
+from fake_sibuac import FakeSibuac  # noqa: E402
+
+TIPOS_FALLO = ("500", "503", "disculpe", "corte", "lento:1.5")
+
+
+def percentil(valores, p):
+    orden = sorted(valores)
+    return orden[min(len(orden) - 1, int(round(p / 100 * (len(orden) - 1))))]
+
+
+def medir_config(nombre, corridas, prob_fallo, factor, seed, **cliente_kw):
+    tiempos, exitos, bytes_red = [], 0, []
+    with FakeSibuac(factor, prob_fallo=prob_fallo, tipos_fallo=TIPOS_FALLO, seed=seed) as srv:
+        sib.URL_FORM, sib.BASE = srv.url_form, srv.base
+        for _ in range(corridas):
+            metricas = sib.MetricasCorrida()
+            cliente = ClienteHTTP(metricas, **cliente_kw)
+            t0 = time.perf_counter()
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    html = sib.descargar_tabla_html(metricas, cliente)
+                exitos += sib.looks_like_tarifas_table(html)
+            except Exception:
+                pass
+            finally:
+                cliente.close()
+            tiempos.append(time.perf_counter() - t0)
+            bytes_red.append(metricas.contadores.get(("http", "bytes_red"), 0))
+        fallas = len(srv.fallas)
+    return {
+        "config": nombre,
+        "exito_pct": round(100 * exitos / corridas, 1),
+        "mediana_s": round(statistics.median(tiempos), 3),
+        "p95_s": round(percentil(tiempos, 95), 3),
+        "max_s": round(max(tiempos), 3),
+        "kb_red": round(statistics.mean(bytes_red) / 1024, 1),
+        "fallas": fallas,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del ClienteHTTP con fallas inyectadas")
+    parser.add_argument("--corridas", type=int, default=40)
+    parser.add_argument("--prob-fallo", type=float, default=0.15, help="Probabilidad de falla por petición")
+    parser.add_argument("--factor", type=float, default=1.0, help="Tamaño de la tabla (× 150 vías)")
+    parser.add_argument("--timeout", type=float, default=1.0, help="Timeout de lectura por petición (s)")
+    parser.add_argument("--deadline", type=float, default=10.0, help="Plazo total por corrida (s)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    configs = [
+        ("sin_reintentos", dict(reintentos=0, deadline_s=None, timeout_lectura=args.timeout)),
+        ("reintentos", dict(reintentos=3, backoff_base=0.1, backoff_max=1.0, deadline_s=args.deadline,
+                            timeout_lectura=args.timeout)),
+    ]
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="bench_http_") as workdir:
+        os.chdir(workdir)   # dump_html() escribe en el cwd
+        try:
+            resultados = [medir_config(n, args.corridas, args.prob_fallo, args.factor, args.seed, **kw)
+                          for n, kw in configs]
+        finally:
+            os.chdir(cwd)
+
+    print(f"{'config':<16}{'éxito %':>9}{'mediana s':>11}{'p95 s':>9}{'max s':>9}{'KB red':>9}{'fallas':>8}")
+    for r in resultados:
+        print(f"{r['config']:<16}{r['exito_pct']:>9}{r['mediana_s']:>11}{r['p95_s']:>9}{r['max_s']:>9}"
+              f"{r['kb_red']:>9}{r['fallas']:>8}")
+
+
+if __name__ == "__main__":
+    main()
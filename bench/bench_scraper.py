@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark del scraper SIBUAC por etapas
+---------------------------------------
+Mide, por tamaño de fixture (factor × 150 vías), cada etapa de sibuac_tarifas_full.py:
+    form          → BeautifulSoup + pick_form + extract_form_data + selectVia
+    post          → post_consultar contra un servidor SIBUAC falso local
+    parse         → parse_table_with_multilevel_headers
+    normalize     → normalize_multilevel
+    persist_nueva → persist_items_normalizados en BD vacía
+    persist_prev  → persist_items_normalizados en BD con cortes previos (5% de cambios)
+
+Reporta mediana de tiempo, filas/s y memoria pico (tracemalloc, en una corrida aparte)
+y compara filas/s contra una línea base de la misma máquina: bench/baseline_scraper-<host>.json,
+generada con --save-baseline (no se versiona; filas/s de otra máquina no sirve de referencia).
+Las etapas de menos de --min-ms no se comparan: ahí el ruido del reloj supera la tolerancia.
+
+Uso:
+    python bench/bench_scraper.py --factors 0.2,1,3,10 --repeat 3
+    python bench/bench_scraper.py --save-baseline      # en el commit de referencia
+    python bench/bench_scraper.py                      # en el commit a evaluar (misma máquina)
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "scrapers"))
+
+import requests  # noqa: E402
+from bs4 import BeautifulSoup  # noqa: E402
+
+import sibuac_tarifas_full as sib  # noqa: E402
+from fake_sibuac import FakeSibuac  # noqa: E402
+from sibuac_fixtures import form_html, tarifas_html  # noqa: E402
+
+BASELINE_DEFAULT = os.path.join(BENCH_DIR, f"baseline_scraper-{platform.node() or 'local'}.json")
+
+
+def bd_nueva(path: str):
+    return sib.ensure_db_norm(path)   # esquema base + todas las migraciones
+
+
+def items_con_cambios(items, proporcion=0.05):
+    """Copia de items con ~proporcion de tarifas modificadas (ejercita el SCD2)."""
+    paso = max(1, int(1 / proporcion))
+    out = []
+    for i, it in enumerate(items):
+        it = dict(it)
+        if i % paso == 0:
+            valor = sib._parse_decimal(it["tarifa"])
+            if valor is not None:
+                it["tarifa"] = f"${valor * 1.05:,.2f}"
+        out.append(it)
+    return out
+
+
+# lru_cache de los parsers (_parse_decimal, parse_long_km, ...): se vacían antes de cada corrida,
+# si no, desde la 2a repetición parse/normalize/persist miden aciertos de cache y no el parseo
+CACHES = [f for f in vars(sib).values() if callable(getattr(f, "cache_clear", None))]
+
+
+def limpiar_caches():
+    for f in CACHES:
+        f.cache_clear()
+
+
+def medir(ejecutar, preparar=lambda: (), repeat=3):
+    """Mediana de `repeat` corridas en frío + memoria pico de una corrida extra con tracemalloc."""
+    tiempos = []
+    for _ in range(repeat):
+        args = preparar()
+        limpiar_caches()
+        t0 = time.perf_counter()
+        ejecutar(*args)
+        tiempos.append(time.perf_counter() - t0)
+    args = preparar()
+    limpiar_caches()
+    tracemalloc.start()
+    ejecutar(*args)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(tiempos), pico
+
+
+def bench_factor(factor, repeat, workdir, cortes_previos=5):
+    res = {}
+    page_html = form_html(factor)
+    html = tarifas_html(factor)
+
+    # form
+    def etapa_form():
+        soup = BeautifulSoup(page_html, "html.parser")
+        form = sib.pick_form(soup)
+        sib.extract_form_data(form, "http://127.0.0.1/sibuac_internet/ControllerUI")
+        return sib.extract_all_select_via_values(form)
+    all_vias = etapa_form()
+    res["form"] = (len(all_vias),) + medir(etapa_form, repeat=repeat)
+
+    # post (servidor local; la variante válida es la 1a, como en producción)
+    with FakeSibuac(factor) as srv:
+        form = sib.pick_form(BeautifulSoup(page_html, "html.parser"))
+        action_url, base_data, radios, submit = sib.extract_form_data(form, srv.url_form)
+        radio = sib.choose_second_radio_payload(radios)
+        session = requests.Session()
+
+        def etapa_post():
+            sib.post_consultar(session, action_url, base_data, radio, submit, page_html, all_vias)
+        res["post"] = (len(all_vias),) + medir(etapa_post, repeat=repeat)
+
+    # parse / normalize
+    parsed = sib.parse_table_with_multilevel_headers(html)
+    res["parse"] = (len(parsed[3]),) + medir(lambda: sib.parse_table_with_multilevel_headers(html), repeat=repeat)
+    items = sib.normalize_multilevel(*parsed)
+    res["normalize"] = (len(items),) + medir(lambda: sib.normalize_multilevel(*parsed), repeat=repeat)
+
+    # persist en BD nueva
+    contador = iter(range(10 ** 6))
+
+    def bd_vacia():
+        path = os.path.join(workdir, f"nueva_{next(contador)}.sqlite")
+        return (bd_nueva(path),)
+
+    def etapa_persist(con):
+        sib.persist_items_normalizados(con, items, "2025-06-01", save_raw=True)
+        con.close()
+    res["persist_nueva"] = (len(items),) + medir(etapa_persist, bd_vacia, repeat=repeat)
+
+    # persist en BD con cortes previos (plantilla copiada en cada repetición)
+    plantilla = os.path.join(workdir, f"plantilla_{factor}.sqlite")
+    con = bd_nueva(plantilla)
+    for d in range(cortes_previos):
+        sib.persist_items_normalizados(con, items, f"2025-05-{d + 1:02d}", save_raw=True)
+    con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    con.close()
+    cambios = items_con_cambios(items)
+
+    def bd_previa():
+        path = os.path.join(workdir, f"previa_{next(contador)}.sqlite")
+        shutil.copyfile(plantilla, path)
+        return (sib.ensure_db_norm(path),)
+
+    def etapa_persist_prev(con):
+        sib.persist_items_normalizados(con, cambios, "2025-06-01", save_raw=True)
+        con.close()
+    res["persist_prev"] = (len(cambios),) + medir(etapa_persist_prev, bd_previa, repeat=repeat)
+    return res
+
+
+def comparar(resultados, baseline, tolerancia, min_seg):
+    """(regresiones, omitidas): etapas por debajo de min_seg (en la base o ahora) no se comparan."""
+    regresiones, omitidas = [], []
+    for clave, actual in resultados.items():
+        ref = baseline.get(clave)
+        if not ref:
+            continue
+        if min(ref["seconds"], actual["seconds"]) < min_seg:
+            omitidas.append(clave)
+        elif actual["rows_s"] < ref["rows_s"] * (1 - tolerancia):
+            regresiones.append((clave, ref["rows_s"], actual["rows_s"]))
+    return regresiones, omitidas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark por etapas del scraper SIBUAC")
+    parser.add_argument("--factors", default="0.2,1,3,10", help="Factores de tamaño (× 150 vías)")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones por etapa (se usa la mediana)")
+    parser.add_argument("--baseline", default=BASELINE_DEFAULT, help="JSON de línea base (por defecto, la de este host)")
+    parser.add_argument("--save-baseline", action="store_true", help="Guardar resultados como nueva línea base")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Caída de filas/s tolerada (0.2 = 20%%)")
+    parser.add_argument("--min-ms", type=float, default=5.0, help="No comparar etapas más cortas que esto (ms)")
+    parser.add_argument("--json", help="Opcional: guardar resultados en JSON")
+    args = parser.parse_args()
+
+    factores = [float(x) for x in args.factors.split(",") if x.strip()]
+    resultados = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="bench_sibuac_") as workdir:
+        # dump_html() escribe en el cwd: lo aislamos en el temporal
+        os.chdir(workdir)
+        try:
+            for factor in factores:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    res = bench_factor(factor, args.repeat, workdir)
+                for etapa, (filas, seg, pico) in res.items():
+                    resultados[f"{factor:g}x/{etapa}"] = {
+                        "rows": filas,
+                        "seconds": round(seg, 6),
+                        "rows_s": round(filas / seg, 1) if seg > 0 else None,
+                        "peak_kb": round(pico / 1024, 1),
+                    }
+        finally:
+            os.chdir(cwd)
+
+    print(f"{'etapa':<24}{'filas':>8}{'seg':>10}{'filas/s':>12}{'pico KB':>10}")
+    for clave, r in resultados.items():
+        print(f"{clave:<24}{r['rows']:>8}{r['seconds']:>10.4f}{r['rows_s']:>12.1f}{r['peak_kb']:>10.1f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2)
+        print(f"Línea base guardada en {args.baseline}")
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regresiones, omitidas = comparar(resultados, baseline, args.tolerance, args.min_ms / 1000)
+        if omitidas:
+            print(f"Sin comparar (< {args.min_ms:g} ms): {', '.join(omitidas)}")
+        for clave, ref, act in regresiones:
+            print(f"[REGRESIÓN] {clave}: {act:.1f} filas/s (base {ref:.1f})")
+        if regresiones:
+            sys.exit(1)
+        print(f"Sin regresiones vs {args.baseline} (tolerancia {args.tolerance:.0%}).")
+    else:
+        print(f"Sin línea base en {args.baseline}: genera una con --save-baseline.")
+
+
+if __name__ == "__main__":
+    main()
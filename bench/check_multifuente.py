@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Chequeo del histórico con varias fuentes en desacuerdo
+------------------------------------------------------
+SIBUAC y CAPUFE reportan tarifas distintas para las mismas definiciones y se persisten
+alternadas con persist_items_normalizados (el escritor de fuentes.py), con y sin cache de
+catálogos (modo --daemon). Verifica que:
+    - ninguna consulta falla (antes: UNIQUE constraint failed: ux_hist_intervalo),
+    - cada fuente conserva su propia línea de tiempo SCD2 (sólo cambia cuando cambia su tarifa),
+    - vw_tarifa_vigente tiene una fila por definición y fuente con la tarifa de esa fuente,
+    - una BD nueva reconstruida con backfill_desde_raw (--from-raw) llega al mismo histórico:
+      tarifa_snapshot_raw guarda fuente y fecha_corte (migración 009).
+Sale con código 1 si algo no cuadra.
+
+Uso:
+    python bench/check_multifuente.py
+"""
+
+import os
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "scrapers"))
+
+import sibuac_tarifas_full as sib  # noqa: E402
+
+# (fuente, fecha_corte, tarifa de las dos definiciones de "Querétaro - Celaya")
+CORRIDAS = [
+    ("SIBUAC", "2025-03-01", "100.00"),
+    ("CAPUFE", "2025-03-01", "105.00"),
+    ("SIBUAC", "2025-03-01", "100.00"),   # vuelve a SIBUAC con la misma tarifa y el mismo día
+    ("CAPUFE", "2025-03-02", "105.00"),
+    ("SIBUAC", "2025-03-02", "110.00"),   # cambio real de SIBUAC
+    ("CAPUFE", "2025-03-03", "105.00"),
+]
+# fuente -> [(tarifa, vigente_desde, vigente_hasta)] esperado al final
+ESPERADO = {
+    "SIBUAC": [(100.0, "2025-03-01", "2025-03-02"), (110.0, "2025-03-02", None)],
+    "CAPUFE": [(105.0, "2025-03-01", None)],
+}
+
+
+def items(tarifa, fecha):
+    return [{"via": "Querétaro - Celaya", "long_km": "45 km", "vigente_desde": fecha, "clase": "Autos",
+             "ejes": None, "tarifa": tarifa},
+            {"via": "Querétaro - Celaya", "long_km": "45 km", "vigente_desde": fecha, "clase": "Camiones",
+             "ejes": "2 ejes", "tarifa": tarifa}]
+
+
+def revisar_bd(con, errores, etiqueta=""):
+    for clase in ("Autos", "Camiones"):
+        for fuente, esperado in ESPERADO.items():
+            hist = con.execute("""SELECT h.tarifa, h.vigente_desde, h.vigente_hasta
+                                  FROM tarifa_historial h
+                                  JOIN tarifa_definicion d ON d.id = h.definicion_id
+                                  JOIN vehiculo_clase vc ON vc.id = d.clase_id
+                                  WHERE vc.nombre=? AND h.fuente=? ORDER BY h.id""", (clase, fuente))
+            hist = [tuple(r) for r in hist]
+            if hist != esperado:
+                errores.append(f"{etiqueta}histórico {clase}/{fuente}: {hist} != {esperado}")
+    vigente = sorted(tuple(r) for r in con.execute("SELECT categoria, fuente, tarifa FROM vw_tarifa_vigente"))
+    esperado_vig = sorted((c, f, e[-1][0]) for c in ("Autos", "Camiones") for f, e in ESPERADO.items())
+    if vigente != esperado_vig:
+        errores.append(f"{etiqueta}vw_tarifa_vigente: {vigente} != {esperado_vig}")
+    fallidas = con.execute("SELECT COUNT(*) FROM consulta WHERE status LIKE 'ERROR%'").fetchone()[0]
+    if fallidas:
+        errores.append(f"{etiqueta}{fallidas} consultas en ERROR")
+
+
+def revisar(usar_cache):
+    errores = []
+    with tempfile.TemporaryDirectory(prefix="check_multifuente_") as tmp:
+        con = sib.ensure_db_norm(os.path.join(tmp, "mf.sqlite"))
+        cache = {} if usar_cache else None
+        for fuente, fecha, tarifa in CORRIDAS:
+            try:
+                sib.persist_items_normalizados(con, items(tarifa, fecha), fecha, save_raw=True,
+                                               fuente=fuente, cache=cache)
+            except Exception as ex:
+                errores.append(f"{fuente} {fecha} {tarifa}: {ex}")
+        revisar_bd(con, errores)
+        # todas las corridas caen en el mismo captured_at: el corte y la fuente salen del crudo
+        nueva = sib.ensure_db_norm(os.path.join(tmp, "desde_raw.sqlite"))
+        try:
+            sib.backfill_desde_raw(nueva, con)
+        except Exception as ex:
+            errores.append(f"--from-raw: {ex}")
+        revisar_bd(nueva, errores, "--from-raw: ")
+        nueva.close()
+        con.close()
+    return errores
+
+
+def main():
+    fallas = 0
+    for usar_cache in (False, True):
+        errores = revisar(usar_cache)
+        print(f"[{'FALLA' if errores else 'OK'}] {len(CORRIDAS)} corridas alternando fuentes "
+              f"({'con' if usar_cache else 'sin'} cache de catálogos)")
+        for e in errores:
+            print(f"    !! {e}")
+        fallas += bool(errores)
+    sys.exit(1 if fallas else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Verifica con EXPLAIN QUERY PLAN que las consultas de la API no recorren tablas grandes
+------------------------------------------------------------------------------------
+1) Construye una BD sintética (synth_db.py: schema_norm + todas las migraciones) o usa --db.
+2) Ejecuta app.consultar_vista() para cada vista de /api/v1/* con cada forma de filtro
+   (sin filtro, c, q, fecha, from/to, limit=all, cursor, since) y captura el SQL real con un trace callback.
+3) Para cada SELECT capturado revisa el plan:
+   - prohibido "SCAN <tarifa_historial|tarifa_snapshot>", con o sin índice (también
+     "USING COVERING INDEX"), salvo que esté acotado: por un índice parcial de vigentes
+     (crece con las definiciones, no con la historia) o por LIMIT recorriendo un índice en el
+     orden del ORDER BY (nunca un SCAN de la tabla base); las excepciones explícitas están en SCAN_COSTOSO;
+   - prohibido "USE TEMP B-TREE FOR ORDER BY" en páginas con ORDER BY (orden completo en memoria);
+   - vw_tarifa_vigente y vw_cambios_recientes no usan índices de todo el histórico (salvo
+     búsquedas por definicion_id) y vw_cambios_recientes no materializa ni ordena el histórico
+     (MATERIALIZE / CO-ROUTINE / TEMP B-TREE: la función de ventana de la migración 008).
+Sale con código 1 si alguna consulta viola las reglas (apto para CI).
+
+Uso:
+    python bench/check_query_plans.py
+    python bench/check_query_plans.py --db scrapers/sibuac_tarifas.sqlite
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+import synth_db  # noqa: E402
+
+TABLAS_GRANDES = ("tarifa_historial", "tarifa_snapshot")
+
+FILTROS = {
+    "sin_filtro": {},
+    "categoria": {"c": "Auto"},
+    "caseta": {"q": "Quer"},
+    "fecha": {"fecha": "2025-01-15"},
+    "rango": {"from": "2025-01-01", "to": "2025-03-31"},
+    "pagina_profunda": {"limit": "500", "offset": "5000"},
+    "limit_all": {"limit": "all"},
+    "keyset": {"limit": "100", "cursor": ""},
+    "since": {"since": "1"},
+}
+# since= recorre ix_citem_consulta_hist / ix_snap_consulta y ordena sólo las filas nuevas
+# (acotadas por las consultas posteriores): ahí el B-tree temporal es el plan esperado.
+ORDEN_PERMITIDO = {"since"}
+# limit=all sobre el histórico / snapshots completos: recorrido total esperado; son consultas
+# costosas (es_costosa) que sólo admite el bucket pesado de cada llave.
+SCAN_COSTOSO = {("hist", "limit_all"), ("snapshot", "limit_all")}
+# vistas que sólo deben tocar las filas vigentes de tarifa_historial
+VISTAS_VIGENTES = {"vigente", "cambios"}
+
+
+def alias_grandes(con):
+    """Alias con que las vistas referencian las tablas grandes (p. ej. h, ts)."""
+    alias = set(TABLAS_GRANDES)
+    patron = re.compile(r"\b(%s)\s+(?:AS\s+)?(\w+)" % "|".join(TABLAS_GRANDES), re.I)
+    for (sql,) in con.execute("SELECT sql FROM sqlite_master WHERE type='view'"):
+        for _, a in patron.findall(sql or ""):
+            if a.upper() not in ("JOIN", "WHERE", "ON", "GROUP", "ORDER", "LEFT"):
+                alias.add(a)
+    return alias
+
+
+def indices_grandes(con):
+    """{índice: acotado} de las tablas grandes; acotado = parcial sobre las filas vigentes."""
+    return {nombre: bool(re.search(r"WHERE\s+vigente_hasta\s+IS\s+NULL", sql or "", re.I))
+            for nombre, sql in con.execute("SELECT name, sql FROM sqlite_master WHERE type='index' AND tbl_name IN (%s)"
+                                           % ",".join("?" * len(TABLAS_GRANDES)), TABLAS_GRANDES)}
+
+
+def problemas_plan(con, sql, alias, indices, vista="", filtro=""):
+    plan = [r[3] for r in con.execute("EXPLAIN QUERY PLAN " + sql)]
+    errores = []
+    orden_en_memoria = "USE TEMP B-TREE FOR ORDER BY" in plan
+    con_limit = re.search(r"\bLIMIT\s+\d", sql) is not None
+    for paso in plan:
+        m = re.match(r"(SCAN|SEARCH) (\w+)(?: USING (?:COVERING )?INDEX (\w+))?", paso)
+        if m and m.group(2) in alias:
+            tipo, indice = m.group(1), m.group(3)
+            # LIMIT sólo acota si se recorre un índice en el orden del ORDER BY; un SCAN de la tabla
+            # base puede leerla entera sin encontrar filas (p. ej. un filtro que nunca se cumple)
+            acotado = indices.get(indice) or (indice and con_limit and not orden_en_memoria)
+            if tipo == "SCAN" and not acotado and (vista, filtro) not in SCAN_COSTOSO:
+                errores.append(f"scan sin acotar: {paso}")
+            if vista in VISTAS_VIGENTES and indice in indices and not indices[indice] \
+                    and "(definicion_id=?" not in paso:
+                errores.append(f"índice de todo el histórico en una vista de vigentes: {paso}")
+        if "ORDER BY" in sql and paso == "USE TEMP B-TREE FOR ORDER BY" and filtro not in ORDEN_PERMITIDO:
+            errores.append(f"orden en memoria: {paso}")
+        if vista == "cambios" and paso.startswith(("MATERIALIZE", "CO-ROUTINE", "USE TEMP B-TREE")):
+            errores.append(f"vw_cambios_recientes procesa todo el histórico: {paso}")
+    return plan, errores
+
+
+def revisar(db_path):
+    os.environ["DB_PATH"] = db_path
+    os.environ.setdefault("SLOW_QUERY_MS", "1e9")   # aquí interesa el plan, no el slow-query log
+    sys.path.insert(0, REPO_DIR)
+    import app as app_mod
+
+    con = app_mod.connect()
+    alias = alias_grandes(con)
+    indices = indices_grandes(con)
+    capturadas = []
+    con.set_trace_callback(capturadas.append)
+    filtros = dict(FILTROS, keyset_siguiente={
+        "limit": "100", "cursor": app_mod.codificar_cursor({"fecha": "2025-02-01", "id": 1000})},
+        # tramo de filas con fecha NULL (al final de ORDER BY fecha DESC)
+        keyset_fecha_nula={"limit": "100", "cursor": app_mod.codificar_cursor({"fecha": None, "id": 1000})})
+    for nombre, vista in app_mod.API_VIEWS.items():
+        for filtro, args in filtros.items():
+            capturadas.clear()
+            app_mod.consultar_vista(con.cursor(), vista, args)
+            for sql in [s for s in capturadas if s.lstrip().upper().startswith("SELECT")]:
+                yield nombre, filtro, sql, *problemas_plan(con, sql, alias, indices, nombre, filtro)
+    con.set_trace_callback(None)
+    con.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Revisa los planes de las consultas de la API")
+    parser.add_argument("--db", help="BD a revisar; si no se indica se genera una sintética temporal")
+    parser.add_argument("--vias", type=int, default=150)
+    parser.add_argument("--dias", type=int, default=90)
+    parser.add_argument("-v", "--verbose", action="store_true", help="Imprime todos los planes")
+    args = parser.parse_args()
+
+    tmp = None
+    db_path = args.db
+    if not db_path:
+        tmp = tempfile.TemporaryDirectory(prefix="check_plans_")
+        db_path = os.path.join(tmp.name, "synth.sqlite")
+        synth_db.construir(db_path, vias=args.vias, dias=args.dias)
+
+    fallas = 0
+    revisadas = 0
+    try:
+        for nombre, filtro, sql, plan, errores in revisar(db_path):
+            revisadas += 1
+            if errores or args.verbose:
+                print(f"[{'FALLA' if errores else 'OK'}] {nombre}/{filtro}: {sql}")
+                for paso in plan:
+                    print(f"        {paso}")
+                for e in errores:
+                    print(f"    !! {e}")
+            fallas += bool(errores)
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+    print(f"{revisadas} consultas revisadas, {fallas} con scan sin acotar / orden en memoria")
+    sys.exit(1 if fallas else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Servidor SIBUAC falso (local) para benchmarks
+---------------------------------------------
+- GET  /sibuac_internet/ControllerUI?action=CmdSelTarifaRep1Data → form (selectVia).
+- POST /sibuac_internet/ControllerUI?action=<variante>            → tabla de tarifas si
+  <variante> es la aceptada; cualquier otra devuelve la página "Disculpe usted…",
+  igual que el sitio real cuando no reconoce la acción.
+- Inyección de fallas (para el ClienteHTTP): `fallos` es una lista que se consume una por
+  petición ("500", "503", "disculpe", "corte", "lento:<s>", "ok"); `prob_fallo` agrega fallas
+  al azar (semilla fija) de tipo `tipos_fallo`. Cada falla aplicada queda en `fallas`.
+- Responde con gzip si el cliente lo acepta (como un servidor con compresión activada).
+
+Uso:
+    with FakeSibuac(factor=10) as srv:
+        srv.url_form  # http://127.0.0.1:<puerto>/sibuac_internet/ControllerUI?action=CmdSelTarifaRep1Data
+    with FakeSibuac(fallos=["503", "disculpe"]) as srv: ...
+"""
+
+import gzip
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from sibuac_fixtures import disculpe_html, form_html, tarifas_html
+
+RUTA = "/sibuac_internet/ControllerUI"
+
+
+class _Servidor(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        pass  # cortes inyectados / clientes que abandonan por timeout: no ensuciar la salida
+
+
+class FakeSibuac:
+    def __init__(self, factor: float = 1.0, variante_ok: str = "CmdTarifaRep1Data", fallos=None,
+                 prob_fallo: float = 0.0, tipos_fallo=("500", "disculpe", "lento:2"), seed: int = 7,
+                 comprimir: bool = True):
+        self.variante_ok = variante_ok
+        self.form = form_html(factor).encode("utf-8")
+        self.tarifas = tarifas_html(factor).encode("utf-8")
+        self.disculpe = disculpe_html().encode("utf-8")
+        self.peticiones = 0
+        self.fallos = list(fallos or [])
+        self.prob_fallo = prob_fallo
+        self.tipos_fallo = tuple(tipos_fallo)
+        self.comprimir = comprimir
+        self.fallas = []
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = _Servidor(("127.0.0.1", 0), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/sibuac_internet"
+
+    @property
+    def url_form(self) -> str:
+        return f"{self.base}/ControllerUI?action=CmdSelTarifaRep1Data"
+
+    def _siguiente_falla(self):
+        with self._lock:
+            if self.fallos:
+                falla = self.fallos.pop(0)
+            elif self.prob_fallo and self._rnd.random() < self.prob_fallo:
+                falla = self._rnd.choice(self.tipos_fallo)
+            else:
+                falla = None
+            if falla and falla != "ok":
+                self.fallas.append(falla)
+                return falla
+            return None
+
+    def _handler(self):
+        srv = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _responder(self, body: bytes, status: int = 200):
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                if srv.comprimir and "gzip" in (self.headers.get("Accept-Encoding") or ""):
+                    body = gzip.compress(body, 5)
+                    self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _fallar(self):
+                """Aplica la siguiente falla inyectada; True si ya respondió (o cortó)."""
+                falla = srv._siguiente_falla()
+                if falla is None:
+                    return False
+                if falla.startswith("lento:"):
+                    time.sleep(float(falla.split(":", 1)[1]))
+                    return False
+                if falla == "corte":
+                    self.close_connection = True
+                    self.connection.shutdown(2)
+                    return True
+                if falla == "disculpe":
+                    self._responder(srv.disculpe)
+                    return True
+                self._responder(b"error", int(falla))
+                return True
+
+            def do_GET(self):
+                srv.peticiones += 1
+                url = urlparse(self.path)
+                if url.path != RUTA:
+                    return self._responder(b"not found", 404)
+                if self._fallar():
+                    return
+                self._responder(srv.form)
+
+            def do_POST(self):
+                srv.peticiones += 1
+                url = urlparse(self.path)
+                largo = int(self.headers.get("Content-Length") or 0)
+                self.rfile.read(largo)
+                if url.path != RUTA:
+                    return self._responder(b"not found", 404)
+                if self._fallar():
+                    return
+                accion = (parse_qs(url.query).get("action") or [""])[0]
+                self._responder(srv.tarifas if accion == srv.variante_ok else srv.disculpe)
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Fixtures HTML de SIBUAC para benchmarks
+---------------------------------------
+- fixtures/sibuac_form.html     → página del GET CmdSelTarifaRep1Data (form + selectVia).
+- fixtures/sibuac_tarifas.html  → respuesta del POST (tabla con encabezado multinivel).
+- fixtures/sibuac_disculpe.html → página de error "Disculpe usted…".
+
+Las tablas/forms de mayor tamaño se generan escalando las filas del fixture
+base (factor 10 ≈ 10× las vías actuales) con nombres de vía únicos.
+"""
+
+import os
+import re
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+RE_FILA_DATOS = re.compile(r"^\s*<tr><td>.*</tr>\s*$", re.MULTILINE)
+RE_OPCION_VIA = re.compile(r'^\s*<option value="[^"]*">.*</option>\s*$', re.MULTILINE)
+
+
+def leer_fixture(nombre: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, nombre), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def _escalar(html: str, patron, factor: float, renombrar) -> str:
+    filas = patron.findall(html)
+    if not filas:
+        raise RuntimeError("Fixture sin filas escalables.")
+    n = max(1, int(round(len(filas) * factor)))
+    nuevas = []
+    for i in range(n):
+        copia, fila = divmod(i, len(filas))
+        nuevas.append(filas[fila] if copia == 0 else renombrar(filas[fila], copia, i))
+    inicio = html.index(filas[0])
+    fin = html.index(filas[-1]) + len(filas[-1])
+    return html[:inicio] + "\n".join(nuevas) + html[fin:]
+
+
+def tarifas_html(factor: float = 1.0) -> str:
+    """Tabla de tarifas con round(150 * factor) vías."""
+    base = leer_fixture("sibuac_tarifas.html")
+    return _escalar(base, RE_FILA_DATOS, factor,
+                    lambda fila, copia, _: fila.replace("</td>", f" ({copia})</td>", 1))
+
+
+def form_html(factor: float = 1.0) -> str:
+    """Form con round(150 * factor) opciones en selectVia."""
+    base = leer_fixture("sibuac_form.html")
+    return _escalar(base, RE_OPCION_VIA, factor,
+                    lambda fila, copia, i: re.sub(r'value="[^"]*"', f'value="{i + 1:04d}"', fila)
+                    .replace("</option>", f" ({copia})</option>"))
+
+
+def disculpe_html() -> str:
+    return leer_fixture("sibuac_disculpe.html")
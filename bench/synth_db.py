@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+BD SQLite sintética con el esquema normalizado (schema_norm.sql + migraciones)
+------------------------------------------------------------------------------
+Escala configurable: vías × clases × ejes × días de historia (p. ej. 500 × 8 × 9 × 5 años).
+    - tarifa_snapshot: una fila por definición y por día (fecha_corte).
+    - tarifa_historial: SCD2 con un cambio de tarifa cada ~`cada_cambio` días.
+    - consulta/consulta_item: una consulta OK por día (+ su consulta_evento).
+
+Se genera día por día (una transacción por corte, memoria acotada a un día) con dos modos:
+    bulk    → executemany directo sobre las tablas, con el mismo orden que el scraper
+              (cierre explícito de la vigente + alta; dispara los triggers ux_hist_*/trg_hist_*).
+    persist → cada corte pasa por persist_items_normalizados (el escritor del scraper) con
+              items de texto como los de normalize_multilevel. Más lento, mismo código de producción.
+GeneradorSintetico conserva el estado entre llamadas: bench_escala.py hace crecer la misma BD.
+
+Uso:
+    python bench/synth_db.py --db /tmp/synth.sqlite --vias 150 --clases 5 --ejes 4 --dias 90
+    python bench/synth_db.py --db /tmp/grande.sqlite --vias 500 --clases 8 --ejes 9 --anios 5
+    python bench/synth_db.py --db /tmp/real.sqlite --dias 30 --modo persist
+"""
+
+import argparse
+import datetime as dt
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+CIUDADES = ["Querétaro", "Celaya", "Irapuato", "Salamanca", "León", "Silao", "Guadalajara", "Morelia",
+            "Colima", "Armería", "Manzanillo", "Tepic", "Mazatlán", "Culiacán", "Puebla", "Orizaba",
+            "Córdoba", "Veracruz", "Tampico", "Monterrey", "Saltillo", "Durango", "Cuernavaca", "Acapulco",
+            "Toluca", "Pachuca", "Oaxaca", "Mérida", "Cancún", "Zacatecas"]
+CLASES = ["Motos", "Autos", "Autobuses", "Camiones", "Eje excedente", "Remolques", "Pick-up", "Tractocamiones"]
+
+
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "scrapers"))
+from db import migrate as db_migrate  # noqa: E402
+import sibuac_tarifas_full as sib  # noqa: E402
+
+
+def aplicar_esquema(con):
+    db_migrate.migrar(con, verbose=False)
+
+
+def abrir_nueva(db_path):
+    """Borra db_path (y -wal/-shm) y lo crea con el esquema completo."""
+    for sufijo in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + sufijo):
+            os.remove(db_path + sufijo)
+    con = sqlite3.connect(db_path)
+    aplicar_esquema(con)
+    con.execute("PRAGMA synchronous=OFF")
+    return con
+
+
+class GeneradorSintetico:
+    """Catálogos + estado SCD2 en memoria; `agregar_dias` escribe los cortes siguientes."""
+
+    def __init__(self, con, vias=150, clases=5, ejes=4, cada_cambio=60, inicio=None, seed=2025):
+        self.con = con
+        self.rnd = random.Random(seed)
+        self.cada_cambio = cada_cambio
+        self.inicio = inicio or dt.date.today()
+        self.dias = 0            # cortes ya escritos
+        self.vias = [(i + 1, f"{self.rnd.choice(CIUDADES)} - {self.rnd.choice(CIUDADES)} {i + 1}",
+                      self.rnd.randint(5, 250)) for i in range(vias)]
+        self.clases = [(i + 1, CLASES[i] if i < len(CLASES) else f"Clase {i + 1}") for i in range(clases)]
+        self.defs = []           # (def_id, via_id, clase_id, ejes)
+        for v, _, _ in self.vias:
+            for c, _ in self.clases:
+                for e in range(ejes):
+                    self.defs.append((len(self.defs) + 1, v, c, e + 2 if ejes > 1 else None))
+        # por definición: [tarifa, desde, hist_id vigente, desfase del ciclo de cambios]
+        self.estado = {d[0]: [round(self.rnd.uniform(20, 1500), 2), None, None, self.rnd.randrange(cada_cambio)]
+                       for d in self.defs}
+        con.executemany("INSERT INTO via(id, via, long_km) VALUES(?,?,?)", self.vias)
+        con.executemany("INSERT INTO vehiculo_clase(id, nombre) VALUES(?,?)", self.clases)
+        con.executemany("INSERT INTO tarifa_definicion(id, via_id, clase_id, ejes) VALUES(?,?,?,?)", self.defs)
+        con.commit()
+        self._sincronizar()
+
+    def _sincronizar(self):
+        """Contadores de id y vigentes desde la BD (tras cortes escritos por persist_items_normalizados)."""
+        self.hid = self.con.execute("SELECT IFNULL(MAX(id), 0) FROM tarifa_historial").fetchone()[0]
+        self.cid = self.con.execute("SELECT IFNULL(MAX(id), 0) FROM consulta").fetchone()[0]
+        for def_id, hid in self.con.execute(
+                "SELECT definicion_id, id FROM tarifa_historial WHERE vigente_hasta IS NULL AND fuente='SIBUAC'"):
+            self.estado[def_id][2] = hid
+
+    def _avanzar(self, i, fecha):
+        """Aplica los cambios de tarifa del día i. Devuelve los def_id que cambiaron (o son nuevos)."""
+        cambios = []
+        for def_id, st in self.estado.items():
+            if st[1] is None:
+                st[1] = fecha
+                cambios.append(def_id)
+            elif i > 0 and (i - st[3]) % self.cada_cambio == 0:
+                st[0] = round(st[0] * self.rnd.uniform(1.01, 1.08), 2)
+                st[1] = fecha
+                cambios.append(def_id)
+        return cambios
+
+    def agregar_dias(self, n, modo="bulk"):
+        """Escribe n cortes más. Devuelve los segundos de escritura de cada corte."""
+        tiempos = []
+        for _ in range(n):
+            i = self.dias
+            fecha = (self.inicio + dt.timedelta(days=i)).isoformat()
+            cambios = self._avanzar(i, fecha)
+            items = self.items_texto() if modo == "persist" else None   # fuera del tiempo: lo da el parser
+            t0 = time.perf_counter()
+            if modo == "persist":
+                sib.persist_items_normalizados(self.con, items, fecha, save_raw=False)
+            else:
+                self._dia_bulk(fecha, cambios)
+            tiempos.append(time.perf_counter() - t0)
+            self.dias += 1
+        if modo == "persist":
+            self._sincronizar()
+        return tiempos
+
+    def _dia_bulk(self, fecha, cambios):
+        con = self.con
+        self.cid += 1
+        cid = self.cid
+        con.execute("INSERT INTO consulta(id, executed_at, params_json, status) VALUES(?,?,?,?)",
+                    (cid, f"{fecha}T06:00:00", json.dumps({"fecha_corte": fecha, "fuente": "SIBUAC"}), "OK"))
+        cerrar, altas = [], []
+        for def_id in cambios:
+            st = self.estado[def_id]
+            if st[2] is not None:
+                cerrar.append((fecha, st[2]))
+            self.hid += 1
+            st[2] = self.hid
+            altas.append((self.hid, def_id, st[0], fecha))
+        con.executemany("UPDATE tarifa_historial SET vigente_hasta=? WHERE id=?", cerrar)
+        con.executemany("INSERT INTO tarifa_historial(id, definicion_id, tarifa, vigente_desde) VALUES(?,?,?,?)", altas)
+        con.executemany("INSERT INTO consulta_item(consulta_id, historial_id) VALUES(?,?)", [(cid, a[0]) for a in altas])
+        con.executemany("INSERT INTO tarifa_snapshot(definicion_id, consulta_id, fecha_corte, vigente_desde, tarifa)"
+                        " VALUES(?,?,?,?,?)", [(d, cid, fecha, st[1], st[0]) for d, st in self.estado.items()])
+        con.execute("""INSERT INTO consulta_evento(consulta_id, fuente, fecha_corte, nuevos_hist, snapshots,
+                                                   definiciones_json, creado_at)
+                       VALUES(?,?,?,?,?,?,?)""",
+                    (cid, "SIBUAC", fecha, len(altas), len(self.estado), json.dumps(cambios), f"{fecha}T06:00:00"))
+        con.commit()
+
+    def items_texto(self):
+        """Estado actual como items de normalize_multilevel (textos crudos, como los entrega el parser)."""
+        vias = {v: (nombre, km) for v, nombre, km in self.vias}
+        clases = dict(self.clases)
+        out = []
+        for def_id, via_id, clase_id, ejes in self.defs:
+            tarifa, desde, _, _ = self.estado[def_id]
+            nombre, km = vias[via_id]
+            out.append({"via": nombre, "long_km": f"{km} km", "vigente_desde": desde, "clase": clases[clase_id],
+                        "ejes": f"{ejes} ejes" if ejes is not None else None, "tarifa": f"${tarifa:,.2f}"})
+        return out
+
+    def finalizar(self):
+        self.con.execute("ANALYZE")
+        self.con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def contar(con):
+    return {t: con.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+            for t in ("via", "tarifa_definicion", "tarifa_historial", "tarifa_snapshot")}
+
+
+def construir(db_path, vias=150, clases=5, ejes=4, dias=90, cada_cambio=60,
+              hasta=None, seed=2025, modo="bulk"):
+    """Crea (o reemplaza) db_path con datos sintéticos hasta `hasta` (hoy). Devuelve conteos por tabla."""
+    con = abrir_nueva(db_path)
+    hasta = hasta or dt.date.today()
+    gen = GeneradorSintetico(con, vias, clases, ejes, cada_cambio,
+                             inicio=hasta - dt.timedelta(days=dias - 1), seed=seed)
+    gen.agregar_dias(dias, modo)
+    gen.finalizar()
+    conteos = contar(con)
+    con.close()
+    return conteos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera una BD SIBUAC sintética")
+    parser.add_argument("--db", required=True, help="Ruta de la BD a crear (se reemplaza)")
+    parser.add_argument("--vias", type=int, default=150)
+    parser.add_argument("--clases", type=int, default=5)
+    parser.add_argument("--ejes", type=int, default=4)
+    parser.add_argument("--dias", type=int, default=90, help="Días de historia (un corte diario)")
+    parser.add_argument("--anios", type=float, help="Años de historia (reemplaza --dias)")
+    parser.add_argument("--cada-cambio", type=int, default=60, help="Días entre cambios de tarifa")
+    parser.add_argument("--modo", choices=("bulk", "persist"), default="bulk",
+                        help="bulk: executemany directo; persist: persist_items_normalizados por corte")
+    args = parser.parse_args()
+    dias = int(round(args.anios * 365)) if args.anios else args.dias
+    t0 = time.perf_counter()
+    conteos = construir(args.db, args.vias, args.clases, args.ejes, dias, args.cada_cambio, modo=args.modo)
+    print(f"OK: {conteos} en {time.perf_counter() - t0:.1f}s → {args.db}")
+
+
+if __name__ == "__main__":
+    main()
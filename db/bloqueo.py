@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Bloqueo de ingesta por archivo
+------------------------------
+Un solo escritor a la vez sobre la BD maestra: el scraper (una corrida o --daemon), el backfill
+y scrapers/fuentes.py toman `<db>.lock` con un lock exclusivo del sistema operativo
+(fcntl.flock en Linux/macOS, msvcrt.locking en Windows). El SO lo libera si el proceso muere,
+así que no quedan locks huérfanos; el archivo no se borra (borrarlo abre una carrera).
+La API no participa: lee snapshots publicados o la BD en modo lectura.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class BloqueoOcupado(RuntimeError):
+    pass
+
+
+def _intentar(f):
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _soltar(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def bloqueo_ingesta(db_path, espera_s=0.0):
+    """Lock exclusivo de ingesta para db_path; espera hasta espera_s o lanza BloqueoOcupado."""
+    ruta = os.path.abspath(db_path) + ".lock"
+    f = open(ruta, "a+", encoding="utf-8")
+    try:
+        limite = time.monotonic() + espera_s
+        while not _intentar(f):
+            if time.monotonic() >= limite:
+                f.seek(0)
+                duenio = f.read().strip() or "?"
+                raise BloqueoOcupado(f"Otra ingesta tiene el bloqueo {ruta} (pid {duenio})")
+            time.sleep(min(0.5, max(limite - time.monotonic(), 0.01)))
+        f.seek(0)
+        f.truncate()
+        f.write(str(os.getpid()))
+        f.flush()
+        try:
+            yield ruta
+        finally:
+            _soltar(f)
+    finally:
+        f.close()
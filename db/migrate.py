@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Migraciones versionadas de la BD SIBUAC
+---------------------------------------
+- Versión 1 = scrapers/schema_norm.sql (esquema base); versión N = db/migrations/NNN_*.sql.
+- Cada versión se aplica una sola vez, en orden, y queda registrada en `schema_migrations`
+  y en `PRAGMA user_version` (= última versión aplicada).
+- `PRAGMA user_version` vive en la cabecera del archivo: comprobarlo al arrancar cuesta
+  una lectura, sin re-ejecutar DDL (scraper y app.py usan `verificar`/`migrar`).
+- Los scripts son idempotentes (IF NOT EXISTS / DROP ... IF EXISTS), así que una BD creada
+  antes de este runner (user_version=0) se pone al día aplicándolos todos.
+
+Uso:
+    python db/migrate.py --db scrapers/sibuac_tarifas.sqlite          # aplica pendientes
+    python db/migrate.py --db scrapers/sibuac_tarifas.sqlite --status # sólo muestra el estado
+"""
+
+import argparse
+import datetime as dt
+import os
+import re
+import sqlite3
+
+DB_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(DB_DIR)
+MIGRACIONES_DIR = os.path.join(DB_DIR, "migrations")
+SCHEMA_SQL = os.path.join(REPO_DIR, "scrapers", "schema_norm.sql")
+
+RE_MIGRACION = re.compile(r"^(\d+)_.+\.sql$")
+
+SQL_REGISTRO = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+  version     INTEGER PRIMARY KEY,
+  nombre      TEXT NOT NULL,
+  aplicada_at TEXT NOT NULL
+);
+"""
+
+
+def disponibles():
+    """[(version, nombre, ruta)] en orden: esquema base + db/migrations/NNN_*.sql."""
+    out = [(1, "schema_norm.sql", SCHEMA_SQL)]
+    for f in sorted(os.listdir(MIGRACIONES_DIR)):
+        m = RE_MIGRACION.match(f)
+        if m:
+            out.append((int(m.group(1)), f, os.path.join(MIGRACIONES_DIR, f)))
+    out.sort()
+    versiones = [v for v, _, _ in out]
+    if len(set(versiones)) != len(versiones):
+        raise RuntimeError(f"Versiones de migración duplicadas en {MIGRACIONES_DIR}: {versiones}")
+    return out
+
+
+def version_esperada():
+    return disponibles()[-1][0]
+
+
+def version_actual(con):
+    return con.execute("PRAGMA user_version").fetchone()[0]
+
+
+def verificar(con):
+    """Chequeo de arranque: una lectura de PRAGMA user_version. Error si la BD está atrasada."""
+    actual, esperada = version_actual(con), version_esperada()
+    if actual < esperada:
+        raise RuntimeError(
+            f"Esquema de BD en versión {actual}, se requiere {esperada}. "
+            f"Ejecuta: python db/migrate.py --db <ruta BD>")
+    return actual
+
+
+def migrar(con, esquema_base_sql=None, verbose=True):
+    """
+    Aplica las versiones pendientes (> user_version) y devuelve la lista de nombres aplicados.
+    esquema_base_sql: texto alternativo para la versión 1 si schema_norm.sql no existe.
+    """
+    actual = version_actual(con)
+    pendientes = [m for m in disponibles() if m[0] > actual]
+    if not pendientes:
+        return []
+    con.executescript(SQL_REGISTRO)
+    aplicadas = []
+    for version, nombre, ruta in pendientes:
+        if os.path.exists(ruta):
+            with open(ruta, "r", encoding="utf-8") as f:
+                script = f.read()
+        elif version == 1 and esquema_base_sql:
+            script = esquema_base_sql
+        else:
+            raise RuntimeError(f"No se encontró la migración {nombre} ({ruta})")
+        t0 = dt.datetime.now()
+        try:
+            # executescript hace COMMIT antes y no admite PRAGMA journal_mode dentro de una
+            # transacción; la atomicidad la da la idempotencia de los scripts (se reintenta completo).
+            con.executescript(script)
+        except sqlite3.Error as ex:
+            raise RuntimeError(f"Falló la migración {nombre}: {ex}") from ex
+        with con:
+            con.execute("INSERT OR REPLACE INTO schema_migrations(version, nombre, aplicada_at) VALUES(?,?,?)",
+                        (version, nombre, dt.datetime.now().isoformat(timespec="seconds")))
+            con.execute(f"PRAGMA user_version={int(version)}")
+        aplicadas.append(nombre)
+        if verbose:
+            print(f"[DEBUG] migración {nombre} aplicada en {(dt.datetime.now() - t0).total_seconds():.2f}s")
+    return aplicadas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aplica las migraciones pendientes de la BD SIBUAC")
+    parser.add_argument("--db", default=os.path.join(REPO_DIR, "scrapers", "sibuac_tarifas.sqlite"),
+                        help="Ruta BD SQLite")
+    parser.add_argument("--status", action="store_true", help="Sólo muestra versión actual y pendientes")
+    args = parser.parse_args()
+
+    con = sqlite3.connect(args.db)
+    actual = version_actual(con)
+    pendientes = [n for v, n, _ in disponibles() if v > actual]
+    if args.status:
+        print(f"{args.db}: versión {actual}, esperada {version_esperada()}, pendientes: {pendientes or 'ninguna'}")
+    else:
+        aplicadas = migrar(con)
+        print(f"OK: {args.db} en versión {version_actual(con)} ({len(aplicadas)} migraciones aplicadas)")
+    con.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+PRAGMA foreign_keys=ON;
+
+-- ========= API keys con límites por cliente =========
+-- La llave nunca se guarda en claro: sólo sha256(llave) en hex.
+-- app.py las cachea en memoria (AUTH_CACHE_TTL) y aplica:
+--   * token bucket general   (rate_per_min / burst)
+--   * token bucket "costoso" (heavy_per_min / heavy_burst) para limit=all o páginas enormes
+--   * tope de peticiones concurrentes (max_concurrent)
+CREATE TABLE IF NOT EXISTS api_key (
+  id              INTEGER PRIMARY KEY AUTOINCREMENT,
+  nombre          TEXT NOT NULL,
+  key_hash        TEXT NOT NULL,
+  activo          INTEGER NOT NULL DEFAULT 1,
+  rate_per_min    REAL    NOT NULL DEFAULT 120,
+  burst           INTEGER NOT NULL DEFAULT 30,
+  heavy_per_min   REAL    NOT NULL DEFAULT 4,
+  heavy_burst     INTEGER NOT NULL DEFAULT 2,
+  max_concurrent  INTEGER NOT NULL DEFAULT 4,
+  created_at      TEXT DEFAULT (datetime('now'))
+);
+CREATE UNIQUE INDEX IF NOT EXISTS ux_api_key_hash ON api_key(key_hash);
+CREATE UNIQUE INDEX IF NOT EXISTS ux_api_key_nombre ON api_key(nombre);
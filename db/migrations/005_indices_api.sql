@@ -0,0 +1,30 @@
+PRAGMA foreign_keys=ON;
+
+-- ========= Índices de lectura para la API (/api/v1/*, "/" y /export) =========
+-- consultar_vista() filtra por fecha (=, >=, <=), caseta/categoria (LIKE '%x%', no indexable)
+-- y ordena por fecha DESC con LIMIT/OFFSET. Los índices llevan la fecha al frente (orden
+-- sin TEMP B-TREE, el LIMIT corta temprano) y el resto de columnas que leen las vistas,
+-- para que los COUNT(*) y las páginas se resuelvan sin tocar la tabla base.
+
+-- A) vw_tarifa_vigente: sólo filas vigentes (índice parcial, mucho más chico que la tabla)
+CREATE INDEX IF NOT EXISTS ix_hist_vigente_cov
+ON tarifa_historial(vigente_desde, definicion_id, tarifa, fuente)
+WHERE vigente_hasta IS NULL;
+
+-- B) vw_tarifa_hist: todo el histórico ordenado por vigente_desde
+CREATE INDEX IF NOT EXISTS ix_hist_desde_cov
+ON tarifa_historial(vigente_desde, definicion_id, tarifa, vigente_hasta, fuente);
+
+-- C) vw_cambios_recientes: ROW_NUMBER() OVER (PARTITION BY definición ORDER BY vigente_desde DESC, id DESC)
+--    se resuelve recorriendo este índice por definición, sin ordenar en memoria.
+CREATE INDEX IF NOT EXISTS ix_hist_def_desde_cov
+ON tarifa_historial(definicion_id, vigente_desde, tarifa, vigente_hasta);
+
+-- D) vw_tarifa_snapshot: la tabla más grande (una fila por definición y corte)
+CREATE INDEX IF NOT EXISTS ix_snap_fecha_cov
+ON tarifa_snapshot(fecha_corte, definicion_id, tarifa, vigente_desde, fuente);
+
+-- ========= Estadísticas para el planificador =========
+-- Sin sqlite_stat1 el planificador puede preferir ix_hist_def/ix_snap_fecha (sin cubrir).
+-- El scraper vuelve a ejecutar PRAGMA optimize al final de cada ingesta.
+ANALYZE;
@@ -0,0 +1,74 @@
+PRAGMA foreign_keys=ON;
+
+-- ========= Paginación por cursor (keyset) en el explorador "/" y la API =========
+-- Las vistas exponen `id` (fila de tarifa_historial / tarifa_snapshot) para ordenar de forma
+-- estable por (fecha DESC, id DESC) y paginar con WHERE (fecha, id) < (?, ?) en lugar de OFFSET.
+-- app.py oculta `id` en las columnas mostradas (choose_headers).
+
+DROP VIEW IF EXISTS vw_tarifa_vigente;
+CREATE VIEW vw_tarifa_vigente AS
+SELECT
+  h.vigente_desde              AS fecha,
+  v.via                        AS caseta,
+  vc.nombre                    AS categoria,
+  COALESCE(CAST(d.ejes AS TEXT), '') AS Ejes,
+  h.tarifa                     AS tarifa,
+  v.long_km                    AS long_km,
+  h.fuente                     AS fuente,
+  h.id                         AS id
+FROM tarifa_historial h
+JOIN tarifa_definicion d ON d.id = h.definicion_id
+JOIN via v              ON v.id = d.via_id
+JOIN vehiculo_clase vc  ON vc.id = d.clase_id
+WHERE h.vigente_hasta IS NULL;
+
+DROP VIEW IF EXISTS vw_tarifa_hist;
+CREATE VIEW vw_tarifa_hist AS
+SELECT
+  h.vigente_desde              AS fecha,
+  v.via                        AS caseta,
+  vc.nombre                    AS categoria,
+  COALESCE(CAST(d.ejes AS TEXT), '') AS Ejes,
+  h.tarifa                     AS tarifa,
+  h.vigente_hasta              AS vigente_hasta,
+  v.long_km                    AS long_km,
+  h.fuente                     AS fuente,
+  h.id                         AS id
+FROM tarifa_historial h
+JOIN tarifa_definicion d ON d.id = h.definicion_id
+JOIN via v              ON v.id = d.via_id
+JOIN vehiculo_clase vc  ON vc.id = d.clase_id;
+
+DROP VIEW IF EXISTS vw_tarifa_snapshot;
+CREATE VIEW vw_tarifa_snapshot AS
+SELECT
+  ts.fecha_corte               AS fecha,
+  v.via                        AS caseta,
+  vc.nombre                    AS categoria,
+  COALESCE(CAST(d.ejes AS TEXT), '') AS Ejes,
+  ts.tarifa                    AS tarifa,
+  v.long_km                    AS long_km,
+  ts.vigente_desde             AS vigente_desde,
+  ts.fuente                    AS fuente,
+  ts.id                        AS id
+FROM tarifa_snapshot ts
+JOIN tarifa_definicion d ON d.id = ts.definicion_id
+JOIN via v              ON v.id = d.via_id
+JOIN vehiculo_clase vc  ON vc.id = d.clase_id;
+
+-- ========= Índices: (fecha, id) al frente para ORDER BY fecha DESC, id DESC sin ordenar =========
+-- Reemplazan a los cubrientes de la migración 005 (mismas columnas, id en segunda posición).
+DROP INDEX IF EXISTS ix_hist_vigente_cov;
+CREATE INDEX IF NOT EXISTS ix_hist_vigente_keyset
+ON tarifa_historial(vigente_desde, id, definicion_id, tarifa, fuente)
+WHERE vigente_hasta IS NULL;
+
+DROP INDEX IF EXISTS ix_hist_desde_cov;
+CREATE INDEX IF NOT EXISTS ix_hist_desde_keyset
+ON tarifa_historial(vigente_desde, id, definicion_id, tarifa, vigente_hasta, fuente);
+
+DROP INDEX IF EXISTS ix_snap_fecha_cov;
+CREATE INDEX IF NOT EXISTS ix_snap_fecha_keyset
+ON tarifa_snapshot(fecha_corte, id, definicion_id, tarifa, vigente_desde, fuente);
+
+ANALYZE;
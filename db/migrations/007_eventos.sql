@@ -0,0 +1,64 @@
+PRAGMA foreign_keys=ON;
+
+-- ========= Outbox de cambios (feed SSE / long-poll de la API) =========
+-- _end_consulta() agrega una fila por consulta OK, en la misma transacción que los datos y el status.
+CREATE TABLE IF NOT EXISTS consulta_evento (
+  id                 INTEGER PRIMARY KEY AUTOINCREMENT,
+  consulta_id        INTEGER NOT NULL UNIQUE REFERENCES consulta(id),
+  fuente             TEXT,
+  fecha_corte        TEXT,
+  nuevos_hist        INTEGER NOT NULL DEFAULT 0,   -- filas nuevas en tarifa_historial
+  snapshots          INTEGER NOT NULL DEFAULT 0,   -- filas de tarifa_snapshot escritas
+  definiciones_json  TEXT NOT NULL DEFAULT '[]',   -- definicion_id con tarifa nueva/cambiada
+  creado_at          TEXT DEFAULT (datetime('now'))
+);
+
+-- since=<consulta_id> en /api/v1/snapshot
+CREATE INDEX IF NOT EXISTS ix_snap_consulta ON tarifa_snapshot(consulta_id);
+-- since=<consulta_id> en vigente/hist/cambios: consulta_item(consulta_id) → historial_id
+CREATE INDEX IF NOT EXISTS ix_citem_consulta_hist ON consulta_item(consulta_id, historial_id);
+
+-- vw_cambios_recientes expone id (fila vigente de tarifa_historial) para el filtro since
+DROP VIEW IF EXISTS vw_cambios_recientes;
+CREATE VIEW vw_cambios_recientes AS
+WITH hist AS (
+  SELECT
+    d.via_id, d.clase_id, IFNULL(d.ejes, -1) AS ejes_key,
+    h.id, h.tarifa, h.vigente_desde, h.vigente_hasta,
+    ROW_NUMBER() OVER (
+      PARTITION BY d.via_id, d.clase_id, IFNULL(d.ejes, -1)
+      ORDER BY h.vigente_desde DESC, h.id DESC
+    ) AS rn
+  FROM tarifa_historial h
+  JOIN tarifa_definicion d ON d.id = h.definicion_id
+)
+SELECT
+  v.via             AS caseta,
+  vc.nombre         AS categoria,
+  NULLIF(x.ejes_key, -1) AS Ejes,
+  x.tarifa          AS tarifa_vigente,
+  x.vigente_desde   AS vigente_desde,
+  y.tarifa          AS tarifa_anterior,
+  (x.tarifa - y.tarifa) AS delta,
+  x.id              AS id
+FROM hist x
+LEFT JOIN hist y
+  ON y.via_id=x.via_id AND y.clase_id=x.clase_id AND y.ejes_key=x.ejes_key AND y.rn=x.rn+1
+JOIN via v ON v.id=x.via_id
+JOIN vehiculo_clase vc ON vc.id=x.clase_id
+WHERE x.rn=1;
+
+-- Eventos de las consultas OK anteriores a esta migración
+INSERT OR IGNORE INTO consulta_evento(consulta_id, fuente, fecha_corte, nuevos_hist, snapshots, definiciones_json, creado_at)
+SELECT
+  c.id,
+  COALESCE(json_extract(c.params_json, '$.fuente'), 'SIBUAC'),
+  json_extract(c.params_json, '$.fecha_corte'),
+  (SELECT COUNT(*) FROM consulta_item ci WHERE ci.consulta_id = c.id),
+  (SELECT COUNT(*) FROM tarifa_snapshot ts WHERE ts.consulta_id = c.id),
+  (SELECT json_group_array(DISTINCT h.definicion_id)
+     FROM consulta_item ci JOIN tarifa_historial h ON h.id = ci.historial_id
+    WHERE ci.consulta_id = c.id),
+  c.executed_at
+FROM consulta c
+WHERE c.status = 'OK';
@@ -0,0 +1,72 @@
+PRAGMA foreign_keys=ON;
+
+-- ========= Histórico SCD2 por (definición, fuente) =========
+-- Con varias fuentes (fuentes.py) cada una lleva su propia línea de tiempo: si SIBUAC y CAPUFE
+-- reportan tarifas distintas para la misma definición, el histórico ya no alterna entre ellas
+-- (cada alternancia cerraba la vigente de la otra fuente y terminaba chocando con ux_hist_intervalo).
+-- vw_tarifa_vigente muestra una fila vigente por definición y fuente.
+
+UPDATE tarifa_historial SET fuente = 'SIBUAC' WHERE fuente IS NULL;
+
+-- 1) Una fila vigente por definición y fuente
+DROP INDEX IF EXISTS ux_hist_vigente;
+CREATE UNIQUE INDEX IF NOT EXISTS ux_hist_vigente
+ON tarifa_historial(definicion_id, fuente)
+WHERE vigente_hasta IS NULL;
+
+-- 2) Intervalo exacto único dentro de la línea de tiempo de cada fuente
+DROP INDEX IF EXISTS ux_hist_intervalo;
+CREATE UNIQUE INDEX IF NOT EXISTS ux_hist_intervalo
+ON tarifa_historial(definicion_id, fuente, vigente_desde, COALESCE(vigente_hasta, '9999-12-31'));
+
+-- 3) El trigger sólo cierra la vigente de la misma fuente
+DROP TRIGGER IF EXISTS trg_hist_close_previous_vigente;
+CREATE TRIGGER trg_hist_close_previous_vigente
+BEFORE INSERT ON tarifa_historial
+FOR EACH ROW
+WHEN NEW.vigente_hasta IS NULL
+BEGIN
+  UPDATE tarifa_historial
+  SET vigente_hasta = DATETIME(NEW.vigente_desde, '-1 second')
+  WHERE definicion_id = NEW.definicion_id
+    AND fuente IS NEW.fuente
+    AND vigente_hasta IS NULL;
+END;
+
+-- 4) vw_cambios_recientes: vigente vs anterior dentro de la misma fuente
+DROP INDEX IF EXISTS ix_hist_def_desde_cov;
+CREATE INDEX IF NOT EXISTS ix_hist_def_fuente_cov
+ON tarifa_historial(definicion_id, fuente, vigente_desde, tarifa, vigente_hasta);
+
+DROP VIEW IF EXISTS vw_cambios_recientes;
+CREATE VIEW vw_cambios_recientes AS
+WITH hist AS (
+  SELECT
+    d.via_id, d.clase_id, IFNULL(d.ejes, -1) AS ejes_key, h.fuente,
+    h.id, h.tarifa, h.vigente_desde, h.vigente_hasta,
+    ROW_NUMBER() OVER (
+      PARTITION BY d.via_id, d.clase_id, IFNULL(d.ejes, -1), h.fuente
+      ORDER BY h.vigente_desde DESC, h.id DESC
+    ) AS rn
+  FROM tarifa_historial h
+  JOIN tarifa_definicion d ON d.id = h.definicion_id
+)
+SELECT
+  v.via             AS caseta,
+  vc.nombre         AS categoria,
+  NULLIF(x.ejes_key, -1) AS Ejes,
+  x.tarifa          AS tarifa_vigente,
+  x.vigente_desde   AS vigente_desde,
+  y.tarifa          AS tarifa_anterior,
+  (x.tarifa - y.tarifa) AS delta,
+  x.fuente          AS fuente,
+  x.id              AS id
+FROM hist x
+LEFT JOIN hist y
+  ON y.via_id=x.via_id AND y.clase_id=x.clase_id AND y.ejes_key=x.ejes_key
+ AND y.fuente IS x.fuente AND y.rn=x.rn+1
+JOIN via v ON v.id=x.via_id
+JOIN vehiculo_clase vc ON vc.id=x.clase_id
+WHERE x.rn=1;
+
+ANALYZE;
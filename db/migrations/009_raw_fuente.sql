@@ -0,0 +1,19 @@
+PRAGMA foreign_keys=ON;
+
+-- ========= tarifa_snapshot_raw por fuente =========
+-- Con varias fuentes (fuentes.py) el archivo crudo guarda de qué operador vino cada fila y el
+-- corte con el que se persistió, para que backfill_desde_raw reconstruya una consulta por
+-- (fecha_corte, fuente) en vez de mezclar todo el día como SIBUAC.
+-- Las filas anteriores son de SIBUAC (única fuente que guardaba crudo); su corte se deriva de
+-- captured_at al re-procesar.
+--
+-- ALTER TABLE ... ADD COLUMN no admite IF NOT EXISTS: el script es atómico y registra su propia
+-- versión en la misma transacción, así un reintento tras un fallo nunca repite el ALTER.
+BEGIN;
+ALTER TABLE tarifa_snapshot_raw ADD COLUMN fuente TEXT;
+ALTER TABLE tarifa_snapshot_raw ADD COLUMN fecha_corte TEXT;
+UPDATE tarifa_snapshot_raw SET fuente = 'SIBUAC' WHERE fuente IS NULL;
+INSERT OR REPLACE INTO schema_migrations(version, nombre, aplicada_at)
+VALUES (9, '009_raw_fuente.sql', strftime('%Y-%m-%dT%H:%M:%S', 'now', 'localtime'));
+PRAGMA user_version = 9;
+COMMIT;
@@ -0,0 +1,47 @@
+PRAGMA foreign_keys=ON;
+
+-- ========= Consultas de la API acotadas por las tarifas vigentes =========
+
+-- 1) vw_cambios_recientes sin función de ventana: antes ROW_NUMBER() materializaba todo el
+--    histórico en cada request. Ahora parte de las filas vigentes (índice parcial, una por
+--    definición y fuente) y busca la anterior de la misma (definición, fuente) con un SEARCH
+--    en ix_hist_def_fuente_keyset (LIMIT 1). Mismas columnas que en la 008.
+DROP INDEX IF EXISTS ix_hist_def_fuente_cov;
+CREATE INDEX IF NOT EXISTS ix_hist_def_fuente_keyset
+ON tarifa_historial(definicion_id, fuente, vigente_desde, id, tarifa);
+
+DROP VIEW IF EXISTS vw_cambios_recientes;
+CREATE VIEW vw_cambios_recientes AS
+SELECT
+  v.via             AS caseta,
+  vc.nombre         AS categoria,
+  d.ejes            AS Ejes,
+  x.tarifa          AS tarifa_vigente,
+  x.vigente_desde   AS vigente_desde,
+  y.tarifa          AS tarifa_anterior,
+  (x.tarifa - y.tarifa) AS delta,
+  x.fuente          AS fuente,
+  x.id              AS id
+FROM tarifa_historial x
+JOIN tarifa_definicion d ON d.id = x.definicion_id
+JOIN via v ON v.id = d.via_id
+JOIN vehiculo_clase vc ON vc.id = d.clase_id
+LEFT JOIN tarifa_historial y ON y.id = (
+  SELECT p.id FROM tarifa_historial p
+  WHERE p.definicion_id = x.definicion_id AND p.fuente IS x.fuente
+    AND (p.vigente_desde < x.vigente_desde OR (p.vigente_desde = x.vigente_desde AND p.id < x.id))
+  ORDER BY p.vigente_desde DESC, p.id DESC
+  LIMIT 1)
+WHERE x.vigente_hasta IS NULL;
+
+-- 2) vigente_hasta en el índice parcial de vigentes: así lo cubre y el planificador ya no
+--    resuelve vw_tarifa_vigente (fecha=, from/to) con el de todo el histórico (ix_hist_desde_keyset).
+DROP INDEX IF EXISTS ix_hist_vigente_keyset;
+CREATE INDEX IF NOT EXISTS ix_hist_vigente_keyset
+ON tarifa_historial(vigente_desde, id, definicion_id, tarifa, fuente, vigente_hasta)
+WHERE vigente_hasta IS NULL;
+
+-- 3) ix_snap_fecha (esquema base) es prefijo de ix_snap_fecha_keyset (006): sólo costaba escrituras
+DROP INDEX IF EXISTS ix_snap_fecha;
+
+ANALYZE;
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Publicación de snapshots de sólo lectura para la API
+----------------------------------------------------
+- El scraper escribe en la BD maestra (DB_PATH) y, al terminar una consulta OK, `publicar()`
+  copia la BD con la API de backup de SQLite a `<dir>/sibuac_<timestamp>.sqlite`
+  (journal_mode=DELETE, ya indexada y con estadísticas), y luego reemplaza de forma atómica
+  el puntero `<dir>/CURRENT` (os.replace) con el nombre del nuevo archivo.
+- La API abre el archivo apuntado con `mode=ro&immutable=1` + mmap: sin locks, sin WAL, sin
+  contención con la ingesta. Un snapshot publicado nunca se modifica; sólo se borra cuando
+  ya no está entre los `keep` más recientes.
+
+Uso:
+    python db/publicar.py --db scrapers/sibuac_tarifas.sqlite --dir /srv/sibuac/publicado
+"""
+
+import argparse
+import datetime as dt
+import os
+import sqlite3
+from urllib.request import pathname2url
+
+PUNTERO = "CURRENT"
+PREFIJO = "sibuac_"
+
+
+def _fsync(ruta):
+    try:
+        fd = os.open(ruta, os.O_RDONLY)
+    except OSError:
+        return  # directorios en Windows
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def publicar(con, publish_dir, keep=3):
+    """Copia `con` a un snapshot inmutable en publish_dir y mueve el puntero. Devuelve la ruta."""
+    os.makedirs(publish_dir, exist_ok=True)
+    nombre = f"{PREFIJO}{dt.datetime.now().strftime('%Y%m%dT%H%M%S%f')}.sqlite"
+    ruta = os.path.join(publish_dir, nombre)
+    tmp = ruta + ".tmp"
+
+    dst = sqlite3.connect(tmp)
+    try:
+        con.backup(dst)
+        # el archivo publicado debe ser autosuficiente (sin -wal/-shm) para abrirse con immutable=1
+        dst.execute("PRAGMA journal_mode=DELETE")
+        dst.commit()
+    finally:
+        dst.close()
+    _fsync(tmp)
+    os.replace(tmp, ruta)
+
+    puntero_tmp = os.path.join(publish_dir, PUNTERO + ".tmp")
+    with open(puntero_tmp, "w", encoding="utf-8") as f:
+        f.write(nombre + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(puntero_tmp, os.path.join(publish_dir, PUNTERO))
+    _fsync(publish_dir)
+    print(f"[DEBUG] snapshot publicado: {ruta}")
+
+    podar(publish_dir, keep)
+    return ruta
+
+
+def podar(publish_dir, keep=3):
+    """Borra snapshots viejos; conserva los `keep` más recientes (y siempre el vigente)."""
+    vigente = os.path.basename(leer_puntero(publish_dir) or "")
+    snaps = sorted(f for f in os.listdir(publish_dir) if f.startswith(PREFIJO) and f.endswith(".sqlite"))
+    for f in snaps[:-keep] if keep > 0 else []:
+        if f == vigente:
+            continue
+        try:
+            os.remove(os.path.join(publish_dir, f))
+        except OSError:
+            pass  # Windows: un worker de la API aún lo tiene abierto; se borra en la próxima poda
+
+
+def leer_puntero(publish_dir):
+    """Ruta del snapshot vigente, o None si aún no se publicó ninguno."""
+    try:
+        with open(os.path.join(publish_dir, PUNTERO), "r", encoding="utf-8") as f:
+            nombre = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return os.path.join(publish_dir, nombre) if nombre else None
+
+
+def abrir_lectura(ruta, mmap_bytes=256 * 1024 * 1024):
+    """Conexión de sólo lectura a un snapshot publicado (immutable: sin locks ni journal)."""
+    uri = f"file:{pathname2url(os.path.abspath(ruta))}?mode=ro&immutable=1"
+    con = sqlite3.connect(uri, uri=True)
+    if mmap_bytes:
+        con.execute(f"PRAGMA mmap_size={int(mmap_bytes)}")
+    return con
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publica un snapshot de sólo lectura de la BD SIBUAC")
+    parser.add_argument("--db", required=True, help="BD maestra")
+    parser.add_argument("--dir", default=os.environ.get("DB_PUBLISH_DIR"), required=not os.environ.get("DB_PUBLISH_DIR"),
+                        help="Directorio de publicación (o DB_PUBLISH_DIR)")
+    parser.add_argument("--keep", type=int, default=3, help="Snapshots a conservar")
+    args = parser.parse_args()
+    con = sqlite3.connect(args.db)
+    try:
+        publicar(con, args.dir, args.keep)
+    finally:
+        con.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+# Lanzador de producción (Linux) para la API ASGI:
+#     gunicorn -c gunicorn.conf.py asgi:application
+# Cada worker es un proceso uvicorn con su propio pool de lecturas SQLite (API_THREADS hilos).
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:5001")
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.environ.get("API_WORKERS", multiprocessing.cpu_count()))
+timeout = int(os.environ.get("API_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+accesslog = None
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Cliente HTTP del scraper
+------------------------
+- Una `requests.Session` con pool keep-alive (HTTPAdapter) para todo el flujo GET form → POST variantes.
+- Reintentos con backoff exponencial y jitter completo ante errores de conexión, timeouts,
+  5xx/429 (respeta Retry-After) y páginas "Disculpe usted..." (predicado `reintentar_si`).
+- Plazo total por corrida (`deadline_s`): cada timeout y cada espera se recortan a lo que queda;
+  al agotarse se lanza PlazoAgotado en lugar de quedarse colgado en una variante.
+- Cuerpo leído en streaming por bloques (el plazo también corta descargas que gotean) y
+  `Accept-Encoding` con lo que urllib3 sabe descomprimir (gzip/deflate, br si está instalado).
+- Contabilidad por petición en MetricasCorrida.http: latencia, bytes descomprimidos y en red, intento.
+"""
+
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
+DISCULPE = "Disculpe usted, pero por el momento no podemos atenderlo"
+
+ERRORES_RED = (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+               requests.exceptions.ChunkedEncodingError)
+
+
+class PlazoAgotado(RuntimeError):
+    pass
+
+
+class ErrorHTTP(RuntimeError):
+    def __init__(self, msg, status=None):
+        super().__init__(msg)
+        self.status = status
+
+
+def es_disculpe(texto: str) -> bool:
+    return DISCULPE in (texto or "")
+
+
+class ClienteHTTP:
+    def __init__(self, metricas=None, deadline_s=300.0, timeout_conexion=10.0, timeout_lectura=60.0,
+                 reintentos=3, backoff_base=0.5, backoff_max=8.0, pool=4, session=None):
+        self.metricas = metricas
+        self.limite = time.monotonic() + deadline_s if deadline_s else None
+        self.timeout_conexion = timeout_conexion
+        self.timeout_lectura = timeout_lectura
+        self.reintentos = reintentos
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.session = session or requests.Session()
+        adaptador = HTTPAdapter(pool_connections=pool, pool_maxsize=pool, max_retries=0)
+        self.session.mount("http://", adaptador)
+        self.session.mount("https://", adaptador)
+        self.session.headers.update({"User-Agent": USER_AGENT, "Connection": "keep-alive"})
+        self.session.headers.update(make_headers(accept_encoding=True))
+
+    # ---- plazo ----
+    def reiniciar(self, metricas=None, deadline_s=300.0):
+        """Nueva corrida sobre la misma sesión (modo --daemon): métricas y plazo nuevos, conexiones tibias."""
+        self.metricas = metricas
+        self.limite = time.monotonic() + deadline_s if deadline_s else None
+
+    def restante(self):
+        return None if self.limite is None else self.limite - time.monotonic()
+
+    def _timeout(self):
+        restante = self.restante()
+        if restante is not None and restante <= 0:
+            raise PlazoAgotado("Plazo total de la corrida agotado")
+        if restante is None:
+            return self.timeout_conexion, self.timeout_lectura
+        return min(self.timeout_conexion, restante), min(self.timeout_lectura, restante)
+
+    def esperar_reintento(self, intento, retry_after=None):
+        """Backoff exponencial con jitter completo (o Retry-After), recortado al plazo."""
+        espera = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** intento)))
+        if retry_after is not None:
+            espera = min(self.backoff_max, retry_after)
+        restante = self.restante()
+        if restante is not None and espera >= restante:
+            raise PlazoAgotado(f"Plazo total agotado (quedan {max(restante, 0):.1f}s, backoff {espera:.1f}s)")
+        if self.metricas:
+            self.metricas.contar("http", "reintentos")
+            self.metricas.contar("http", "backoff_ms", round(espera * 1000, 3))
+        time.sleep(espera)
+
+    # ---- peticiones ----
+    def _leer(self, r):
+        """Cuerpo en streaming; revisa el plazo entre bloques. Devuelve bytes en red."""
+        bloques = []
+        for bloque in r.raw.stream(64 * 1024, decode_content=True):
+            bloques.append(bloque)
+            restante = self.restante()
+            if restante is not None and restante <= 0:
+                r.close()
+                raise PlazoAgotado("Plazo total agotado durante la descarga")
+        # requests construye r.content/r.text a partir de _content (mismo camino que sin stream)
+        r._content = b"".join(bloques)
+        r._content_consumed = True
+        return r.raw.tell()
+
+    def pedir(self, metodo, url, reintentar_si=None, **kwargs):
+        """
+        Petición con reintentos. reintentar_si(texto) → True marca la respuesta como transitoria
+        (p. ej. es_disculpe). Devuelve la última respuesta (también si sigue siendo "Disculpe").
+        """
+        for intento in range(1, self.reintentos + 2):
+            ultimo = intento > self.reintentos
+            t0 = time.perf_counter()
+            try:
+                r = self.session.request(metodo, url, timeout=self._timeout(), stream=True, **kwargs)
+                bytes_red = self._leer(r)
+            except ERRORES_RED as ex:
+                if self.metricas:
+                    self.metricas.http(metodo, url, None, 0, (time.perf_counter() - t0) * 1000, intento,
+                                       error=type(ex).__name__)
+                if ultimo:
+                    raise
+                self.esperar_reintento(intento)
+                continue
+            if self.metricas:
+                self.metricas.http(metodo, url, r.status_code, len(r.content), (time.perf_counter() - t0) * 1000,
+                                   intento, bytes_red=bytes_red)
+            if r.status_code >= 500 or r.status_code == 429:
+                if ultimo:
+                    raise ErrorHTTP(f"{metodo} {url}: HTTP {r.status_code} tras {intento} intentos", r.status_code)
+                retry_after = r.headers.get("Retry-After")
+                self.esperar_reintento(intento, float(retry_after) if retry_after and retry_after.isdigit() else None)
+                continue
+            r.raise_for_status()
+            if reintentar_si and not ultimo and reintentar_si(r.text):
+                self.esperar_reintento(intento)
+                continue
+            return r
+
+    def get(self, url, **kwargs):
+        return self.pedir("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.pedir("POST", url, **kwargs)
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Ingesta multi-fuente
+--------------------
+- Una fuente implementa tres etapas: fetch (red/archivo) → parse (filas crudas) →
+  normalize (items como los de normalize_multilevel: via, long_km, vigente_desde, clase, ejes, tarifa).
+- `ejecutar_fuentes` corre fetch/parse/normalize de todas las fuentes en paralelo (hilos: el
+  costo dominante es E/S) y persiste cada resultado, en orden de llegada, con un único escritor:
+  persist_items_normalizados (en lote), una consulta por (fuente, fecha_corte).
+- El campo `fuente` llega a consulta.params_json, tarifa_snapshot, tarifa_historial, consulta_evento y
+  tarifa_snapshot_raw (con su fecha_corte, migración 009: --from-raw re-procesa por corte y fuente).
+  El snapshot es por (definición, fecha_corte, fuente) y el histórico SCD2 por (definición, fuente):
+  si dos fuentes no coinciden en una tarifa, cada una conserva su línea de tiempo (migración 008).
+
+Fuentes incluidas:
+    FuenteSIBUAC → el flujo GET/POST de sibuac_tarifas_full.py
+    FuenteCSV    → captura manual u otros operadores (CAPUFE, concesionarias) exportados a CSV
+                   con las columnas via,long_km,vigente_desde,clase,ejes,tarifa (las de --dump-csv)
+
+Uso:
+    python scrapers/fuentes.py --db scrapers/sibuac_tarifas.sqlite --sibuac --csv CAPUFE=capufe.csv
+    python scrapers/fuentes.py --db scrapers/sibuac_tarifas.sqlite --csv MANUAL=captura.csv --fecha-corte 2025-03-01
+"""
+
+import argparse
+import csv
+import datetime as dt
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import sibuac_tarifas_full as sib  # noqa: E402
+from cliente_http import ClienteHTTP  # noqa: E402
+from db import publicar as db_publicar  # noqa: E402  (sibuac_tarifas_full agrega la raíz del repo)
+from db.bloqueo import bloqueo_ingesta  # noqa: E402
+
+COLUMNAS_ITEM = ("via", "long_km", "vigente_desde", "clase", "ejes", "tarifa")
+
+
+class Fuente:
+    """Interfaz de una fuente de tarifas. Las subclases implementan fetch y parse (y normalize si hace falta)."""
+
+    nombre = None
+    min_vias = 0
+
+    def __init__(self, fecha_corte=None):
+        self._fecha_corte = fecha_corte
+
+    def fecha_corte(self):
+        return self._fecha_corte or dt.date.today().isoformat()
+
+    def fetch(self, metricas):
+        raise NotImplementedError
+
+    def parse(self, crudo, metricas):
+        raise NotImplementedError
+
+    def normalize(self, parseado, metricas):
+        return parseado
+
+    def ejecutar(self, metricas):
+        """fetch → parse → normalize con spans; valida el mínimo de vías. Devuelve los items."""
+        with metricas.etapa("fetch"):
+            crudo = self.fetch(metricas)
+        with metricas.etapa("parse"):
+            parseado = self.parse(crudo, metricas)
+        with metricas.etapa("normalize"):
+            items = self.normalize(parseado, metricas)
+        metricas.contar("normalize", "items", len(items))
+        vias_unicas = {it["via"] for it in items}
+        if len(vias_unicas) < self.min_vias:
+            raise RuntimeError(f"{self.nombre}: demasiado pocas vías ({len(vias_unicas)}<{self.min_vias}).")
+        return items
+
+
+class FuenteSIBUAC(Fuente):
+    nombre = "SIBUAC"
+
+    def __init__(self, fecha_corte=None, min_vias=120, deadline_s=300.0):
+        super().__init__(fecha_corte)
+        self.min_vias = min_vias
+        self.deadline_s = deadline_s
+
+    def fetch(self, metricas):
+        cliente = ClienteHTTP(metricas, deadline_s=self.deadline_s)
+        try:
+            return sib.descargar_tabla_html(metricas, cliente)
+        finally:
+            cliente.close()
+
+    def parse(self, html, metricas):
+        row0, row1, row1_blocked, data_rows = sib.parse_table_with_multilevel_headers(html)
+        metricas.contar("parse", "filas", len(data_rows))
+        return row0, row1, row1_blocked, data_rows
+
+    def normalize(self, tabla, metricas):
+        return sib.normalize_multilevel(*tabla)
+
+
+class FuenteCSV(Fuente):
+    """CSV con encabezado COLUMNAS_ITEM; los textos se convierten en el escritor (normalizar_columnas)."""
+
+    def __init__(self, nombre, ruta, fecha_corte=None, min_vias=0):
+        super().__init__(fecha_corte)
+        self.nombre = nombre
+        self.ruta = ruta
+        self.min_vias = min_vias
+
+    def fetch(self, metricas):
+        with open(self.ruta, "r", encoding="utf-8-sig", newline="") as f:
+            texto = f.read()
+        metricas.contar("fetch", "bytes", len(texto.encode("utf-8")))
+        return texto
+
+    def parse(self, texto, metricas):
+        lector = csv.DictReader(io.StringIO(texto))
+        faltan = [c for c in ("via", "clase", "tarifa") if c not in (lector.fieldnames or [])]
+        if faltan:
+            raise RuntimeError(f"{self.nombre}: faltan columnas {faltan} en {self.ruta}")
+        filas = list(lector)
+        metricas.contar("parse", "filas", len(filas))
+        return filas
+
+    def normalize(self, filas, metricas):
+        return [{c: (fila.get(c) or "").strip() or None for c in COLUMNAS_ITEM} for fila in filas]
+
+
+def ejecutar_fuentes(con, fuentes, workers=None, save_raw=True):
+    """
+    Corre las fuentes en paralelo y persiste cada una al terminar (un solo escritor: este hilo).
+    Devuelve {nombre: nuevos_en_histórico | Exception}.
+    """
+    resultados = {}
+    with ThreadPoolExecutor(max_workers=workers or len(fuentes)) as ex:
+        pendientes = {}
+        for fuente in fuentes:
+            metricas = sib.MetricasCorrida()
+            pendientes[ex.submit(fuente.ejecutar, metricas)] = (fuente, metricas)
+        for fut in as_completed(pendientes):
+            fuente, metricas = pendientes[fut]
+            try:
+                items = fut.result()
+                with metricas.etapa("persist"):
+                    nuevos = sib.persist_items_normalizados(con, items, fuente.fecha_corte(), save_raw=save_raw,
+                                                           metricas=metricas, fuente=fuente.nombre)
+                resultados[fuente.nombre] = nuevos
+                print(f"[FUENTES] {fuente.nombre}: {len(items)} filas, {nuevos} cambios en histórico")
+            except Exception as exc:
+                resultados[fuente.nombre] = exc
+                print(f"[FUENTES] {fuente.nombre}: ERROR {exc}")
+            finally:
+                # también si la fuente falla; antes de persistir no hay consulta → consulta_id NULL
+                metricas.guardar(con)
+    return resultados
+
+
+def _par_csv(valor):
+    nombre, sep, ruta = valor.partition("=")
+    if not sep:
+        nombre, ruta = "MANUAL", valor
+    return nombre.strip().upper(), ruta
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingesta de tarifas desde varias fuentes")
+    parser.add_argument("--db", default="sibuac_tarifas.sqlite", help="Ruta BD SQLite")
+    parser.add_argument("--sibuac", action="store_true", help="Incluir la consulta en línea a SIBUAC")
+    parser.add_argument("--csv", action="append", default=[], type=_par_csv, metavar="[FUENTE=]RUTA",
+                        help="CSV de una fuente (repetible); sin FUENTE= se registra como MANUAL")
+    parser.add_argument("--fecha-corte", help="fecha_corte para todas las fuentes (por defecto: hoy)")
+    parser.add_argument("--min-vias", type=int, default=120, help="Mínimo de vías únicas para SIBUAC")
+    parser.add_argument("--deadline", type=float, default=float(os.environ.get("SCRAPER_DEADLINE_S", "300")),
+                        help="Plazo total (s) de la descarga de SIBUAC, reintentos incluidos")
+    parser.add_argument("--workers", type=int, default=None, help="Hilos para fetch/parse (por defecto: una por fuente)")
+    parser.add_argument("--no-raw", action="store_true", help="No guardar tarifa_snapshot_raw")
+    parser.add_argument("--publish-dir", default=os.environ.get("DB_PUBLISH_DIR"),
+                        help="Publica un snapshot de sólo lectura para la API al terminar (o DB_PUBLISH_DIR)")
+    parser.add_argument("--publish-keep", type=int, default=3, help="Snapshots publicados a conservar")
+    parser.add_argument("--lock-wait", type=float, default=0,
+                        help="Segundos a esperar si otra ingesta tiene el bloqueo de la BD (por defecto: fallar)")
+    args = parser.parse_args()
+
+    fuentes = [FuenteCSV(nombre, ruta, args.fecha_corte) for nombre, ruta in args.csv]
+    if args.sibuac:
+        fuentes.insert(0, FuenteSIBUAC(args.fecha_corte, args.min_vias, args.deadline))
+    if not fuentes:
+        parser.error("indica al menos una fuente (--sibuac o --csv)")
+    nombres = [f.nombre for f in fuentes]
+    if len(set(nombres)) != len(nombres):
+        parser.error(f"nombres de fuente repetidos: {nombres}")
+
+    with bloqueo_ingesta(args.db, args.lock_wait):
+        con = sib.ensure_db_norm(args.db)
+        try:
+            resultados = ejecutar_fuentes(con, fuentes, workers=args.workers, save_raw=not args.no_raw)
+            if any(not isinstance(r, Exception) for r in resultados.values()):
+                sib.optimizar_estadisticas(con)
+                if args.publish_dir:
+                    db_publicar.publicar(con, args.publish_dir, keep=args.publish_keep)
+        finally:
+            con.close()
+    fallidas = [n for n, r in resultados.items() if isinstance(r, Exception)]
+    print(f"OK: {len(fuentes) - len(fallidas)}/{len(fuentes)} fuentes persistidas en {args.db}"
+          + (f"; con error: {', '.join(fallidas)}" if fallidas else ""))
+    if fallidas:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -52,6 +52,17 @@ CREATE TABLE IF NOT EXISTS consulta_item (
   historial_id  INTEGER NOT NULL REFERENCES tarifa_historial(id)
 );
 CREATE INDEX IF NOT EXISTS ix_citem_consulta ON consulta_item(consulta_id);
+-- Métricas por corrida: spans por etapa, HTTP por intento, filas y commits
+CREATE TABLE IF NOT EXISTS consulta_metrics (
+  id             INTEGER PRIMARY KEY AUTOINCREMENT,
+  consulta_id    INTEGER REFERENCES consulta(id),   -- NULL si la corrida falló antes de persistir
+  etapa          TEXT NOT NULL,                     -- get_form, post_consultar, parse, persist, http, ...
+  metrica        TEXT NOT NULL,                     -- duracion_ms, latencia_ms, bytes, commits, insertadas.<tabla>
+  valor          REAL,
+  detalle_json   TEXT,
+  registrado_at  TEXT DEFAULT (datetime('now'))
+);
+CREATE INDEX IF NOT EXISTS ix_cmetrics_consulta ON consulta_metrics(consulta_id);
 
 -- =============== Crudo opcional (auditoría) ===============
 CREATE TABLE IF NOT EXISTS tarifa_snapshot_raw (
@@ -76,7 +87,6 @@ CREATE TABLE IF NOT EXISTS tarifa_snapshot (
   fuente         TEXT DEFAULT 'SIBUAC'
 );
 CREATE INDEX IF NOT EXISTS ix_snap_def ON tarifa_snapshot(definicion_id);
-CREATE INDEX IF NOT EXISTS ix_snap_fecha ON tarifa_snapshot(fecha_corte);
 
 -- =============== Vistas (compatibles con app__.py) ===============
 DROP VIEW IF EXISTS vw_tarifa_vigente;
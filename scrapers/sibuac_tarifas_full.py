@@ -13,27 +13,48 @@ SIBUAC - Scraper + Normalización + Histórico
 
 import argparse
 import datetime as dt
+import glob
+import hashlib
+import itertools
 import json
 import os
 import re
+import signal
 import sqlite3
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
 from typing import Dict, List
 from urllib.parse import urljoin
 
-import requests
 from bs4 import BeautifulSoup
 
 from datetime import datetime, date
 
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db import migrate as db_migrate  # noqa: E402
+from db import publicar as db_publicar  # noqa: E402
+from db.bloqueo import BloqueoOcupado, bloqueo_ingesta  # noqa: E402
+from cliente_http import ClienteHTTP, es_disculpe  # noqa: E402
+
 BASE = "https://app.sct.gob.mx/sibuac_internet"
 URL_FORM = f"{BASE}/ControllerUI?action=CmdSelTarifaRep1Data"
 
 def norm_fecha(txt: str, default_today=True) -> str:
     if not txt or not str(txt).strip():
         return date.today().isoformat() if default_today else None
-    s = str(txt).strip()
+    iso = _norm_fecha_iso(str(txt).strip())
+    if iso is None and default_today:
+        # "hoy" no se memoiza: un proceso largo debe ver la fecha real
+        return date.today().isoformat()
+    return iso
+
 
+@lru_cache(maxsize=4096)
+def _norm_fecha_iso(s: str):
     # 1) DD/MM/YYYY
     m = re.match(r'^(\d{1,2})/(\d{1,2})/(\d{4})$', s)
     if m:
@@ -52,8 +73,8 @@ def norm_fecha(txt: str, default_today=True) -> str:
         except ValueError:
             pass
 
-    # 4) Último recurso: intenta dateutil si lo usas; si no, devuelve hoy o None
-    return date.today().isoformat() if default_today else None
+    # 4) Último recurso: intenta dateutil si lo usas; si no, None (norm_fecha decide si hoy)
+    return None
 
 
 # ------------------- util debug -------------------
@@ -66,16 +87,85 @@ def dump_html(prefix: str, html: str):
     print(f"[DEBUG] Guardado {fname}")
 
 
+# ------------------- métricas por corrida -------------------
+
+class MetricasCorrida:
+    """
+    Instrumentación de una corrida: spans por etapa, HTTP por intento,
+    filas parseadas/insertadas por tabla y commits.
+    Cada evento se emite como una línea JSON (log) y al final se persiste en consulta_metrics.
+    """
+
+    def __init__(self):
+        self.consulta_id = None
+        self.eventos = []
+        self.contadores = {}
+
+    def registrar(self, etapa, metrica, valor, **detalle):
+        ev = {"etapa": etapa, "metrica": metrica, "valor": valor, "detalle": detalle or None}
+        self.eventos.append(ev)
+        print(json.dumps({"metrics": ev, "ts": dt.datetime.now().isoformat(timespec="milliseconds")},
+                         ensure_ascii=False))
+
+    @contextmanager
+    def etapa(self, nombre):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(nombre, "duracion_ms", round((time.perf_counter() - t0) * 1000, 3))
+
+    def http(self, metodo, url, status, nbytes, ms, intento=1, **extra):
+        self.registrar("http", "latencia_ms", round(ms, 3),
+                       metodo=metodo, url=url, status=status, bytes=nbytes, intento=intento, **extra)
+        self.contar("http", "bytes", nbytes)
+        if extra.get("bytes_red") is not None:
+            self.contar("http", "bytes_red", extra["bytes_red"])
+        self.contar("http", "peticiones")
+        if status is None or status >= 500:
+            self.contar("http", "errores")
+
+    def contar(self, etapa, metrica, n=1):
+        self.contadores[(etapa, metrica)] = self.contadores.get((etapa, metrica), 0) + n
+
+    def guardar(self, con):
+        """Persiste eventos + contadores (una fila por métrica) ligados a consulta_id."""
+        for (etapa, metrica), valor in self.contadores.items():
+            self.registrar(etapa, metrica, valor)
+        con.executemany("""INSERT INTO consulta_metrics(consulta_id, etapa, metrica, valor, detalle_json)
+                            VALUES(?,?,?,?,?)""",
+                        [(self.consulta_id, ev["etapa"], ev["metrica"], ev["valor"],
+                          json.dumps(ev["detalle"], ensure_ascii=False) if ev["detalle"] else None)
+                         for ev in self.eventos])
+        con.commit()
+
+
 # ------------------- HTTP + parsing de form -------------------
 
-def get_form_and_session():
-    s = requests.Session()
-    s.headers.update({"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"})
-    r = s.get(URL_FORM, timeout=30)
-    r.raise_for_status()
-    dump_html("debug_GET_CmdSelTarifaRep1Data", r.text)
-    soup = BeautifulSoup(r.text, "html.parser")
-    return s, soup, r.url, r.text
+def get_form(cliente):
+    """GET del form. Devuelve (html, url, huella sha256 del cuerpo)."""
+    r = cliente.get(URL_FORM, reintentar_si=es_disculpe)
+    return r.text, r.url, hashlib.sha256(r.content).hexdigest()
+
+
+def leer_form(page_html, page_url):
+    """Form → (action_url, base_data, radio_choice, consultar_submit, all_vias)."""
+    form = pick_form(BeautifulSoup(page_html, "html.parser"))
+
+    # vias ids + labels (diagnóstico)
+    all_vias = extract_all_select_via_values(form)
+    print(f"[DEBUG] selectVia options encontrados: {len(all_vias)}")
+    via_labels = extract_select_via_labels(form)
+    print(f"[DEBUG] labels válidos de vía: {len(via_labels)}")
+
+    # payload y radio
+    action_url, base_data, radios, consultar_submit = extract_form_data(form, page_url)
+    print("[DEBUG] action_url =", action_url)
+    print("[DEBUG] radios =", [(n, v, c, l) for (n, v, c, l) in radios][:5])
+    print("[DEBUG] submit consultar =", consultar_submit)
+    radio_choice = choose_second_radio_payload(radios)
+    print("[DEBUG] elegido segundo radio =", radio_choice)
+    return action_url, base_data, radio_choice, consultar_submit, all_vias
 
 
 def pick_form(soup: BeautifulSoup):
@@ -181,7 +271,7 @@ def choose_second_radio_payload(radios):
 # ------------------- POST con variantes de action -------------------
 
 def looks_like_tarifas_table(html: str) -> bool:
-    if "Disculpe usted, pero por el momento no podemos atenderlo" in html:
+    if es_disculpe(html):
         return False
     soup = BeautifulSoup(html, "html.parser")
     tables = soup.find_all("table")
@@ -198,7 +288,15 @@ def looks_like_tarifas_table(html: str) -> bool:
     return has_via and has_long
 
 
-def post_consultar(session, action_url, base_data, radio_choice, consultar_submit, page_html, all_vias):
+def post_consultar(session, action_url, base_data, radio_choice, consultar_submit, page_html, all_vias,
+                   metricas=None, cache=None):
+    """
+    Prueba las variantes de action hasta obtener la tabla. `session` es un ClienteHTTP (o una
+    requests.Session, que se envuelve). Si TODAS las variantes responden "Disculpe usted..."
+    (sitio saturado) se repite la ronda con backoff, dentro del plazo del cliente.
+    cache (modo --daemon): la variante que funcionó se prueba primero en la siguiente corrida.
+    """
+    cliente = session if isinstance(session, ClienteHTTP) else ClienteHTTP(metricas, session=session)
     # base payload sin 'action'
     payload = {k: v for k, v in base_data.items() if k.lower() != "action"}
     payload.update(radio_choice or {})
@@ -228,18 +326,29 @@ def post_consultar(session, action_url, base_data, radio_choice, consultar_submi
         "CmdImpTarifasRep1Data",
         "cmdImpTarifasRep1Data",
     ]
+    if cache and cache.get("variante") in variants:
+        variants.remove(cache["variante"])
+        variants.insert(0, cache["variante"])
 
     print("[DEBUG] payload keys =", sorted(set(k for k, _ in data_items)))
     last_html = None
-    for i, v in enumerate(variants, 1):
-        url_try = base + ("&" if "?" in action_url else "?") + f"action={v}"
-        print(f"[DEBUG] POST try#{i} => {url_try}")
-        r = session.post(url_try, data=data_items, timeout=60, headers=headers)
-        r.raise_for_status()
-        last_html = r.text
-        dump_html(f"debug_POST_try{i}", last_html)
-        if looks_like_tarifas_table(last_html):
-            return last_html
+    for ronda in range(cliente.reintentos + 1):
+        for i, v in enumerate(variants, 1):
+            url_try = base + ("&" if "?" in action_url else "?") + f"action={v}"
+            print(f"[DEBUG] POST try#{i} => {url_try}")
+            r = cliente.post(url_try, data=data_items, headers=headers)
+            last_html = r.text
+            dump_html(f"debug_POST_try{i}", last_html)
+            if looks_like_tarifas_table(last_html):
+                if cache is not None:
+                    cache["variante"] = v
+                return last_html
+        if not es_disculpe(last_html):
+            break   # respuesta inesperada (no saturación): insistir no ayuda
+        if ronda == cliente.reintentos:
+            break   # última ronda: no esperar un backoff para rendirse igual
+        print(f"[DEBUG] todas las variantes respondieron 'Disculpe'; reintento de ronda {ronda + 1}")
+        cliente.esperar_reintento(ronda + 1)
 
     return last_html
 
@@ -303,6 +412,7 @@ def build_header_grid(table):
     return row0, row1, row1_blocked, total_cols, trs
 
 
+@lru_cache(maxsize=1024)
 def parse_ejes_int(texto: str):
     if not texto:
         return None
@@ -310,6 +420,7 @@ def parse_ejes_int(texto: str):
     return int(m.group(0)) if m else None
 
 
+@lru_cache(maxsize=8192)
 def parse_long_km(raw):
     if raw is None:
         return None
@@ -328,9 +439,10 @@ def parse_long_km(raw):
         return None
 
 
-def parse_table_with_multilevel_headers(html: str):
+def parse_table_with_multilevel_headers(html: str, dump_errores=True):
     if "Disculpe usted, pero por el momento no podemos atenderlo" in html:
-        dump_html("debug_ERROR_like", html)
+        if dump_errores:
+            dump_html("debug_ERROR_like", html)
         raise RuntimeError("Respuesta del servidor: ‘Disculpe usted…’. No se insertó nada.")
 
     soup = BeautifulSoup(html, "html.parser")
@@ -345,7 +457,8 @@ def parse_table_with_multilevel_headers(html: str):
     # Validación básica
     low = " ".join([c.lower() for c in row0])
     if ("vía" not in low) and (" via " not in f" {low} "):
-        dump_html("debug_ERROR_like", html)
+        if dump_errores:
+            dump_html("debug_ERROR_like", html)
         raise RuntimeError("No parece la tabla esperada (faltó 'Vía').")
 
     # Data rows: a partir de la tercera fila real (si hubo segunda de header)
@@ -387,6 +500,17 @@ def normalize_multilevel(row0, row1, row1_blocked, data_rows):
     idx_vig  = find_col(["vigente desde", "vigencia", "fecha vigencia", "vigente"])
     base_idxs = {i for i in [idx_via, idx_long, idx_vig] if i >= 0}
 
+    # clase/ejes dependen sólo del encabezado: se resuelven una vez por columna
+    cols_tarifa = []
+    for ci, (top, bot) in enumerate(zip(row0, row1)):
+        if ci in base_idxs:
+            continue
+        clase = (top or "").strip()
+        if not clase:
+            continue
+        ejes_txt = (bot or "").strip() or (top or "")
+        cols_tarifa.append((ci, clase, parse_ejes_int(ejes_txt)))
+
     results = []
     last_km = None
     for row in data_rows:
@@ -401,15 +525,10 @@ def normalize_multilevel(row0, row1, row1_blocked, data_rows):
             last_km = km
         vigente = row[idx_vig] if idx_vig >= 0 else ""
 
-        for ci, (top, bot, blocked) in enumerate(zip(row0, row1, row1_blocked)):
-            if ci in base_idxs:
-                continue
-            clase = (top or "").strip()
-            ejes_txt = (bot or "").strip() or (top or "")
+        for ci, clase, ejes in cols_tarifa:
             tarifa = (row[ci] or "").strip()
-            if not clase or not tarifa:
+            if not tarifa:
                 continue
-            ejes = parse_ejes_int(ejes_txt)
             results.append({
                 "via": via,
                 "long_km": km,
@@ -474,6 +593,17 @@ CREATE TABLE IF NOT EXISTS consulta_item (
 );
 CREATE INDEX IF NOT EXISTS ix_citem_consulta ON consulta_item(consulta_id);
 
+CREATE TABLE IF NOT EXISTS consulta_metrics (
+    id             INTEGER PRIMARY KEY AUTOINCREMENT,
+    consulta_id    INTEGER REFERENCES consulta(id),
+    etapa          TEXT NOT NULL,
+    metrica        TEXT NOT NULL,
+    valor          REAL,
+    detalle_json   TEXT,
+    registrado_at  TEXT DEFAULT (datetime('now'))
+);
+CREATE INDEX IF NOT EXISTS ix_cmetrics_consulta ON consulta_metrics(consulta_id);
+
 CREATE TABLE IF NOT EXISTS tarifa_snapshot_raw (
     id             INTEGER PRIMARY KEY AUTOINCREMENT,
     via            TEXT,
@@ -495,7 +625,6 @@ CREATE TABLE IF NOT EXISTS tarifa_snapshot (
   fuente         TEXT DEFAULT 'SIBUAC'
 );
 CREATE INDEX IF NOT EXISTS ix_snap_def ON tarifa_snapshot(definicion_id);
-CREATE INDEX IF NOT EXISTS ix_snap_fecha ON tarifa_snapshot(fecha_corte);
 """
 
 
@@ -504,16 +633,12 @@ def ensure_db_norm(db_path: str):
     con.row_factory = sqlite3.Row
     con.execute("PRAGMA foreign_keys=ON;")
     con.execute("PRAGMA journal_mode=WAL;")
-    schema_path = os.path.join(os.path.dirname(__file__), "schema_norm.sql")
-    if os.path.exists(schema_path):
-        with open(schema_path, "r", encoding="utf-8") as f:
-            con.executescript(f.read())
-    else:
-        con.executescript(SCHEMA_NORM_FALLBACK)
-    con.commit()
+    # Chequeo barato (PRAGMA user_version); el DDL sólo corre si hay migraciones pendientes
+    db_migrate.migrar(con, esquema_base_sql=SCHEMA_NORM_FALLBACK)
     return con
 
 
+@lru_cache(maxsize=8192)
 def _parse_decimal(txt: str):
     if txt is None:
         return None
@@ -538,67 +663,87 @@ def _parse_decimal(txt: str):
     except ValueError:
         return None
 
-def _upsert_via(con, via, long_km):
-    cur = con.cursor()
-    def to_int(x):
-        if x is None: return None
-        if isinstance(x, int): return x
-        return parse_long_km(x)
-    km = to_int(long_km)
-
-    if km is not None:
-        row = cur.execute("SELECT id FROM via WHERE via=? AND long_km=?", (via, km)).fetchone()
-        if row: return row[0]
-        # ¿existe con NULL? promuévelo
-        row = cur.execute("SELECT id FROM via WHERE via=? AND long_km IS NULL", (via,)).fetchone()
-        if row:
-            cur.execute("UPDATE via SET long_km=? WHERE id=?", (km, row[0])); con.commit(); return row[0]
-        cur.execute("INSERT INTO via(via,long_km) VALUES(?,?)", (via, km)); con.commit(); return cur.lastrowid
-    else:
-        row = cur.execute("SELECT id FROM via WHERE via=? AND long_km IS NULL", (via,)).fetchone()
-        if row: return row[0]
-        cur.execute("INSERT OR IGNORE INTO via(via,long_km) VALUES(?,NULL)", (via,)); con.commit()
-        return cur.execute("SELECT id FROM via WHERE via=? AND long_km IS NULL", (via,)).fetchone()[0]
-
-
-def _upsert_clase(con, nombre):
-    cur = con.cursor()
-    nombre = (nombre or "SIN CLASE").strip()
-    cur.execute("INSERT OR IGNORE INTO vehiculo_clase(nombre) VALUES(?)", (nombre,)); con.commit()
-    return cur.execute("SELECT id FROM vehiculo_clase WHERE nombre=?", (nombre,)).fetchone()[0]
-
-
-def _upsert_def(con, via_id, clase_id, ejes_int):
-    cur = con.cursor()
-    row = cur.execute("""
-        SELECT id FROM tarifa_definicion
-        WHERE via_id=? AND clase_id=?
-            AND ((ejes IS NULL AND ? IS NULL) OR ejes=?)
-        LIMIT 1
-    """, (via_id, clase_id, ejes_int, ejes_int)).fetchone()
-    if row: return row[0]
-    cur.execute("INSERT INTO tarifa_definicion(via_id,clase_id,ejes) VALUES(?,?,?)",
-                (via_id, clase_id, ejes_int)); con.commit()
-    return cur.lastrowid
+def _convertir_columna(valores, fn):
+    """Aplica fn una sola vez por valor crudo distinto y reparte el resultado."""
+    tabla = {v: fn(v) for v in set(valores)}
+    return [tabla[v] for v in valores]
 
 
-def _hist_vigente(con, def_id):
-    cur = con.cursor()
-    cur.execute("""SELECT id, tarifa FROM tarifa_historial 
-                    WHERE definicion_id=? AND vigente_hasta IS NULL
-                    ORDER BY id DESC LIMIT 1""", (def_id,))
-    return cur.fetchone()
+def normalizar_columnas(items):
+    """
+    Etapa de normalización por columnas (en lote) previa a la persistencia.
+    Los mismos pocos cientos de textos (tarifas, km, fechas) se repiten miles
+    de veces; aquí cada texto distinto se convierte una vez.
+    Devuelve tuplas (via, clase, long_km_int, ejes_int, tarifa_float, desde_iso).
+    """
+    vias = _convertir_columna([it.get("via") for it in items], lambda v: (v or "").strip())
+    clases = _convertir_columna([it.get("clase") for it in items], lambda v: (v or "").strip())
+    kms = _convertir_columna([it.get("long_km") for it in items],
+                             lambda v: v if v is None or isinstance(v, int) else parse_long_km(v))
+    ejes = _convertir_columna([it.get("ejes") for it in items],
+                              lambda v: v if isinstance(v, int) else parse_ejes_int(v))
+    tarifas = _convertir_columna([it.get("tarifa") for it in items], _parse_decimal)
+    desdes = _convertir_columna([it.get("vigente_desde") for it in items], norm_fecha)
+    return list(zip(vias, clases, kms, ejes, tarifas, desdes))
+
+
+def _cargar_catalogos(con, cache=None):
+    """
+    Catálogos + tarifas vigentes en memoria: vias {(via, long_km): id}, clases {nombre: id},
+    defs {(via_id, clase_id, ejes): id}, vigentes {(definicion_id, fuente): (hist_id, tarifa)}
+    (cada fuente lleva su propia línea de tiempo SCD2, migración 008).
+    Con cache (modo --daemon) se reutilizan mientras PRAGMA data_version no cambie, es decir,
+    mientras ninguna otra conexión haya escrito la BD; las altas propias se agregan al vuelo.
+    """
+    version = con.execute("PRAGMA data_version").fetchone()[0]
+    if cache is not None and cache.get("catalogos_version") == version:
+        return cache["catalogos"]
+    cat = {
+        "vias": {(via, km): vid for vid, via, km in con.execute("SELECT id, via, long_km FROM via")},
+        "clases": {nombre: i for i, nombre in con.execute("SELECT id, nombre FROM vehiculo_clase")},
+        "defs": {(v, c, e): i for i, v, c, e in con.execute("SELECT id, via_id, clase_id, ejes FROM tarifa_definicion")},
+        "vigentes": {(d, f): (h, t) for h, d, f, t in con.execute(
+            "SELECT id, definicion_id, fuente, tarifa FROM tarifa_historial WHERE vigente_hasta IS NULL")},
+    }
+    if cache is not None:
+        cache["catalogos"], cache["catalogos_version"] = cat, version
+    return cat
+
+
+def _resolver_via(con, vias, via, km):
+    """Misma regla que el upsert fila a fila: (via, km) existente, promoción de long_km NULL o alta."""
+    vid = vias.get((via, km))
+    if vid is not None:
+        return vid
+    if km is not None and (via, None) in vias:
+        # ¿existe con NULL? promuévelo
+        vid = vias.pop((via, None))
+        con.execute("UPDATE via SET long_km=? WHERE id=?", (km, vid))
+    else:
+        vid = con.execute("INSERT INTO via(via,long_km) VALUES(?,?)", (via, km)).lastrowid
+    vias[(via, km)] = vid
+    return vid
 
 
-def _close_hist(con, hist_id, hasta_iso):
-    con.execute("UPDATE tarifa_historial SET vigente_hasta=? WHERE id=?", (hasta_iso, hist_id)); con.commit()
+def _resolver_clase(con, clases, nombre):
+    nombre = nombre or "SIN CLASE"
+    cid = clases.get(nombre)
+    if cid is None:
+        cid = clases[nombre] = con.execute("INSERT INTO vehiculo_clase(nombre) VALUES(?)", (nombre,)).lastrowid
+    return cid
 
 
-def _insert_hist(con, def_id, tarifa, desde_iso, fuente="SIBUAC"):
-    cur = con.cursor()
-    cur.execute("""INSERT INTO tarifa_historial(definicion_id, tarifa, vigente_desde, fuente)
-                    VALUES(?,?,?,?)""", (def_id, float(tarifa), desde_iso, fuente)); con.commit()
-    return cur.lastrowid
+def _insertar_lote(con, tabla, columnas, filas):
+    """executemany + ids asignados (AUTOINCREMENT crece en orden de inserción; se llama con el lock de escritura)."""
+    if not filas:
+        return []
+    antes = con.execute(f"SELECT IFNULL(MAX(id), 0) FROM {tabla}").fetchone()[0]
+    marcas = ",".join("?" * len(columnas))
+    con.executemany(f"INSERT INTO {tabla}({','.join(columnas)}) VALUES({marcas})", filas)
+    ids = [r[0] for r in con.execute(f"SELECT id FROM {tabla} WHERE id > ? ORDER BY id", (antes,))]
+    if len(ids) != len(filas):
+        raise RuntimeError(f"{tabla}: se esperaban {len(filas)} ids nuevos y hay {len(ids)}")
+    return ids
 
 
 def _begin_consulta(con, params: dict):
@@ -610,110 +755,342 @@ def _begin_consulta(con, params: dict):
 
 
 def _end_consulta(con, cid, status):
-    con.execute("UPDATE consulta SET status=? WHERE id=?", (status, cid)); con.commit()
+    """Status + evento (outbox) y COMMIT. Con OK se llama dentro de la transacción de los datos."""
+    con.execute("UPDATE consulta SET status=? WHERE id=?", (status, cid))
+    if status == "OK":
+        _registrar_evento(con, cid)
+    con.commit()
 
 
-def _append_citem(con, cid, hid):
-    con.execute("INSERT INTO consulta_item(consulta_id, historial_id) VALUES(?,?)", (cid, hid)); con.commit()
+def _registrar_evento(con, cid):
+    """Evento de cambios de la consulta (feed /api/v1/eventos): conteos + definiciones cambiadas."""
+    params = json.loads(con.execute("SELECT params_json FROM consulta WHERE id=?", (cid,)).fetchone()[0] or "{}")
+    defs = [r[0] for r in con.execute("""SELECT DISTINCT h.definicion_id
+                                         FROM consulta_item ci JOIN tarifa_historial h ON h.id = ci.historial_id
+                                         WHERE ci.consulta_id=? ORDER BY h.definicion_id""", (cid,))]
+    nuevos = con.execute("SELECT COUNT(*) FROM consulta_item WHERE consulta_id=?", (cid,)).fetchone()[0]
+    snaps = con.execute("SELECT COUNT(*) FROM tarifa_snapshot WHERE consulta_id=?", (cid,)).fetchone()[0]
+    con.execute("""INSERT OR REPLACE INTO consulta_evento(consulta_id, fuente, fecha_corte, nuevos_hist, snapshots,
+                                                       definiciones_json)
+                   VALUES(?,?,?,?,?,?)""",
+                (cid, params.get("fuente", "SIBUAC"), params.get("fecha_corte"), nuevos, snaps, json.dumps(defs)))
+
+
+SQL_UPSERT_SNAPSHOT = """
+    INSERT INTO tarifa_snapshot (definicion_id, consulta_id, fecha_corte, vigente_desde, tarifa, fuente)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(definicion_id, fecha_corte, fuente)
+    DO UPDATE SET
+        vigente_desde = excluded.vigente_desde,
+        tarifa       = excluded.tarifa,
+        consulta_id  = COALESCE(excluded.consulta_id, consulta_id)
+"""
 
+TABLAS_DIMENSION = ("via", "vehiculo_clase", "tarifa_definicion")
 
-def _insert_snapshot_def(con, def_id, consulta_id, fecha_corte, vigente_desde, tarifa, fuente="SIBUAC"):
-    con.execute("""
-        INSERT INTO tarifa_snapshot (definicion_id, consulta_id, fecha_corte, vigente_desde, tarifa, fuente)
-        VALUES (?, ?, ?, ?, ?, ?)
-        ON CONFLICT(definicion_id, fecha_corte, fuente)
-        DO UPDATE SET
-            vigente_desde = excluded.vigente_desde,
-            tarifa       = excluded.tarifa,
-            consulta_id  = COALESCE(excluded.consulta_id, consulta_id)
-    """, (def_id, consulta_id, fecha_corte, vigente_desde, float(tarifa), fuente))
-    con.commit()
 
+def _contar_filas(con, tablas):
+    return {t: con.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in tablas}
 
-def persist_items_normalizados(con, items, fecha_corte, save_raw=True):
-    cid = _begin_consulta(con, {"fecha_corte": fecha_corte, "fuente":"SIBUAC"})
+
+def persist_items_normalizados(con, items, fecha_corte, save_raw=True, metricas=None, fuente="SIBUAC",
+                               cache=None):
+    """
+    Escritor en lote (compartido por todas las fuentes, ver fuentes.py): una consulta por
+    (fuente, fecha_corte). Carga catálogos y tarifas vigentes una vez (o los toma de `cache`,
+    ver _cargar_catalogos), resuelve todo en memoria y escribe con executemany dentro de una
+    sola transacción (BEGIN IMMEDIATE).
+    Si una definición se repite en el lote, gana la última fila (igual que el snapshot).
+    """
+    if metricas:
+        # cuenta sentencias y COMMITs reales del módulo sqlite3
+        def _traza(sql):
+            metricas.contar("sqlite", "sentencias")
+            if sql.startswith("COMMIT"):
+                metricas.contar("sqlite", "commits")
+        con.set_trace_callback(_traza)
+        dims_antes = _contar_filas(con, TABLAS_DIMENSION)
+    cid = _begin_consulta(con, {"fecha_corte": fecha_corte, "fuente": fuente})
+    if metricas:
+        metricas.consulta_id = cid
     nuevos = 0
+    cierres = 0
     try:
-        for it in items:
-            if save_raw:
-                con.execute("""INSERT INTO tarifa_snapshot_raw(via,long_km,vigente_desde,clase,ejes,tarifa)
-                                VALUES(?,?,?,?,?,?)""",
-                            (it.get("via"),
-                            str(it.get("long_km") if it.get("long_km") is not None else ""),
-                            it.get("vigente_desde"),
-                            it.get("clase"),
-                            str(it.get("ejes") if it.get("ejes") is not None else ""),
-                            it.get("tarifa")))
-
-            via = (it.get("via") or "").strip()
-            clase = (it.get("clase") or "").strip()
-            ejes_int  = it.get("ejes") if isinstance(it.get("ejes"), int) else parse_ejes_int(it.get("ejes"))
-            tarifa_val = _parse_decimal(it.get("tarifa"))
+        # lock de escritura desde el inicio: los ids de _insertar_lote no pueden intercalarse
+        con.execute("BEGIN IMMEDIATE")
+        if save_raw:
+            con.executemany("""INSERT INTO tarifa_snapshot_raw(via,long_km,vigente_desde,clase,ejes,tarifa,
+                                                               fuente,fecha_corte)
+                                VALUES(?,?,?,?,?,?,?,?)""",
+                            [(it.get("via"),
+                              str(it.get("long_km") if it.get("long_km") is not None else ""),
+                              it.get("vigente_desde"),
+                              it.get("clase"),
+                              str(it.get("ejes") if it.get("ejes") is not None else ""),
+                              it.get("tarifa"),
+                              fuente, fecha_corte) for it in items])
+
+        # 1) catálogos: vía y clase (pocas altas), definiciones en lote
+        cat = _cargar_catalogos(con, cache)
+        vias, clases, defs, vigentes = cat["vias"], cat["clases"], cat["defs"], cat["vigentes"]
+        filas = []      # (clave_def, tarifa, desde)
+        for via, clase, km, ejes_int, tarifa_val, desde in normalizar_columnas(items):
             if not via or tarifa_val is None:
                 continue
+            clave = (_resolver_via(con, vias, via, km), _resolver_clase(con, clases, clase), ejes_int)
+            filas.append((clave, tarifa_val, desde or fecha_corte))
+        faltantes = list(dict.fromkeys(k for k, _, _ in filas if k not in defs))
+        defs.update(zip(faltantes, _insertar_lote(con, "tarifa_definicion", ("via_id", "clase_id", "ejes"), faltantes)))
+
+        ultimas = {}    # def_id -> (tarifa, desde); gana la última fila del lote
+        for clave, tarifa_val, desde in filas:
+            ultimas[defs[clave]] = (tarifa_val, desde)
+
+        # 2) snapshot (siempre, por definición)
+        con.executemany(SQL_UPSERT_SNAPSHOT, [(def_id, cid, fecha_corte, desde, float(tarifa), fuente)
+                                              for def_id, (tarifa, desde) in ultimas.items()])
+
+        # 3) histórico SCD2 de esta fuente (sólo si cambia): cierres + altas + consulta_item
+        cerrar, altas = [], []
+        for def_id, (tarifa, desde) in ultimas.items():
+            h = vigentes.get((def_id, fuente))
+            if h is not None:
+                if float(h[1]) == float(tarifa):
+                    continue
+                cerrar.append((norm_fecha(desde), h[0]))
+            altas.append((def_id, float(tarifa), desde, fuente))
+        con.executemany("UPDATE tarifa_historial SET vigente_hasta=? WHERE id=?", cerrar)
+        hids = _insertar_lote(con, "tarifa_historial", ("definicion_id", "tarifa", "vigente_desde", "fuente"), altas)
+        con.executemany("INSERT INTO consulta_item(consulta_id, historial_id) VALUES(?,?)", [(cid, h) for h in hids])
+        nuevos, cierres = len(hids), len(cerrar)
+        vigentes.update(((def_id, fuente), (hid, tarifa)) for hid, (def_id, tarifa, _, _) in zip(hids, altas))
+
+        # Una sola transacción por consulta: filas, status OK y evento del feed, todo o nada
+        # (sin ventana en que since= vea filas sin evento ni consulta RUNNING con datos)
+        _end_consulta(con, cid, "OK")
+        if metricas:
+            for tabla, n in _contar_filas(con, TABLAS_DIMENSION).items():
+                metricas.contar("persist", f"insertadas.{tabla}", n - dims_antes[tabla])
+            metricas.contar("persist", "insertadas.tarifa_snapshot_raw", len(items) if save_raw else 0)
+            metricas.contar("persist", "upserts.tarifa_snapshot", len(ultimas))
+            metricas.contar("persist", "insertadas.tarifa_historial", nuevos)
+            metricas.contar("persist", "insertadas.consulta_item", nuevos)
+            metricas.contar("persist", "cerradas.tarifa_historial", cierres)
+        return nuevos
+    except Exception as ex:
+        con.rollback()
+        if cache is not None:
+            cache.pop("catalogos_version", None)   # pudo quedar con altas que no se confirmaron
+        _end_consulta(con, cid, f"ERROR: {ex}")
+        raise
+    finally:
+        if metricas:
+            con.set_trace_callback(None)
 
-            via_id   = _upsert_via(con, via, it.get("long_km"))
-            clase_id = _upsert_clase(con, clase)
-            def_id   = _upsert_def(con, via_id, clase_id, ejes_int)
 
-            # desde = (it.get("vigente_desde") or fecha_corte)
-            desde = norm_fecha(it.get("vigente_desde")) or fecha_corte
+def optimizar_estadisticas(con):
+    """
+    Refresca sqlite_stat1 tras una ingesta para que la API elija los índices de la
+    migración 005. analysis_limit acota el costo de ANALYZE en BDs grandes.
+    """
+    con.execute("PRAGMA analysis_limit=1000")
+    analizada = con.execute(
+        "SELECT 1 FROM sqlite_master WHERE name='sqlite_stat1'").fetchone() is not None
+    # PRAGMA optimize sólo re-analiza tablas ya analizadas; la primera vez se fuerza ANALYZE
+    con.execute("PRAGMA optimize" if analizada else "ANALYZE")
+    con.commit()
 
 
-            # Snapshot (siempre, por definición)
-            _insert_snapshot_def(con, def_id, cid, fecha_corte, desde, tarifa_val, "SIBUAC")
+# ------------------- Backfill / replay (sin red) -------------------
 
-            # Histórico SCD2 (sólo si cambia)
-            h = _hist_vigente(con, def_id)
-            if h is None:
-                hid = _insert_hist(con, def_id, tarifa_val, desde); _append_citem(con, cid, hid); nuevos += 1
-            else:
-                if float(h[1]) != float(tarifa_val):
-                    # _close_hist(con, h[0], desde)
-                    _close_hist(con, h[0], norm_fecha(desde))
-                    hid = _insert_hist(con, def_id, tarifa_val, desde); _append_citem(con, cid, hid); nuevos += 1
+RE_TS_ARCHIVO = re.compile(r"(\d{8})-\d{6}")
 
-        _end_consulta(con, cid, "OK")
-        return nuevos
-    except Exception as ex:
-        _end_consulta(con, cid, f"ERROR: {ex}")
-        raise
 
+def fecha_corte_de_archivo(path: str) -> str:
+    """fecha_corte de un HTML archivado: timestamp de dump_html en el nombre o, si no, mtime."""
+    m = RE_TS_ARCHIVO.search(os.path.basename(path))
+    if m:
+        return datetime.strptime(m.group(1), "%Y%m%d").date().isoformat()
+    return date.fromtimestamp(os.path.getmtime(path)).isoformat()
 
-# ------------------- main/CLI -------------------
 
-def main():
-    parser = argparse.ArgumentParser(description="Extractor SIBUAC tarifas (Tarifas Vigentes → Consultar)")
-    parser.add_argument("--db", default="sibuac_tarifas.sqlite", help="Ruta BD SQLite")
-    parser.add_argument("--dump-csv", help="Opcional: exportar CSV normalizado")
-    parser.add_argument("--min-vias", type=int, default=120, help="Abortar si vías únicas < min (sanity check)")
-    args = parser.parse_args()
+def listar_archivos_html(rutas) -> List[str]:
+    archivos = []
+    for ruta in rutas:
+        if os.path.isdir(ruta):
+            archivos.extend(glob.glob(os.path.join(ruta, "*.html")))
+        else:
+            archivos.extend(glob.glob(ruta) or [ruta])
+    return sorted(set(archivos))
 
-    # 1) GET + form
-    s, soup, page_url, page_html = get_form_and_session()
-    form = pick_form(soup)
 
-    # 2) vias ids + labels (diagnóstico)
-    all_vias = extract_all_select_via_values(form)
-    print(f"[DEBUG] selectVia options encontrados: {len(all_vias)}")
-    via_labels = extract_select_via_labels(form)
-    print(f"[DEBUG] labels válidos de vía: {len(via_labels)}")
+def _normalizar_archivo_html(path: str):
+    """
+    Worker del pool: un archivo por tarea.
+    Devuelve (fecha_corte, path, items, error) sin tocar la BD ni la red. Un archivo ilegible,
+    con nombre/fecha inválidos o sin tabla se reporta como error y no aborta el pool.
+    """
+    fecha = None
+    try:
+        fecha = fecha_corte_de_archivo(path)
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            html = f.read()
+        row0, row1, row1_blocked, data_rows = parse_table_with_multilevel_headers(html, dump_errores=False)
+    except (OSError, ValueError, RuntimeError) as ex:
+        return fecha, path, [], str(ex)
+    return fecha, path, normalize_multilevel(row0, row1, row1_blocked, data_rows), None
+
+
+def _merge_items(items_por_archivo):
+    """Une los items de varios archivos del mismo corte; gana el archivo más reciente."""
+    merged = {}
+    for _, items in sorted(items_por_archivo, key=lambda x: os.path.basename(x[0])):
+        for it in items:
+            merged[(it["via"], it["long_km"], it["clase"], it["ejes"])] = it
+    return list(merged.values())
+
+
+def _ultimo_corte(con, fuente="SIBUAC"):
+    row = con.execute("SELECT MAX(fecha_corte) FROM tarifa_snapshot WHERE fuente=?", (fuente,)).fetchone()
+    return row[0] if row else None
+
+
+def backfill_desde_html(con, rutas, workers=None, min_vias=0, save_raw=False):
+    """
+    Re-normaliza HTML archivados de SIBUAC en paralelo (ProcessPool) y
+    persiste por fecha_corte ascendente para que el SCD2 quede en orden.
+    Cortes <= al último ya cargado se omiten (re-ejecutar es idempotente);
+    para reconstruir todo el histórico usa una BD nueva.
+    """
+    archivos = listar_archivos_html(rutas)
+    print(f"[BACKFILL] {len(archivos)} archivos HTML, workers={workers or os.cpu_count()}")
+    por_corte = {}
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        for fecha, path, items, err in ex.map(_normalizar_archivo_html, archivos):
+            if err or not items:
+                print(f"[BACKFILL] omitido {path}: {err or 'sin filas'}")
+                continue
+            por_corte.setdefault(fecha, []).append((path, items))
+
+    ultimo = _ultimo_corte(con)
+    total_nuevos = 0
+    for fecha in sorted(por_corte):
+        if ultimo and fecha <= ultimo:
+            print(f"[BACKFILL] {fecha}: omitido, la BD ya tiene cortes hasta {ultimo}")
+            continue
+        items = _merge_items(por_corte[fecha])
+        vias_unicas = {it["via"] for it in items}
+        if len(vias_unicas) < min_vias:
+            print(f"[BACKFILL] {fecha}: omitido, pocas vías ({len(vias_unicas)}<{min_vias})")
+            continue
+        nuevos = persist_items_normalizados(con, items, fecha, save_raw=save_raw)
+        total_nuevos += nuevos
+        print(f"[BACKFILL] {fecha}: {len(items)} filas, {nuevos} cambios en histórico")
+    return total_nuevos
+
+
+def backfill_desde_raw(con, con_raw):
+    """
+    Re-procesa tarifa_snapshot_raw (ya normalizado a filas) de otra BD: una consulta por
+    (fecha_corte, fuente) en orden ascendente, con la fuente de cada fila (migración 009).
+    Filas sin fecha_corte (anteriores a la 009) usan la fecha local de captured_at (UTC en SQLite)
+    y, sin columna fuente, se toman como SIBUAC.
+    con_raw debe ser otra BD: en la misma, todos los cortes ya están cargados y se omitirían.
+    """
+    if con_raw is None or con_raw is con:
+        raise RuntimeError("--from-raw necesita --raw-db con otra BD origen (el destino --db debe ser una BD nueva)")
+    columnas = {r[1] for r in con_raw.execute("PRAGMA table_info(tarifa_snapshot_raw)")}
+    # la BD origen se abre en sólo lectura (sin migrar): puede no tener las columnas de la 009
+    col_corte = ("COALESCE(fecha_corte, date(captured_at, 'localtime'))" if "fecha_corte" in columnas
+                 else "date(captured_at, 'localtime')")
+    col_fuente = "IFNULL(fuente, 'SIBUAC')" if "fuente" in columnas else "'SIBUAC'"
+    rows = con_raw.execute(f"""
+        SELECT {col_corte} AS corte, {col_fuente} AS fuente, via, long_km, vigente_desde, clase, ejes, tarifa
+        FROM tarifa_snapshot_raw
+        ORDER BY corte, fuente, id
+    """).fetchall()
+    ultimos = {}
+    total_nuevos = 0
+    for (fecha, fuente), grupo in itertools.groupby(rows, key=lambda r: (r[0], r[1])):
+        if fuente not in ultimos:
+            ultimos[fuente] = _ultimo_corte(con, fuente)
+        if ultimos[fuente] and fecha <= ultimos[fuente]:
+            continue
+        items = [{"via": r[2], "long_km": r[3], "vigente_desde": r[4],
+                  "clase": r[5], "ejes": r[6], "tarifa": r[7]} for r in grupo]
+        nuevos = persist_items_normalizados(con, items, fecha, save_raw=False, fuente=fuente)
+        total_nuevos += nuevos
+        print(f"[BACKFILL] raw {fecha} {fuente}: {len(items)} filas, {nuevos} cambios en histórico")
+    return total_nuevos
 
-    # 3) payload y radio
-    action_url, base_data, radios, consultar_submit = extract_form_data(form, page_url)
-    print("[DEBUG] action_url =", action_url)
-    print("[DEBUG] radios =", [(n, v, c, l) for (n, v, c, l) in radios][:5])
-    print("[DEBUG] submit consultar =", consultar_submit)
-    radio_choice = choose_second_radio_payload(radios)
-    print("[DEBUG] elegido segundo radio =", radio_choice)
+
+# ------------------- main/CLI -------------------
+
+def descargar_tabla_html(metricas, cliente=None, cache=None):
+    """
+    Pasos 1-4 de main(): GET del form + POST con todas las vías. Devuelve el HTML de la tabla.
+    cache (modo --daemon): si el form no cambió (misma huella) se reutiliza el payload ya extraído.
+    """
+    cliente = cliente or ClienteHTTP(metricas)
+    cache = {} if cache is None else cache
+    # 1) GET + form
+    with metricas.etapa("get_form"):
+        page_html, page_url, huella = get_form(cliente)
+        if cache.get("form_huella") == huella:
+            metricas.contar("get_form", "form_sin_cambios")
+        else:
+            dump_html("debug_GET_CmdSelTarifaRep1Data", page_html)
+            # 2-3) vías + payload y radio
+            cache["form"] = leer_form(page_html, page_url)
+            cache["form_huella"] = huella
+    action_url, base_data, radio_choice, consultar_submit, all_vias = cache["form"]
 
     # 4) POST (varias actions)
-    html = post_consultar(s, action_url, base_data, radio_choice, consultar_submit, page_html, all_vias)
+    with metricas.etapa("post_consultar"):
+        html = post_consultar(cliente, action_url, base_data, radio_choice, consultar_submit, page_html, all_vias,
+                              metricas=metricas, cache=cache)
     dump_html("debug_POST_consultar_final", html)
+    return html
+
+
+class EstadoDaemon:
+    """Lo que el modo --daemon mantiene caliente entre corridas."""
+
+    def __init__(self, args):
+        self.con = ensure_db_norm(args.db)   # migraciones: una vez al arrancar, no por corrida
+        self.cliente = ClienteHTTP(deadline_s=args.deadline, timeout_lectura=args.timeout,
+                                   reintentos=args.http_reintentos)
+        self.cache = {}   # huella + payload del form, variante del POST, catálogos (ver _cargar_catalogos)
+
+    def close(self):
+        self.cliente.close()
+        self.con.close()
+
+
+def _consultar_y_persistir(args, metricas, estado=None):
+    """
+    Pasos 1-7 de main(): GET, POST, parseo, normalización y persistencia (con spans).
+    estado (EstadoDaemon): reutiliza sesión HTTP, conexión y caches en lugar de crearlas.
+    """
+    if estado is None:
+        cliente, cache = ClienteHTTP(metricas, deadline_s=args.deadline, timeout_lectura=args.timeout,
+                                     reintentos=args.http_reintentos), None
+    else:
+        cliente, cache = estado.cliente, estado.cache
+        cliente.reiniciar(metricas, args.deadline)
+    try:
+        html = descargar_tabla_html(metricas, cliente, cache)
+    finally:
+        if estado is None:
+            cliente.close()
 
     # 5) Parseo + normalización (SIN filtrar por labels del <select>)
-    row0, row1, row1_blocked, data_rows = parse_table_with_multilevel_headers(html)
-    items = normalize_multilevel(row0, row1, row1_blocked, data_rows)
+    with metricas.etapa("parse"):
+        row0, row1, row1_blocked, data_rows = parse_table_with_multilevel_headers(html)
+    metricas.contar("parse", "filas", len(data_rows))
+    with metricas.etapa("normalize"):
+        items = normalize_multilevel(row0, row1, row1_blocked, data_rows)
+    metricas.contar("normalize", "items", len(items))
 
     # 6) Sanity check
     vias_unicas = {it["via"] for it in items}
@@ -723,11 +1100,157 @@ def main():
         raise RuntimeError(f"Demasiado pocas vías ({len(vias_unicas)}<{args.min_vias}). Aborto para evitar basura.")
 
     # 7) Persistencia normalizada (hist + snapshot(definición) + raw)
-    con = ensure_db_norm(args.db)
+    with metricas.etapa("ensure_db"):
+        con = estado.con if estado is not None else ensure_db_norm(args.db)
     fecha_corte = dt.date.today().isoformat()
-    new_hist = persist_items_normalizados(con, items, fecha_corte, save_raw=True)
+    with metricas.etapa("persist"):
+        new_hist = persist_items_normalizados(con, items, fecha_corte, save_raw=True, metricas=metricas,
+                                              cache=cache)
+    with metricas.etapa("optimize"):
+        optimizar_estadisticas(con)
+
+    # 7b) Snapshot inmutable para la API (opcional)
+    if args.publish_dir:
+        with metricas.etapa("publish"):
+            db_publicar.publicar(con, args.publish_dir, keep=args.publish_keep)
+    return items, vias_unicas, new_hist, con
+
+
+# ------------------- modo --daemon -------------------
+
+def leer_horas(txt):
+    """"06:00,18:30" → [time(6, 0), time(18, 30)]"""
+    return sorted(datetime.strptime(h.strip(), "%H:%M").time() for h in (txt or "").split(",") if h.strip())
+
+
+def proxima_corrida(ahora, cada_s, horas=None, ultima=None):
+    """Con horas: la próxima hora del día (hoy o mañana). Si no: ultima + cada_s (ya, si es la primera)."""
+    if horas:
+        return min(c for c in (datetime.combine(ahora.date() + dt.timedelta(days=d), h)
+                               for d in (0, 1) for h in horas) if c > ahora)
+    return ahora if ultima is None else ultima + dt.timedelta(seconds=cada_s)
+
+
+def _corrida_daemon(args, estado):
+    metricas = MetricasCorrida()
+    t0 = time.perf_counter()
+    try:
+        with bloqueo_ingesta(args.db, args.lock_wait):
+            try:
+                with metricas.etapa("total"):
+                    items, _, new_hist, _ = _consultar_y_persistir(args, metricas, estado)
+            finally:
+                metricas.guardar(estado.con)
+        print(f"[DAEMON] OK: {len(items)} filas, {new_hist} cambios en histórico "
+              f"en {time.perf_counter() - t0:.1f}s")
+    except BloqueoOcupado as ex:
+        print(f"[DAEMON] corrida omitida: {ex}")
+    except Exception as ex:
+        # el daemon sigue vivo; la corrida fallida ya quedó en consulta / consulta_metrics
+        print(f"[DAEMON] corrida fallida: {type(ex).__name__}: {ex}")
+
+
+def modo_daemon(args):
+    """
+    Proceso residente: corre según --cada / --horas con sesión HTTP, conexión y caches calientes.
+    SIGTERM/SIGINT terminan al acabar la corrida en curso; SIGUSR1 adelanta la siguiente.
+    """
+    horas = leer_horas(args.horas)
+    despertar, detener = threading.Event(), threading.Event()
+
+    def _salir(signum, frame):
+        detener.set()
+        despertar.set()
+    signal.signal(signal.SIGTERM, _salir)
+    signal.signal(signal.SIGINT, _salir)
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: despertar.set())
+
+    estado = EstadoDaemon(args)
+    ultima = None
+    try:
+        while not detener.is_set():
+            proxima = proxima_corrida(datetime.now(), args.cada, horas, ultima)
+            espera = (proxima - datetime.now()).total_seconds()
+            if espera > 0:
+                print(f"[DAEMON] próxima corrida {proxima:%Y-%m-%d %H:%M:%S} (pid {os.getpid()})")
+                despertar.wait(espera)
+                despertar.clear()
+                if detener.is_set():
+                    break
+            ultima = datetime.now()
+            _corrida_daemon(args, estado)
+    finally:
+        estado.close()
+        print("[DAEMON] detenido")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extractor SIBUAC tarifas (Tarifas Vigentes → Consultar)")
+    parser.add_argument("--db", default="sibuac_tarifas.sqlite", help="Ruta BD SQLite")
+    parser.add_argument("--dump-csv", help="Opcional: exportar CSV normalizado")
+    parser.add_argument("--min-vias", type=int, default=120, help="Abortar si vías únicas < min (sanity check)")
+    parser.add_argument("--from-raw", action="store_true",
+                        help="Backfill: re-procesa tarifa_snapshot_raw (sin red)")
+    parser.add_argument("--raw-db", help="BD origen de tarifa_snapshot_raw para --from-raw (distinta de --db)")
+    parser.add_argument("--from-html", nargs="+", metavar="RUTA",
+                        help="Backfill: re-normaliza HTML archivados (archivos, directorios o globs)")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos para --from-html (por defecto: núcleos)")
+    parser.add_argument("--publish-dir", default=os.environ.get("DB_PUBLISH_DIR"),
+                        help="Publica un snapshot de sólo lectura para la API al terminar (o DB_PUBLISH_DIR)")
+    parser.add_argument("--publish-keep", type=int, default=3, help="Snapshots publicados a conservar")
+    parser.add_argument("--deadline", type=float, default=float(os.environ.get("SCRAPER_DEADLINE_S", "300")),
+                        help="Plazo total (s) para el GET + POSTs, reintentos incluidos (o SCRAPER_DEADLINE_S)")
+    parser.add_argument("--timeout", type=float, default=60, help="Timeout de lectura por petición (s)")
+    parser.add_argument("--http-reintentos", type=int, default=3,
+                        help="Reintentos por petición ante 5xx, errores de red o 'Disculpe usted'")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Proceso residente: corre según --cada/--horas con sesión, conexión y caches calientes")
+    parser.add_argument("--cada", type=float, default=float(os.environ.get("SCRAPER_CADA_S", "86400")),
+                        help="--daemon: segundos entre corridas (la primera es inmediata)")
+    parser.add_argument("--horas", default=os.environ.get("SCRAPER_HORAS"),
+                        help="--daemon: horas fijas del día, p. ej. 06:00,18:00 (reemplaza --cada)")
+    parser.add_argument("--lock-wait", type=float, default=0,
+                        help="Segundos a esperar si otra ingesta tiene el bloqueo de la BD (por defecto: fallar)")
+    args = parser.parse_args()
+    if args.from_raw and (not args.raw_db or os.path.abspath(args.raw_db) == os.path.abspath(args.db)):
+        parser.error("--from-raw requiere --raw-db con la BD origen, distinta de --db "
+                     "(en la misma BD todos los cortes ya están cargados y no se procesaría nada)")
+
+    if args.daemon:
+        modo_daemon(args)
+        return
+
+    with bloqueo_ingesta(args.db, args.lock_wait):
+        if args.from_raw or args.from_html:
+            con = ensure_db_norm(args.db)
+            if args.from_html:
+                nuevos = backfill_desde_html(con, args.from_html, workers=args.workers, min_vias=args.min_vias)
+            else:
+                con_raw = sqlite3.connect(f"file:{os.path.abspath(args.raw_db)}?mode=ro", uri=True)
+                try:
+                    nuevos = backfill_desde_raw(con, con_raw)
+                finally:
+                    con_raw.close()
+            print(f"[HIST] Nuevos cambios en histórico (backfill): {nuevos}")
+            optimizar_estadisticas(con)
+            if args.publish_dir:
+                db_publicar.publicar(con, args.publish_dir, keep=args.publish_keep)
+            con.close()
+            return
+
+        metricas = MetricasCorrida()
+        con = None
+        try:
+            with metricas.etapa("total"):
+                items, vias_unicas, new_hist, con = _consultar_y_persistir(args, metricas)
+        finally:
+            # también si la corrida falla; antes de persistir no hay consulta → consulta_id NULL
+            if con is None:
+                con = ensure_db_norm(args.db)
+            metricas.guardar(con)
+            con.close()
     print(f"[HIST] Nuevos cambios en histórico: {new_hist}")
-    con.close()
 
     # 8) CSV opcional
     if args.dump_csv: